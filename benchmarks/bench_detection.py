@@ -0,0 +1,465 @@
+#!/usr/bin/env python
+"""
+Detection latency and overhead benchmark for the Network Monitor plugin
+
+Drives the real Core against the fake adapter backend on a running reactor,
+with a stand-in for Deluge's session that records when it is paused:
+
+- detection: time from the required adapter going down to Deluge's session
+  being paused, over --trials failures at random points of the check cycle,
+  per monitor mode: poll (fixed interval), adaptive (backing off to
+  --max-interval) and event (change notifications)
+- overhead: CPU time, wall time and memory of one check (probe plus
+  evaluation) against the number of adapters, with the adapters stable and
+  with one of them changing every check
+- lifecycle: how long enable() and disable() block, and how long until the
+  first check has completed
+
+Needs Deluge and Twisted installed; runs anywhere, the fake backend needs no
+network access. Detection is measured with flap suppression off
+(trip_samples 1, min_down_duration 0) so it shows the monitor's own delay;
+pass --set to measure other settings. Exits with status 1 if a --max-*
+threshold is exceeded, so it can guard against regressions.
+
+    python benchmarks/bench_detection.py --json --max-latency-ms event=50 --max-check-us 500
+"""
+
+import argparse
+import copy
+import gc
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG_FILE = "deluge_windows_network_monitor.conf"
+
+MODES = ("poll", "adaptive", "event")
+
+# Win32_NetworkAdapter NetConnectionStatus values
+CONNECTED = 2
+MEDIA_DISCONNECTED = 7
+
+REQUIRED = "bench0"
+
+
+def percentiles(values):
+    """{"p50", "p90", "p99", "max", "mean"} of values (seconds) in ms"""
+    values = sorted(values)
+    if not values:
+        return {}
+
+    def percentile(p):
+        return values[min(len(values) - 1, int(p / 100.0 * len(values)))] * 1000
+
+    return {
+        "p50": percentile(50),
+        "p90": percentile(90),
+        "p99": percentile(99),
+        "max": values[-1] * 1000,
+        "mean": sum(values) / len(values) * 1000,
+    }
+
+
+def _setting(text):
+    key, separator, value = text.partition("=")
+    if not separator:
+        raise argparse.ArgumentTypeError(f"'{text}' is not KEY=VALUE")
+    try:
+        return key.strip(), json.loads(value)
+    except ValueError:
+        return key.strip(), value
+
+
+def _threshold(text):
+    mode, separator, value = text.partition("=")
+    if not separator or mode not in MODES:
+        raise argparse.ArgumentTypeError(f"'{text}' is not MODE=MS with MODE one of {', '.join(MODES)}")
+    return mode, float(value)
+
+
+class Bench(object):
+    """The fake backend, the session stand-in and a Core to run them with"""
+
+    def __init__(self, args):
+        sys.path.insert(0, ROOT)
+        from deluge import component, configmanager
+
+        configmanager.set_config_dir(tempfile.mkdtemp(prefix="delugenm-bench-"))
+        self.configmanager = configmanager
+        self.args = args
+        self.random = random.Random(args.seed)
+
+        import delugenm.core
+        from delugenm.backends.fake import FakeBackend
+
+        self.backend = FakeBackend()
+        # Every Core gets this backend, so its adapters can be set before the first check
+        delugenm.core.get_backend = lambda name: self.backend
+        self.core_class = delugenm.core.Core
+        self.core = None
+
+        bench = self
+
+        class Session(component.Component):
+            """Stands in for Deluge's Core component: records pauses and resumes"""
+
+            def __init__(self):
+                super().__init__("Core")
+                self.paused = False
+
+            def is_session_paused(self):
+                return self.paused
+
+            def pause_session(self):
+                self.paused = True
+                bench.pauses.append(time.perf_counter())
+
+            def resume_session(self):
+                self.paused = False
+                bench.resumes.append(time.perf_counter())
+
+            def get_session_status(self, keys):
+                return {"num_peers": 0}
+
+        self.session = Session()
+        self.pauses = []
+        self.resumes = []
+
+    def set_adapters(self, count):
+        """Replace the fake adapters with count connected ones, the first of them required"""
+        for adapter in self.backend.snapshot().adapters:
+            self.backend.remove_adapter(adapter.guid, notify=False)
+        for index in range(count):
+            name = f"bench{index}"
+            self.backend.set_adapter(name, CONNECTED, guid=f"{{{index:08X}-BENC-H000-0000-000000000000}}",
+                                     index=index, connection_id=name, notify=False)
+
+    def configure(self, **settings):
+        """Write the settings the next Core will load"""
+        from delugenm.settings import DEFAULTS
+
+        config = self.configmanager.ConfigManager(CONFIG_FILE, defaults=copy.deepcopy(DEFAULTS))
+        values = {
+            "required_adapters": [REQUIRED],
+            "action": "pause",
+            "hold_until_first_check": False,
+            "trip_samples": 1,
+            "trip_window": 1,
+            "min_down_duration": 0.0,
+            "check_jitter": 0.0,
+        }
+        values.update(settings)
+        values.update(self.args.settings)
+        for key, value in values.items():
+            config[key] = value
+        config.save()
+        # ConfigManager caches configs by file; the next Core loads this one afresh
+        self.configmanager.close(CONFIG_FILE)
+
+    def enable(self):
+        """Enable a fresh Core; returns the seconds enable() blocked"""
+        # Core() registers itself with Deluge's RPC server, which doesn't exist here
+        self.core = self.core_class.__new__(self.core_class)
+        started = time.perf_counter()
+        self.core.enable()
+        return time.perf_counter() - started
+
+    def disable(self):
+        """Disable the Core; returns the seconds disable() blocked"""
+        started = time.perf_counter()
+        self.core.disable()
+        elapsed = time.perf_counter() - started
+        self.core = None
+        return elapsed
+
+
+def sleep(seconds):
+    from twisted.internet import reactor, task
+    return task.deferLater(reactor, seconds, lambda: None)
+
+
+def wait_for(predicate, timeout):
+    """Deferred firing True once predicate() holds, polled every millisecond, or False after timeout"""
+    from twisted.internet import defer
+
+    @defer.inlineCallbacks
+    def poll():
+        deadline = time.perf_counter() + timeout
+        while not predicate():
+            if time.perf_counter() > deadline:
+                return False
+            yield sleep(0.001)
+        return True
+
+    return poll()
+
+
+def mode_settings(mode, args):
+    """The settings that make the core run in a monitor mode"""
+    if mode == "poll":
+        return {"monitor_mode": "poll", "check_interval": args.interval,
+                "max_check_interval": args.interval, "fast_check_interval": args.interval}
+    if mode == "adaptive":
+        return {"monitor_mode": "poll", "check_interval": args.interval,
+                "max_check_interval": args.max_interval, "fast_check_interval": args.fast_interval}
+    return {"monitor_mode": "event", "check_interval": args.interval, "fallback_interval": 60,
+            "max_check_interval": args.max_interval, "fast_check_interval": args.fast_interval}
+
+
+def measure_detection(bench, mode):
+    """
+    Fail the required adapter --trials times at random points of the check
+    cycle. Returns {"trials", "timeouts", "p50", ...} in ms.
+    """
+    from twisted.internet import defer
+
+    args = bench.args
+    # Long enough for the adaptive schedule to back off to its maximum
+    window = args.interval if mode == "poll" else args.max_interval * 2
+    timeout = window * 4 + 5
+
+    @defer.inlineCallbacks
+    def run():
+        bench.set_adapters(args.adapter_count)
+        bench.configure(**mode_settings(mode, args))
+        bench.enable()
+        latencies = []
+        timeouts = 0
+        yield wait_for(lambda: bench.core.monitoring and bench.core._checks_total.value() > 0, timeout)
+        for _ in range(args.trials):
+            yield sleep(bench.random.uniform(0, window))
+            pauses = len(bench.pauses)
+            failed = time.perf_counter()
+            bench.backend.set_adapter(REQUIRED, MEDIA_DISCONNECTED, guid=bench.backend.snapshot().find(REQUIRED).guid,
+                                      connection_id=REQUIRED)
+            if (yield wait_for(lambda: len(bench.pauses) > pauses, timeout)):
+                latencies.append(bench.pauses[pauses] - failed)
+            else:
+                timeouts += 1
+
+            resumes = len(bench.resumes)
+            bench.backend.set_adapter(REQUIRED, CONNECTED, guid=bench.backend.snapshot().find(REQUIRED).guid,
+                                      connection_id=REQUIRED)
+            yield wait_for(lambda: len(bench.resumes) > resumes or not bench.core.tripped, timeout)
+        bench.disable()
+        return dict(percentiles(latencies), trials=len(latencies), timeouts=timeouts)
+
+    return run()
+
+
+def measure_overhead(bench, count):
+    """
+    CPU time, wall time and memory of one check with count adapters, run
+    synchronously on the reactor thread. Returns
+    {"stable": {...}, "changing": {...}} with per-check figures.
+    """
+    from twisted.internet import defer
+
+    args = bench.args
+
+    def checks(change):
+        core = bench.core
+        # Flip a monitored-but-not-required adapter every check, or nothing
+        other = bench.backend.snapshot().find("bench1") if change and count > 1 else None
+
+        def check(number):
+            if other is not None:
+                bench.backend.set_adapter(other.name, MEDIA_DISCONNECTED if number % 2 else CONNECTED,
+                                          guid=other.guid, index=other.index, connection_id=other.connection_id,
+                                          notify=False)
+            core._on_probe_result(core._probe([], core.settings))
+
+        # Timed without tracemalloc, which slows allocations down
+        gc.collect()
+        cpu_started = time.process_time()
+        wall_started = time.perf_counter()
+        for number in range(args.checks):
+            check(number)
+        wall = time.perf_counter() - wall_started
+        cpu = time.process_time() - cpu_started
+
+        gc.collect()
+        tracemalloc.start()
+        base, _ = tracemalloc.get_traced_memory()
+        # reset_peak() is new in Python 3.9
+        peak_bytes = 0 if hasattr(tracemalloc, "reset_peak") else None
+        for number in range(args.checks):
+            if peak_bytes is None:
+                check(number)
+                continue
+            before, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            check(number)
+            peak_bytes = max(peak_bytes, tracemalloc.get_traced_memory()[1] - before)
+        retained, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {
+            "cpu_us": cpu / args.checks * 1e6,
+            "wall_us": wall / args.checks * 1e6,
+            "peak_alloc_bytes": peak_bytes,
+            "retained_bytes": (retained - base) / args.checks,
+        }
+
+    @defer.inlineCallbacks
+    def run():
+        bench.set_adapters(count)
+        # Scheduled checks stay out of the way; checks are run by hand
+        bench.configure(monitor_mode="poll", check_interval=3600, max_check_interval=3600, fast_check_interval=3600)
+        bench.enable()
+        yield wait_for(lambda: bench.core._checks_total.value() > 0, 30)
+        result = {"stable": checks(False), "changing": checks(True)}
+        bench.disable()
+        return result
+
+    return run()
+
+
+def measure_lifecycle(bench):
+    """Enable and disable a Core --cycles times. Returns {"enable", "first_check", "disable"} percentiles."""
+    from twisted.internet import defer
+
+    args = bench.args
+
+    @defer.inlineCallbacks
+    def run():
+        bench.set_adapters(args.adapter_count)
+        bench.configure(monitor_mode="event", check_interval=args.interval)
+        enables, first_checks, disables = [], [], []
+        for _ in range(args.cycles):
+            started = time.perf_counter()
+            enables.append(bench.enable())
+            if (yield wait_for(lambda: bench.core._checks_total.value() > 0, 30)):
+                first_checks.append(time.perf_counter() - started)
+            disables.append(bench.disable())
+            # Let the previous core's thread pool wind down
+            yield sleep(0.05)
+        return {"enable": percentiles(enables), "first_check": percentiles(first_checks),
+                "disable": percentiles(disables)}
+
+    return run()
+
+
+def run_all(args):
+    from twisted.internet import defer, reactor
+
+    bench = Bench(args)
+    results = {}
+
+    @defer.inlineCallbacks
+    def run():
+        try:
+            if "detection" in args.sections:
+                results["detection"] = {}
+                for mode in args.modes:
+                    results["detection"][mode] = yield measure_detection(bench, mode)
+            if "overhead" in args.sections:
+                results["overhead"] = {}
+                for count in args.adapters:
+                    results["overhead"][str(count)] = yield measure_overhead(bench, count)
+            if "lifecycle" in args.sections:
+                results["lifecycle"] = yield measure_lifecycle(bench)
+        except Exception as e:
+            results["error"] = f"{type(e).__name__}: {e}"
+            if bench.core is not None:
+                bench.disable()
+        finally:
+            reactor.stop()
+
+    reactor.callWhenRunning(run)
+    reactor.run()
+    return results
+
+
+def check_thresholds(args, results):
+    failures = []
+    if "error" in results:
+        failures.append(f"benchmark failed: {results['error']}")
+    for mode, result in results.get("detection", {}).items():
+        if result.get("timeouts"):
+            failures.append(f"{mode}: {result['timeouts']} failures were never acted on")
+        limit = args.max_latency_ms.get(mode)
+        if limit is not None and result.get("p99", 0.0) > limit:
+            failures.append(f"{mode}: p99 detection latency {result['p99']:.1f}ms (max {limit}ms)")
+    overhead = results.get("overhead", {})
+    if args.max_check_us is not None and overhead:
+        largest = str(max(args.adapters))
+        cpu = overhead[largest]["changing"]["cpu_us"]
+        if cpu > args.max_check_us:
+            failures.append(f"a check of {largest} adapters took {cpu:.0f}us of CPU (max {args.max_check_us}us)")
+    lifecycle = results.get("lifecycle", {})
+    for name, limit in (("enable", args.max_enable_ms), ("disable", args.max_disable_ms)):
+        value = lifecycle.get(name, {}).get("max")
+        if limit is not None and value is not None and value > limit:
+            failures.append(f"{name} blocked for {value:.1f}ms (max {limit}ms)")
+    return failures
+
+
+def print_results(results):
+    for mode, result in results.get("detection", {}).items():
+        print(f"detection {mode:<9} p50 {result.get('p50', 0):8.1f} ms  p90 {result.get('p90', 0):8.1f} ms  "
+              f"p99 {result.get('p99', 0):8.1f} ms  max {result.get('max', 0):8.1f} ms  "
+              f"({result['trials']} trials, {result['timeouts']} timeouts)")
+    for count, result in results.get("overhead", {}).items():
+        for kind, figures in sorted(result.items()):
+            print(f"check {count:>4} adapters {kind:<9} cpu {figures['cpu_us']:8.1f} us  "
+                  f"wall {figures['wall_us']:8.1f} us  peak {figures['peak_alloc_bytes'] or 0:8d} B  "
+                  f"retained {figures['retained_bytes']:8.1f} B")
+    for name, result in sorted(results.get("lifecycle", {}).items()):
+        if result:
+            print(f"{name:<15} p50 {result['p50']:8.1f} ms  max {result['max']:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sections", type=lambda text: text.split(","), default=["detection", "overhead", "lifecycle"],
+                        help="comma-separated sections to run: detection, overhead, lifecycle")
+    parser.add_argument("--modes", type=lambda text: text.split(","), default=list(MODES),
+                        help="comma-separated monitor modes to measure detection in")
+    parser.add_argument("--trials", type=int, default=10, help="adapter failures per mode")
+    parser.add_argument("--interval", type=float, default=0.5, help="check_interval (s)")
+    parser.add_argument("--max-interval", type=float, default=2.0, help="max_check_interval (s) in adaptive mode")
+    parser.add_argument("--fast-interval", type=float, default=0.1, help="fast_check_interval (s) in adaptive mode")
+    parser.add_argument("--adapter-count", type=int, default=4, help="adapters during detection and lifecycle runs")
+    parser.add_argument("--adapters", type=lambda text: [int(count) for count in text.split(",")], default=[2, 10, 50],
+                        help="comma-separated adapter counts to measure check overhead with")
+    parser.add_argument("--checks", type=int, default=2000, help="checks per overhead measurement")
+    parser.add_argument("--cycles", type=int, default=5, help="enable/disable cycles")
+    parser.add_argument("--seed", type=int, default=1, help="seed for the failure timing")
+    parser.add_argument("--set", dest="settings", type=_setting, action="append", default=[], metavar="KEY=VALUE",
+                        help="override a plugin setting (VALUE is JSON, or a plain string)")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--max-latency-ms", type=_threshold, action="append", default=[], metavar="MODE=MS",
+                        help="fail if the p99 detection latency of a mode is higher")
+    parser.add_argument("--max-check-us", type=float,
+                        help="fail if a check of the most adapters takes more CPU time")
+    parser.add_argument("--max-enable-ms", type=float, help="fail if Core.enable() blocks longer")
+    parser.add_argument("--max-disable-ms", type=float, help="fail if Core.disable() blocks longer")
+    args = parser.parse_args()
+    args.settings = dict(args.settings)
+    args.max_latency_ms = dict(args.max_latency_ms)
+    if args.adapter_count < 1 or min(args.adapters) < 1:
+        parser.error("adapter counts must be at least 1")
+    unknown = set(args.modes).difference(MODES)
+    if unknown:
+        parser.error(f"unknown modes: {', '.join(sorted(unknown))}")
+
+    results = run_all(args)
+    failures = check_thresholds(args, results)
+    results["failures"] = failures
+
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+    else:
+        print_results(results)
+        for failure in failures:
+            print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+"""
+Startup benchmark for the Network Monitor plugin
+
+Measures what the plugin adds to the Deluge daemon's startup path:
+
+- import: cumulative import time of the plugin and each of its modules, in a
+  fresh interpreter (python -X importtime), best of --runs
+- enable: how long Core.enable() blocks the reactor, and how long until the
+  backend is up and the first check has completed, with the fake backend
+
+Needs Deluge and Twisted installed. Exits with status 1 if a --max-* threshold
+is exceeded, so it can guard against regressions.
+
+    python benchmarks/bench_startup.py --json --max-import-ms 300 --max-enable-ms 20
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PLUGIN = "delugenm"
+
+
+def measure_imports(runs):
+    """Return {module: best cumulative import time in ms} for the plugin's modules"""
+    best = {}
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {PLUGIN}.core"],
+            stderr=subprocess.PIPE, universal_newlines=True, env=env, cwd=ROOT
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"Importing {PLUGIN}.core failed:\n{result.stderr[-2000:]}")
+        for line in result.stderr.splitlines():
+            # import time: self [us] | cumulative | imported package
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+            if name == PLUGIN or name.startswith(PLUGIN + "."):
+                try:
+                    value = int(cumulative) / 1000.0
+                except ValueError:
+                    continue
+                best[name] = min(value, best.get(name, value))
+    return best
+
+
+def measure_enable(timeout):
+    """
+    Enable the core plugin with the fake backend on a running reactor.
+    Returns {"enable_ms", "backend_ready_ms", "first_check_ms"}.
+    """
+    sys.path.insert(0, ROOT)
+    from twisted.internet import reactor, task
+    from deluge import configmanager
+
+    configmanager.set_config_dir(tempfile.mkdtemp(prefix="delugenm-bench-"))
+    configmanager.ConfigManager(
+        "deluge_windows_network_monitor.conf", defaults={"backend": "fake", "hold_until_first_check": False}
+    ).save()
+    # ConfigManager caches configs by file; the Core must load this one afresh, with its defaults
+    configmanager.close("deluge_windows_network_monitor.conf")
+
+    from delugenm.core import Core
+
+    # Core() registers itself with Deluge's RPC server, which doesn't exist here
+    core = Core.__new__(Core)
+    results = {}
+
+    def start():
+        started = time.perf_counter()
+        try:
+            core.enable()
+        except Exception:
+            reactor.stop()
+            raise
+        results["enable_ms"] = (time.perf_counter() - started) * 1000
+
+        def poll():
+            now = (time.perf_counter() - started) * 1000
+            if "backend_ready_ms" not in results and core.monitoring:
+                results["backend_ready_ms"] = now
+            if core._checks_total.value() > 0:
+                results["first_check_ms"] = now
+                finish()
+            elif now > timeout * 1000:
+                finish()
+
+        def finish():
+            poller.stop()
+            core.disable()
+            reactor.stop()
+
+        poller = task.LoopingCall(poll)
+        poller.start(0.001)
+
+    reactor.callWhenRunning(start)
+    reactor.run()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="fresh interpreters to take the best import time of")
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds to wait for the first check")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--max-import-ms", type=float, help="fail if importing the plugin takes longer")
+    parser.add_argument("--max-enable-ms", type=float, help="fail if Core.enable() blocks longer")
+    args = parser.parse_args()
+
+    imports = measure_imports(args.runs)
+    enable = measure_enable(args.timeout)
+    results = {"import_ms": imports, "enable": enable}
+
+    failures = []
+    plugin_import = imports.get(PLUGIN, 0.0)
+    if args.max_import_ms is not None and plugin_import > args.max_import_ms:
+        failures.append(f"import took {plugin_import:.1f}ms (max {args.max_import_ms}ms)")
+    if args.max_enable_ms is not None and enable.get("enable_ms", 0.0) > args.max_enable_ms:
+        failures.append(f"enable took {enable['enable_ms']:.1f}ms (max {args.max_enable_ms}ms)")
+    if "first_check_ms" not in enable:
+        failures.append(f"no check completed within {args.timeout}s")
+    results["failures"] = failures
+
+    if args.json:
+        print(json.dumps(results, indent=2, sort_keys=True))
+    else:
+        for name, value in sorted(imports.items(), key=lambda item: -item[1]):
+            print(f"import {name:<30} {value:8.1f} ms")
+        for name, value in sorted(enable.items()):
+            print(f"{name:<37} {value:8.1f} ms")
+        for failure in failures:
+            print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -9,24 +9,29 @@ import traceback
 
 log = logging.getLogger(__name__)
 
+# The standalone tools in this package (replay, watchdog, status) run without
+# Deluge or Twisted, so only the plugin itself depends on importing these
 try:
     from deluge.plugins.init import PluginBase
     log.info("Successfully imported PluginBase")
-except Exception as e:
-    log.error(f"Failed to import PluginBase: {e}")
-    traceback.print_exc()
-    raise
+except ImportError as e:
+    PluginBase = None
+    if getattr(e, "name", None) == "deluge":
+        log.debug("Deluge is not installed, the plugin is unavailable")
+    else:
+        log.error(f"Failed to import PluginBase: {e}")
 
-try:
-    from .core import Core
-    log.info("Successfully imported Core")
-except Exception as e:
-    log.error(f"Failed to import Core: {e}")
-    traceback.print_exc()
-    raise
+if PluginBase is not None:
+    try:
+        from .core import Core
+        log.info("Successfully imported Core")
+    except ImportError as e:
+        log.error(f"Failed to import Core: {e}")
+        traceback.print_exc()
+        PluginBase = None
 
 
-class WindowsNetworkMonitorPlugin(PluginBase):
+class WindowsNetworkMonitorPlugin(PluginBase or object):
     def enable(self):
         """Enable the plugin"""
         try:
@@ -69,6 +74,7 @@ class WindowsNetworkMonitorPlugin(PluginBase):
 
 
 # Create and export the plugin instance
-log.info("Creating plugin_base instance...")
-plugin_base = WindowsNetworkMonitorPlugin(__name__)
-log.info("plugin_base instance created successfully")
+if PluginBase is not None:
+    log.info("Creating plugin_base instance...")
+    plugin_base = WindowsNetworkMonitorPlugin(__name__)
+    log.info("plugin_base instance created successfully")
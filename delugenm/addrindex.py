@@ -0,0 +1,169 @@
+"""
+IP address to adapter index for Network Monitor
+
+Resolves Deluge's listen_interface / outgoing_interface values, which may be
+an IPv4 or IPv6 address or an interface name, to the GUID of the adapter
+that carries them. Built once from a full backend query and then kept up to
+date from the backend's address change events.
+"""
+
+import ipaddress
+import logging
+import threading
+import zlib
+
+log = logging.getLogger(__name__)
+
+
+def _parse_address(value):
+    """
+    Parse value as an IP address, or return None if it is not one.
+    Accepts IPv6 in brackets and with a %scope suffix (fe80::1%eth0).
+    """
+    value = value.strip()
+    if value.startswith("[") and value.endswith("]"):
+        value = value[1:-1]
+    value = value.split("%", 1)[0]
+    try:
+        return ipaddress.ip_address(value)
+    except ValueError:
+        return None
+
+
+class AddressIndex(object):
+    """Maintained address/prefix and name -> adapter GUID index"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # ip_address -> GUID
+        self._addresses = {}
+        # GUID -> {ip_address: ip_network}
+        self._by_adapter = {}
+        # name, connection name and GUID -> GUID
+        self._names = {}
+        # GUID -> crc32 of its sorted addresses, computed on demand
+        self._hashes = {}
+
+    def rebuild(self, addresses, snapshot):
+        """
+        Replace the whole index from backend.addresses() and an AdapterSnapshot
+        """
+        with self._lock:
+            self._addresses = {}
+            self._by_adapter = {}
+            self._hashes = {}
+            for guid, adapter_addresses in addresses.items():
+                for address, prefix in adapter_addresses:
+                    self._add(guid, address, prefix)
+            self._set_names(snapshot)
+        log.debug("Address index rebuilt: %d addresses on %d adapters", len(self._addresses), len(self._by_adapter))
+
+    def update_names(self, snapshot):
+        """Refresh the name -> GUID part of the index from an AdapterSnapshot"""
+        with self._lock:
+            self._set_names(snapshot)
+
+    def add(self, guid, address, prefix=None):
+        """Record that address/prefix was assigned to the adapter guid"""
+        with self._lock:
+            self._add(guid, address, prefix)
+
+    def remove(self, guid, address):
+        """Record that address was removed from the adapter guid"""
+        parsed = _parse_address(address)
+        if parsed is None:
+            return
+        with self._lock:
+            self._hashes.pop(guid, None)
+            self._by_adapter.get(guid, {}).pop(parsed, None)
+            if self._addresses.get(parsed) == guid:
+                del self._addresses[parsed]
+
+    def replace(self, guid, addresses):
+        """Replace every address of the adapter guid with [(address, prefix), ...]"""
+        with self._lock:
+            self._hashes.pop(guid, None)
+            for parsed in self._by_adapter.pop(guid, {}):
+                if self._addresses.get(parsed) == guid:
+                    del self._addresses[parsed]
+            for address, prefix in addresses:
+                self._add(guid, address, prefix)
+
+    def resolve(self, interface):
+        """
+        Return the GUID of the adapter for an address or interface name, or None.
+        An address that is not assigned anywhere resolves to the adapter whose
+        subnet contains it (longest prefix wins).
+        """
+        if not interface:
+            return None
+        parsed = _parse_address(interface)
+        with self._lock:
+            if parsed is None:
+                return self._names.get(interface.strip())
+
+            guid = self._addresses.get(parsed)
+            if guid is not None:
+                return guid
+
+            best_guid, best_prefix = None, -1
+            for guid, networks in self._by_adapter.items():
+                for network in networks.values():
+                    if network is not None and parsed in network and network.prefixlen > best_prefix:
+                        best_guid, best_prefix = guid, network.prefixlen
+            return best_guid
+
+    def addresses_for(self, guid):
+        """Return the addresses currently assigned to the adapter guid"""
+        with self._lock:
+            return [str(parsed) for parsed in self._by_adapter.get(guid, {})]
+
+    def address_hash(self, guid):
+        """A 32-bit hash of the adapter's set of addresses, 0 if it has none"""
+        with self._lock:
+            value = self._hashes.get(guid)
+            if value is None:
+                addresses = sorted(str(parsed) for parsed in self._by_adapter.get(guid, {}))
+                value = self._hashes[guid] = zlib.crc32(",".join(addresses).encode()) if addresses else 0
+            return value
+
+    def moved_address(self, address, guid):
+        """
+        If address is no longer assigned to the adapter guid but the adapter has
+        another address of the same IP version, return that address (preferring
+        global over link-local). Otherwise return None.
+        """
+        parsed = _parse_address(address)
+        if parsed is None:
+            return None
+        with self._lock:
+            current = self._by_adapter.get(guid, {})
+            if parsed in current:
+                return None
+            candidates = [other for other in current if other.version == parsed.version]
+        if not candidates:
+            return None
+        candidates.sort(key=lambda other: other.is_link_local)
+        return str(candidates[0])
+
+    def _add(self, guid, address, prefix):
+        parsed = _parse_address(address)
+        if parsed is None:
+            return
+        network = None
+        if prefix is not None:
+            try:
+                network = ipaddress.ip_network(f"{parsed}/{prefix}", strict=False)
+            except ValueError:
+                pass
+        self._addresses[parsed] = guid
+        self._by_adapter.setdefault(guid, {})[parsed] = network
+        self._hashes.pop(guid, None)
+
+    def _set_names(self, snapshot):
+        names = {}
+        for adapter in snapshot:
+            for key in (adapter.guid, adapter.connection_id, adapter.name):
+                if key:
+                    names[key] = adapter.guid
+        self._names = names
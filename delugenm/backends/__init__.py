@@ -0,0 +1,223 @@
+"""
+Adapter backends for Network Monitor
+
+A backend wraps one platform source of network adapter information. The core
+only talks to backends through the AdapterBackend interface: adapter
+enumeration and status, IP-to-adapter lookup and change notification.
+"""
+
+import logging
+import sys
+import time
+from collections import namedtuple
+
+from ..common import ACTIVE_STATUSES, STATUS_UNKNOWN
+
+log = logging.getLogger(__name__)
+
+# One network adapter as seen by a backend.
+# name is the adapter's name (Win32_NetworkAdapter.Name, or the Linux
+# interface name), guid a stable identifier, index the OS interface index,
+# connection_id the user-facing connection name (e.g. "Ethernet") and status
+# one of the STATUS_* codes from common.py (AdapterSnapshot turns a missing
+# status into STATUS_UNKNOWN).
+Adapter = namedtuple("Adapter", ["name", "guid", "index", "connection_id", "status"])
+
+# A change reported by a backend's native change feed.
+# kind is one of the EVENT_* strings; adapter identifies the adapter
+# that changed (GUID where the backend has one, otherwise its name).
+# address and prefix are set for EVENT_ADDRESS_ADDED/REMOVED.
+AdapterEvent = namedtuple("AdapterEvent", ["kind", "adapter", "address", "prefix"])
+AdapterEvent.__new__.__defaults__ = (None, None)
+
+# Cumulative traffic counters of one adapter, as reported by the OS
+AdapterCounters = namedtuple(
+    "AdapterCounters", ["rx_bytes", "tx_bytes", "rx_packets", "tx_packets", "rx_errors", "tx_errors"]
+)
+
+EVENT_LINK = "link"
+# The adapter's addresses changed but the backend can't say how
+EVENT_ADDRESS = "address"
+EVENT_ADDRESS_ADDED = "address_added"
+EVENT_ADDRESS_REMOVED = "address_removed"
+ADDRESS_EVENTS = {EVENT_ADDRESS, EVENT_ADDRESS_ADDED, EVENT_ADDRESS_REMOVED}
+# The change feed died on its own (adapter None); no more events will come
+# until watch() is called again
+EVENT_LOST = "lost"
+
+
+class AdapterSnapshot(object):
+    """
+    The enabled adapters at one point in time, indexed by name and GUID.
+    counters is {GUID: AdapterCounters}, filled only when they were asked for.
+    """
+
+    __slots__ = ("adapters", "timestamp", "by_name", "by_guid", "active_keys", "counters")
+
+    def __init__(self, adapters, timestamp=None, counters=None):
+        # Every consumer packs statuses as small integers; normalise a missing one here, once
+        self.adapters = tuple(adapter if adapter.status is not None else adapter._replace(status=STATUS_UNKNOWN)
+                              for adapter in adapters)
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.counters = counters or {}
+        self.by_name = {}
+        self.by_guid = {}
+        # Every name, connection name and GUID of the adapters that are up
+        active_keys = set()
+        for adapter in self.adapters:
+            if adapter.status in ACTIVE_STATUSES:
+                active_keys.update((adapter.name, adapter.connection_id, adapter.guid))
+            if adapter.guid:
+                self.by_guid[adapter.guid] = adapter
+            if adapter.connection_id:
+                self.by_name.setdefault(adapter.connection_id, adapter)
+            if adapter.name:
+                self.by_name[adapter.name] = adapter
+        active_keys.discard(None)
+        self.active_keys = frozenset(active_keys)
+
+    def at(self, timestamp):
+        """The same adapters as a snapshot taken at timestamp, without indexing them again"""
+        snapshot = AdapterSnapshot.__new__(AdapterSnapshot)
+        for slot in self.__slots__:
+            setattr(snapshot, slot, getattr(self, slot))
+        snapshot.timestamp = timestamp
+        return snapshot
+
+    def find(self, key):
+        """Look an adapter up by name, connection name or GUID"""
+        return self.by_name.get(key) or self.by_guid.get(key)
+
+    def __len__(self):
+        return len(self.adapters)
+
+    def __iter__(self):
+        return iter(self.adapters)
+
+
+class AdapterBackend(object):
+    """Base class for adapter backends"""
+
+    name = "base"
+    # Whether a fresh instance in a worker process sees the same adapters
+    isolatable = True
+
+    def __init__(self):
+        self._watch_callback = None
+
+    @classmethod
+    def available(cls):
+        """Whether this backend can run on this machine"""
+        return False
+
+    @classmethod
+    def from_argument(cls, argument):
+        """
+        Create the backend from the argument of a "name:argument" spec ("" if
+        there is none). Raises ValueError for an argument it doesn't take.
+        """
+        if argument:
+            raise ValueError(f"The {cls.name} backend takes no argument, not '{argument}'")
+        return cls()
+
+    def snapshot(self, counters=False):
+        """
+        Return an AdapterSnapshot of the enabled adapters. With counters, their
+        traffic counters are read in the same pass.
+        """
+        raise NotImplementedError
+
+    def addresses(self):
+        """Return {adapter GUID: [(address, prefix length), ...]} for the enabled adapters"""
+        raise NotImplementedError
+
+    def adapter_for_address(self, address):
+        """Return the Adapter that has address assigned, or None"""
+        for guid, addresses in self.addresses().items():
+            if any(address == addr for addr, _prefix in addresses):
+                return self.snapshot().by_guid.get(guid)
+        return None
+
+    def watch(self, callback):
+        """
+        Start delivering change notifications to callback(event).
+        Returns True if the backend has a native change feed, False if the
+        caller has to fall back to polling. If the feed fails later, an
+        EVENT_LOST event is the last one delivered.
+        """
+        self._watch_callback = callback
+        try:
+            started = self._start_watching()
+        except Exception as e:
+            log.error(f"Error starting {self.name} change notifications: {e}")
+            started = False
+        if not started:
+            self._watch_callback = None
+        return started
+
+    def unwatch(self):
+        """Stop delivering change notifications"""
+        if self._watch_callback is None:
+            return
+        self._watch_callback = None
+        try:
+            self._stop_watching()
+        except Exception as e:
+            log.error(f"Error stopping {self.name} change notifications: {e}")
+
+    def _start_watching(self):
+        """Subclasses start their change feed here. Returns True on success."""
+        return False
+
+    def _stop_watching(self):
+        """Subclasses stop their change feed here"""
+        pass
+
+    def _notify(self, event):
+        """Hand an event to the registered callback (may be called from any thread)"""
+        callback = self._watch_callback
+        if callback is None:
+            return
+        try:
+            callback(event)
+        except Exception as e:
+            log.error(f"Error handling adapter event {event}: {e}")
+
+
+def _backend_classes():
+    """Backend name -> class, imported lazily so missing platform modules only matter when used"""
+    from .fake import FakeBackend
+    from .linux import LinuxBackend
+    from .replay import ReplayBackend
+    from .windows import WMIBackend
+    return {
+        WMIBackend.name: WMIBackend,
+        LinuxBackend.name: LinuxBackend,
+        FakeBackend.name: FakeBackend,
+        ReplayBackend.name: ReplayBackend,
+    }
+
+
+def get_backend(name="auto"):
+    """
+    Create the backend called name, or the native backend for this platform
+    when name is "auto". "name:argument" passes argument to the backend
+    (e.g. "replay:PATH"). Returns None if that backend is not available.
+    """
+    classes = _backend_classes()
+    name, _, argument = name.partition(":")
+    if name == "auto":
+        name = "wmi" if sys.platform == "win32" else "linux"
+
+    cls = classes.get(name)
+    if cls is None:
+        log.error(f"Unknown adapter backend '{name}', choose one of: {', '.join(sorted(classes))}")
+        return None
+    if not cls.available():
+        log.error(f"Adapter backend '{name}' is not available on this system")
+        return None
+    try:
+        return cls.from_argument(argument)
+    except (OSError, ValueError) as e:
+        log.error(f"Could not start adapter backend '{name}': {e}")
+        return None
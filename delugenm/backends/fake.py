@@ -0,0 +1,108 @@
+"""
+Fake backend for Network Monitor
+
+Holds a hand-maintained set of adapters so tests can drive the core's
+checking and change notification paths without a real network stack.
+"""
+
+import threading
+
+from . import (
+    Adapter,
+    AdapterBackend,
+    AdapterEvent,
+    AdapterSnapshot,
+    EVENT_ADDRESS,
+    EVENT_ADDRESS_ADDED,
+    EVENT_ADDRESS_REMOVED,
+    EVENT_LINK,
+    EVENT_LOST,
+)
+
+
+class FakeBackend(AdapterBackend):
+    """Adapter backend whose adapters and change feed are set by hand"""
+
+    name = "fake"
+    # The adapters only exist in this process
+    isolatable = False
+
+    def __init__(self, supports_events=True):
+        super().__init__()
+        self.supports_events = supports_events
+        self._lock = threading.Lock()
+        self._adapters = {}
+        self._addresses = {}
+        self._counters = {}
+
+    @classmethod
+    def available(cls):
+        return True
+
+    @classmethod
+    def from_argument(cls, argument):
+        # "fake:poll" has no change feed, so the core falls back to polling
+        if argument not in ("", "events", "poll"):
+            raise ValueError(f"The fake backend takes 'events' or 'poll', not '{argument}'")
+        return cls(supports_events=argument != "poll")
+
+    def snapshot(self, counters=False):
+        with self._lock:
+            return AdapterSnapshot(self._adapters.values(), counters=dict(self._counters) if counters else None)
+
+    def addresses(self):
+        with self._lock:
+            return {guid: list(addresses) for guid, addresses in self._addresses.items()}
+
+    def set_adapter(self, name, status, guid=None, index=0, connection_id=None, notify=True):
+        """Add or update an adapter, emitting a link event unless notify is False"""
+        guid = guid or name
+        with self._lock:
+            self._adapters[guid] = Adapter(name, guid, index, connection_id or name, status)
+        if notify:
+            self.emit(guid)
+
+    def remove_adapter(self, guid, notify=True):
+        """Remove an adapter, as if it had been disabled or unplugged"""
+        with self._lock:
+            self._adapters.pop(guid, None)
+            self._addresses.pop(guid, None)
+        if notify:
+            self.emit(guid)
+
+    def set_counters(self, guid, counters):
+        """Set an adapter's AdapterCounters"""
+        with self._lock:
+            self._counters[guid] = counters
+
+    def set_addresses(self, guid, addresses, notify=True):
+        """Replace an adapter's [(address, prefix length), ...]"""
+        with self._lock:
+            self._addresses[guid] = list(addresses)
+        if notify:
+            self.emit(guid, EVENT_ADDRESS)
+
+    def add_address(self, guid, address, prefix=None, notify=True):
+        """Assign one more address to an adapter"""
+        with self._lock:
+            self._addresses.setdefault(guid, []).append((address, prefix))
+        if notify:
+            self._notify(AdapterEvent(EVENT_ADDRESS_ADDED, guid, address, prefix))
+
+    def remove_address(self, guid, address, notify=True):
+        """Take an address off an adapter"""
+        with self._lock:
+            self._addresses[guid] = [entry for entry in self._addresses.get(guid, []) if entry[0] != address]
+        if notify:
+            self._notify(AdapterEvent(EVENT_ADDRESS_REMOVED, guid, address))
+
+    def _start_watching(self):
+        return self.supports_events
+
+    def emit(self, adapter, kind=EVENT_LINK):
+        """Deliver a change event for adapter to the watcher"""
+        self._notify(AdapterEvent(kind, adapter))
+
+    def lose_watch(self):
+        """Fail the change feed, as a dead WMI or rtnetlink subscription does"""
+        self._notify(AdapterEvent(EVENT_LOST, None))
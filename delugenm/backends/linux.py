@@ -0,0 +1,309 @@
+"""
+Linux backend for Network Monitor
+
+Reads adapter state from /sys/class/net and addresses from an rtnetlink
+dump, and listens on an rtnetlink socket for link and address changes so
+the core gets push notifications instead of polling.
+"""
+
+import errno
+import logging
+import os
+import select
+import socket
+import struct
+import sys
+import threading
+
+from . import (
+    Adapter,
+    AdapterBackend,
+    AdapterCounters,
+    AdapterEvent,
+    AdapterSnapshot,
+    EVENT_ADDRESS_ADDED,
+    EVENT_ADDRESS_REMOVED,
+    EVENT_LINK,
+    EVENT_LOST,
+)
+from ..common import (
+    STATUS_AUTHENTICATING,
+    STATUS_CONNECTED,
+    STATUS_CONNECTING,
+    STATUS_DISCONNECTED,
+    STATUS_HARDWARE_NOT_PRESENT,
+    STATUS_MEDIA_DISCONNECTED,
+)
+
+log = logging.getLogger(__name__)
+
+SYS_CLASS_NET = "/sys/class/net"
+PROC_NET_DEV = "/proc/net/dev"
+
+# Interface flags (linux/if.h)
+IFF_UP = 0x1
+IFF_LOOPBACK = 0x8
+
+# rtnetlink (linux/netlink.h, linux/rtnetlink.h, linux/if_addr.h)
+NETLINK_ROUTE = 0
+NLM_F_REQUEST = 0x1
+NLM_F_DUMP = 0x300
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_NEWADDR = 20
+RTM_DELADDR = 21
+RTM_GETADDR = 22
+RTMGRP_LINK = 0x1
+RTMGRP_IPV4_IFADDR = 0x10
+RTMGRP_IPV6_IFADDR = 0x100
+IFLA_IFNAME = 3
+IFA_ADDRESS = 1
+IFA_LOCAL = 2
+
+NLMSGHDR = struct.Struct("=IHHII")
+IFINFOMSG = struct.Struct("=BxHiII")
+IFADDRMSG = struct.Struct("=BBBBI")
+RTATTR = struct.Struct("=HH")
+
+# How often (s) the event watcher wakes up to check whether it should stop
+WATCH_TIMEOUT = 1.0
+
+# operstate (RFC 2863, as exposed in sysfs) -> adapter status
+OPERSTATE_STATUS = {
+    "up": STATUS_CONNECTED,
+    "dormant": STATUS_AUTHENTICATING,
+    "testing": STATUS_CONNECTING,
+    "lowerlayerdown": STATUS_MEDIA_DISCONNECTED,
+    "notpresent": STATUS_HARDWARE_NOT_PRESENT,
+}
+
+
+def _read_sysfs(ifname, attribute):
+    """Read one /sys/class/net/<ifname>/<attribute> value, None if it can't be read"""
+    try:
+        with open(os.path.join(SYS_CLASS_NET, ifname, attribute)) as f:
+            return f.read().strip()
+    except (IOError, OSError):
+        # carrier raises EINVAL while the interface is administratively down
+        return None
+
+
+def _read_counters():
+    """{interface name: AdapterCounters} for every interface, from one read of /proc/net/dev"""
+    try:
+        with open(PROC_NET_DEV) as f:
+            lines = f.readlines()[2:]
+    except (IOError, OSError):
+        return {}
+    counters = {}
+    for line in lines:
+        ifname, _, fields = line.partition(":")
+        fields = fields.split()
+        if len(fields) < 11:
+            continue
+        # Receive: bytes packets errs drop fifo frame compressed multicast, then transmit: bytes packets errs ...
+        counters[ifname.strip()] = AdapterCounters(
+            int(fields[0]), int(fields[8]), int(fields[1]), int(fields[9]), int(fields[2]), int(fields[10])
+        )
+    return counters
+
+
+def _align(length):
+    return (length + 3) & ~3
+
+
+def _parse_attributes(data, offset, end):
+    """Yield (type, payload) for each rtattr between offset and end"""
+    while offset + RTATTR.size <= end:
+        length, attr_type = RTATTR.unpack_from(data, offset)
+        if length < RTATTR.size:
+            break
+        yield attr_type, data[offset + RTATTR.size:offset + length]
+        offset += _align(length)
+
+
+def _parse_messages(data):
+    """Yield (type, payload) for each netlink message in data"""
+    offset = 0
+    while offset + NLMSGHDR.size <= len(data):
+        length, msg_type, _flags, _seq, _pid = NLMSGHDR.unpack_from(data, offset)
+        if length < NLMSGHDR.size:
+            break
+        yield msg_type, data[offset + NLMSGHDR.size:offset + length]
+        offset += _align(length)
+
+
+def _parse_address(payload):
+    """Return (interface index, address, prefix length) from an RTM_*ADDR payload"""
+    family, prefix, _flags, _scope, index = IFADDRMSG.unpack_from(payload)
+    attributes = dict(_parse_attributes(payload, IFADDRMSG.size, len(payload)))
+    # IFA_LOCAL is the interface's own address on point-to-point links
+    raw = attributes.get(IFA_LOCAL) or attributes.get(IFA_ADDRESS)
+    if raw is None or family not in (socket.AF_INET, socket.AF_INET6):
+        return index, None, prefix
+    return index, socket.inet_ntop(family, raw), prefix
+
+
+def _parse_link(payload):
+    """Return (interface index, interface name) from an RTM_*LINK payload"""
+    _family, _type, index, _flags, _change = IFINFOMSG.unpack_from(payload)
+    for attr_type, value in _parse_attributes(payload, IFINFOMSG.size, len(payload)):
+        if attr_type == IFLA_IFNAME:
+            return index, value.rstrip(b"\0").decode("utf-8", "replace")
+    return index, None
+
+
+def _index_to_name(index):
+    try:
+        return socket.if_indextoname(index)
+    except OSError:
+        return None
+
+
+class LinuxBackend(AdapterBackend):
+    """Adapter backend using sysfs and rtnetlink"""
+
+    name = "linux"
+
+    def __init__(self):
+        super().__init__()
+        self._watch_thread = None
+        self._watching = threading.Event()
+        self._seq = 0
+
+    @classmethod
+    def available(cls):
+        return sys.platform.startswith("linux") and os.path.isdir(SYS_CLASS_NET)
+
+    def snapshot(self, counters=False):
+        adapters = []
+        for ifname in sorted(os.listdir(SYS_CLASS_NET)):
+            adapter = self._read_adapter(ifname)
+            if adapter:
+                adapters.append(adapter)
+        if counters:
+            names = {adapter.guid for adapter in adapters}
+            counters = {ifname: value for ifname, value in _read_counters().items() if ifname in names}
+        return AdapterSnapshot(adapters, counters=counters or None)
+
+    def _read_adapter(self, ifname):
+        """Build an Adapter from sysfs, or None for loopback and administratively down interfaces"""
+        flags = _read_sysfs(ifname, "flags")
+        ifindex = _read_sysfs(ifname, "ifindex")
+        if flags is None or ifindex is None:
+            # Interface vanished while we were reading it
+            return None
+
+        flags = int(flags, 16)
+        if flags & IFF_LOOPBACK or not flags & IFF_UP:
+            return None
+
+        operstate = _read_sysfs(ifname, "operstate")
+        if operstate in OPERSTATE_STATUS:
+            status = OPERSTATE_STATUS[operstate]
+        elif operstate == "down":
+            status = STATUS_MEDIA_DISCONNECTED if _read_sysfs(ifname, "carrier") == "0" else STATUS_DISCONNECTED
+        else:
+            # "unknown" is common for tun/tap and other virtual links; trust the carrier
+            status = STATUS_CONNECTED if _read_sysfs(ifname, "carrier") == "1" else STATUS_DISCONNECTED
+
+        return Adapter(
+            name=ifname,
+            guid=ifname,
+            index=int(ifindex),
+            connection_id=_read_sysfs(ifname, "ifalias") or ifname,
+            status=status
+        )
+
+    def addresses(self):
+        result = {}
+        for index, address, prefix in self._dump_addresses():
+            ifname = _index_to_name(index)
+            if ifname and address:
+                result.setdefault(ifname, []).append((address, prefix))
+        return result
+
+    def _dump_addresses(self):
+        """Yield (interface index, address, prefix length) for every address via RTM_GETADDR"""
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+        try:
+            sock.bind((0, 0))
+            self._seq += 1
+            request = NLMSGHDR.pack(
+                NLMSGHDR.size + IFADDRMSG.size, RTM_GETADDR, NLM_F_REQUEST | NLM_F_DUMP, self._seq, 0
+            ) + IFADDRMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)
+            sock.send(request)
+
+            while True:
+                data = sock.recv(65536)
+                for msg_type, payload in _parse_messages(data):
+                    if msg_type == NLMSG_DONE:
+                        return
+                    if msg_type == NLMSG_ERROR:
+                        code = -struct.unpack_from("=i", payload)[0]
+                        raise OSError(code, os.strerror(code))
+                    if msg_type == RTM_NEWADDR:
+                        yield _parse_address(payload)
+        finally:
+            sock.close()
+
+    def _start_watching(self):
+        sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+        try:
+            sock.bind((0, RTMGRP_LINK | RTMGRP_IPV4_IFADDR | RTMGRP_IPV6_IFADDR))
+        except OSError:
+            sock.close()
+            raise
+
+        # A fresh flag per subscription, so a watcher that is still winding down can't be revived.
+        # The thread owns the socket; an unwatch() before it starts running mustn't take it away.
+        self._watching = threading.Event()
+        self._watching.set()
+        self._watch_thread = threading.Thread(target=self._watch_loop, args=(sock, self._watching), daemon=True)
+        self._watch_thread.start()
+        log.info("Subscribed to rtnetlink link and address events")
+        return True
+
+    def _stop_watching(self):
+        # The watcher notices within WATCH_TIMEOUT and closes its socket; don't make the caller wait for it
+        self._watching.clear()
+        self._watch_thread = None
+
+    def _watch_loop(self, sock, watching):
+        """Read rtnetlink multicast messages from sock and turn them into AdapterEvents"""
+        try:
+            self._read_events(sock, watching)
+        except Exception as e:
+            if watching.is_set():
+                log.error(f"rtnetlink change notification failed: {e}")
+        finally:
+            sock.close()
+        if watching.is_set():
+            # Still subscribed as far as the caller knows; tell it the feed is gone
+            self._notify(AdapterEvent(EVENT_LOST, None))
+
+    def _read_events(self, sock, watching):
+        while watching.is_set():
+            try:
+                readable, _, _ = select.select([sock], [], [], WATCH_TIMEOUT)
+                if not readable:
+                    continue
+                data = sock.recv(65536)
+            except OSError as e:
+                if e.errno == errno.ENOBUFS:
+                    # Kernel dropped messages; we no longer know what changed
+                    log.warning("rtnetlink receive buffer overrun, requesting a full recheck")
+                    self._notify(AdapterEvent(EVENT_LINK, None))
+                    continue
+                raise
+
+            for msg_type, payload in _parse_messages(data):
+                if msg_type in (RTM_NEWLINK, RTM_DELLINK):
+                    index, ifname = _parse_link(payload)
+                    self._notify(AdapterEvent(EVENT_LINK, ifname or _index_to_name(index)))
+                elif msg_type in (RTM_NEWADDR, RTM_DELADDR):
+                    index, address, prefix = _parse_address(payload)
+                    kind = EVENT_ADDRESS_ADDED if msg_type == RTM_NEWADDR else EVENT_ADDRESS_REMOVED
+                    self._notify(AdapterEvent(kind, _index_to_name(index), address, prefix))
@@ -0,0 +1,100 @@
+"""
+Replay backend for Network Monitor
+
+Plays a recorded trace (see trace.py) back to the running plugin as if it
+were the network stack, sped up: backend = "replay:PATH" or
+"replay:PATH@SPEED" (default 1, real time). Each check gets the snapshot
+that was current at that point of the trace, a recorded probe timeout
+makes checks time out until the next snapshot, and recorded change events
+are delivered at their (sped up) times. After the end of the trace the last
+snapshot stays.
+"""
+
+import bisect
+import threading
+import time
+
+from . import AdapterBackend, AdapterSnapshot
+from ..trace import RECORD_EVENT, RECORD_SNAPSHOT, RECORD_TIMEOUT, read_trace
+
+
+class ReplayBackend(AdapterBackend):
+    """Adapter backend that plays a trace file back"""
+
+    name = "replay"
+    # The trace's clock starts when the backend is created
+    isolatable = False
+
+    def __init__(self, spec=""):
+        super().__init__()
+        # A trailing @SPEED, unless what follows the @ is part of the path
+        path, separator, speed = spec.rpartition("@")
+        try:
+            self.speed = float(speed) if separator else 1.0
+        except ValueError:
+            path, self.speed = spec, 1.0
+        if not separator:
+            path = spec
+        if not path:
+            raise ValueError("The replay backend needs a trace: replay:PATH or replay:PATH@SPEED")
+        if self.speed <= 0:
+            raise ValueError(f"Replay speed must be more than 0, not {self.speed}")
+
+        self.path = path
+        records = read_trace(path)
+        # Snapshots and timeouts in trace order, and when each became current
+        self._checks = [record for record in records if record.kind in (RECORD_SNAPSHOT, RECORD_TIMEOUT)]
+        self._check_times = [record.timestamp for record in self._checks]
+        self._events = [record for record in records if record.kind == RECORD_EVENT]
+        # Start at the first snapshot; before it there is nothing to report
+        self._origin = self._check_times[0] if self._check_times else 0.0
+        self._started = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def available(cls):
+        return True
+
+    @classmethod
+    def from_argument(cls, argument):
+        return cls(argument)
+
+    def trace_time(self):
+        """The point of the trace being played now"""
+        return self._origin + (time.monotonic() - self._started) * self.speed
+
+    def snapshot(self, counters=False):
+        from ..worker import ProbeTimeout
+
+        index = bisect.bisect_right(self._check_times, self.trace_time()) - 1
+        if index < 0:
+            return AdapterSnapshot([])
+        record = self._checks[index]
+        if record.kind == RECORD_TIMEOUT:
+            raise ProbeTimeout(f"Probe timed out in the trace at {record.timestamp:.3f}")
+        return AdapterSnapshot(record.value.adapters)
+
+    def addresses(self):
+        # Addresses aren't recorded
+        return {}
+
+    def _start_watching(self):
+        if not self._events:
+            return False
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._play_events, name="NetworkMonitorReplay", daemon=True)
+        self._thread.start()
+        return True
+
+    def _stop_watching(self):
+        self._stop.set()
+
+    def _play_events(self):
+        now = self.trace_time()
+        for record in self._events:
+            if record.timestamp < now:
+                continue
+            if self._stop.wait((record.timestamp - self.trace_time()) / self.speed):
+                return
+            self._notify(record.value)
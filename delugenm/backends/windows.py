@@ -0,0 +1,201 @@
+"""
+WMI backend for Network Monitor
+"""
+
+import logging
+import threading
+
+try:
+    import pythoncom
+    import wmi
+    WMI_AVAILABLE = True
+except ImportError:
+    WMI_AVAILABLE = False
+
+from . import (
+    Adapter,
+    AdapterBackend,
+    AdapterCounters,
+    AdapterEvent,
+    AdapterSnapshot,
+    EVENT_ADDRESS,
+    EVENT_LINK,
+    EVENT_LOST,
+)
+
+log = logging.getLogger(__name__)
+
+# Only the properties we use, only for enabled adapters, in one round-trip
+ADAPTER_QUERY = (
+    "SELECT Name, GUID, InterfaceIndex, NetConnectionID, NetConnectionStatus "
+    "FROM Win32_NetworkAdapter WHERE NetEnabled = TRUE"
+)
+ADDRESS_QUERY = (
+    "SELECT InterfaceIndex, IPAddress, IPSubnet "
+    "FROM Win32_NetworkAdapterConfiguration WHERE IPEnabled = TRUE"
+)
+# Raw (cumulative) traffic counters; instances are named after the adapter's Name
+COUNTER_QUERY = (
+    "SELECT Name, BytesReceivedPersec, BytesSentPersec, PacketsReceivedPersec, PacketsSentPersec, "
+    "PacketsReceivedErrors, PacketsOutboundErrors FROM Win32_PerfRawData_Tcpip_NetworkInterface"
+)
+
+# Characters the performance counter provider replaces in instance names
+PERF_INSTANCE_CHARS = str.maketrans({"(": "[", ")": "]", "#": "_", "/": "_", "\\": "_"})
+
+# How often (ms) the event watcher wakes up to check whether it should stop
+WATCH_TIMEOUT_MS = 1000
+
+
+class WMIBackend(AdapterBackend):
+    """Adapter backend using Windows Management Instrumentation"""
+
+    name = "wmi"
+
+    def __init__(self):
+        super().__init__()
+        self._watch_thread = None
+        self._watching = threading.Event()
+        self._local = threading.local()
+
+    @classmethod
+    def available(cls):
+        return WMI_AVAILABLE
+
+    def _connection(self):
+        """
+        The long-lived WMI connection for the calling thread.
+        COM objects belong to the apartment that created them, so each
+        thread that queries gets (and keeps) its own connection.
+        """
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            if not getattr(self._local, "com_initialized", False):
+                pythoncom.CoInitialize()
+                self._local.com_initialized = True
+            conn = wmi.WMI()
+            self._local.conn = conn
+        return conn
+
+    def _query(self, wql):
+        """Run a WQL query, reconnecting once if the session has gone bad"""
+        try:
+            return self._connection().query(wql)
+        except Exception as e:
+            log.warning(f"WMI query failed, reconnecting: {e}")
+            self._local.conn = None
+            return self._connection().query(wql)
+
+    def snapshot(self, counters=False):
+        adapters = [
+            Adapter(
+                name=nic.Name or "Unknown",
+                guid=nic.GUID,
+                index=nic.InterfaceIndex,
+                connection_id=nic.NetConnectionID,
+                status=nic.NetConnectionStatus
+            )
+            for nic in self._query(ADAPTER_QUERY)
+        ]
+        return AdapterSnapshot(adapters, counters=self._counters(adapters) if counters else None)
+
+    def _counters(self, adapters):
+        """{GUID: AdapterCounters} from the raw performance counters"""
+        guids = {adapter.name.translate(PERF_INSTANCE_CHARS): adapter.guid for adapter in adapters}
+        result = {}
+        for instance in self._query(COUNTER_QUERY):
+            guid = guids.get(instance.Name)
+            if guid:
+                # 64-bit WMI integers come back as strings
+                result[guid] = AdapterCounters(
+                    int(instance.BytesReceivedPersec or 0),
+                    int(instance.BytesSentPersec or 0),
+                    int(instance.PacketsReceivedPersec or 0),
+                    int(instance.PacketsSentPersec or 0),
+                    int(instance.PacketsReceivedErrors or 0),
+                    int(instance.PacketsOutboundErrors or 0),
+                )
+        return result
+
+    def addresses(self):
+        guids = {adapter.index: adapter.guid for adapter in self.snapshot()}
+        result = {}
+        for ip_config in self._query(ADDRESS_QUERY):
+            guid = guids.get(ip_config.InterfaceIndex)
+            if not guid or not ip_config.IPAddress:
+                continue
+            subnets = ip_config.IPSubnet or ()
+            result[guid] = [
+                (address, _prefix_length(subnets[i] if i < len(subnets) else None))
+                for i, address in enumerate(ip_config.IPAddress)
+            ]
+        return result
+
+    def _start_watching(self):
+        if not WMI_AVAILABLE:
+            return False
+
+        # A fresh flag per subscription, so a watcher that is still winding down can't be revived
+        self._watching = threading.Event()
+        self._watching.set()
+        self._watch_thread = threading.Thread(target=self._watch_loop, args=(self._watching,), daemon=True)
+        self._watch_thread.start()
+        return True
+
+    def _stop_watching(self):
+        # The watcher notices within WATCH_TIMEOUT_MS; don't make the caller wait for it
+        self._watching.clear()
+        self._watch_thread = None
+
+    def _watch_loop(self, watching):
+        """
+        Wait for __InstanceModificationEvent on Win32_NetworkAdapter (link
+        state) and Win32_NetworkAdapterConfiguration (addresses)
+        """
+        # WMI connections are bound to the COM apartment of the thread that made them
+        pythoncom.CoInitialize()
+        try:
+            c = wmi.WMI()
+            link_watcher = c.Win32_NetworkAdapter.watch_for(
+                notification_type="Modification",
+                delay_secs=1,
+                fields=["NetConnectionStatus", "NetEnabled"]
+            )
+            address_watcher = c.Win32_NetworkAdapterConfiguration.watch_for(
+                notification_type="Modification",
+                delay_secs=1,
+                fields=["IPAddress", "IPSubnet"]
+            )
+            log.info("Subscribed to WMI network adapter change events")
+
+            # Alternate between the two watchers so each waits half the timeout
+            timeout_ms = WATCH_TIMEOUT_MS // 2
+            while watching.is_set():
+                try:
+                    nic = link_watcher(timeout_ms=timeout_ms)
+                    self._notify(AdapterEvent(EVENT_LINK, nic.GUID or nic.Name))
+                except wmi.x_wmi_timed_out:
+                    pass
+                try:
+                    ip_config = address_watcher(timeout_ms=timeout_ms)
+                    # WMI doesn't say which address changed, only that the list did
+                    self._notify(AdapterEvent(EVENT_ADDRESS, ip_config.SettingID))
+                except wmi.x_wmi_timed_out:
+                    pass
+        except Exception as e:
+            if watching.is_set():
+                log.error(f"WMI change notification failed: {e}")
+        finally:
+            pythoncom.CoUninitialize()
+        if watching.is_set():
+            # Still subscribed as far as the caller knows; tell it the feed is gone
+            self._notify(AdapterEvent(EVENT_LOST, None))
+
+
+def _prefix_length(subnet):
+    """IPSubnet holds dotted masks for IPv4 and prefix lengths for IPv6"""
+    if not subnet:
+        return None
+    if "." not in subnet:
+        return int(subnet)
+    return sum(bin(int(octet)).count("1") for octet in subnet.split("."))
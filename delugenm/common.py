@@ -0,0 +1,50 @@
+"""
+Shared constants for Network Monitor
+"""
+
+# Network adapter status codes (Win32_NetworkAdapter.NetConnectionStatus).
+# Backends for other platforms map their native link states onto these.
+STATUS_DISCONNECTED = 0
+STATUS_CONNECTING = 1
+STATUS_CONNECTED = 2
+STATUS_DISCONNECTING = 3
+STATUS_HARDWARE_NOT_PRESENT = 5
+STATUS_MEDIA_DISCONNECTED = 7
+STATUS_AUTHENTICATING = 8
+STATUS_AUTHENTICATION_SUCCEEDED = 9
+STATUS_AUTHENTICATION_FAILED = 10
+STATUS_INVALID_ADDRESS = 11
+STATUS_CREDENTIALS_REQUIRED = 12
+# Not a Windows code: the backend couldn't tell (WMI reports no status)
+STATUS_UNKNOWN = -2
+
+# Active connection statuses (adapter is up/connected)
+ACTIVE_STATUSES = {STATUS_CONNECTED, STATUS_AUTHENTICATION_SUCCEEDED}
+
+# Statuses that suggest an adapter is about to change state; checked at the fast cadence
+DEGRADED_STATUSES = {
+    STATUS_CONNECTING,
+    STATUS_DISCONNECTING,
+    STATUS_MEDIA_DISCONNECTED,
+    STATUS_AUTHENTICATING,
+    STATUS_CREDENTIALS_REQUIRED,
+}
+
+# Statuses that trip the kill-switch at once, without waiting for confirmation
+HARD_FAILURE_STATUSES = {STATUS_HARDWARE_NOT_PRESENT}
+
+# Display names of the status codes, for the UIs
+STATUS_NAMES = {
+    STATUS_DISCONNECTED: "Disconnected",
+    STATUS_CONNECTING: "Connecting",
+    STATUS_CONNECTED: "Connected",
+    STATUS_DISCONNECTING: "Disconnecting",
+    STATUS_HARDWARE_NOT_PRESENT: "Hardware Not Present",
+    STATUS_MEDIA_DISCONNECTED: "Media Disconnected",
+    STATUS_AUTHENTICATING: "Authenticating",
+    STATUS_AUTHENTICATION_SUCCEEDED: "Authentication Succeeded",
+    STATUS_AUTHENTICATION_FAILED: "Authentication Failed",
+    STATUS_INVALID_ADDRESS: "Invalid Address",
+    STATUS_CREDENTIALS_REQUIRED: "Credentials Required",
+    STATUS_UNKNOWN: "Unknown",
+}
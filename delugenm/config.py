@@ -1,4 +1,8 @@
 # Configuration template for Network Monitor plugin
+#
+# The settings live in deluge_windows_network_monitor.conf in Deluge's config
+# directory. Edits to that file while Deluge runs apply from the next check;
+# an edit with an invalid value is logged and ignored.
 
 # Check interval in seconds (how often to check network status)
 check_interval = 5
@@ -8,5 +12,120 @@ check_interval = 5
 # Example: required_adapters = ["Ethernet", "WiFi"]
 required_adapters = []
 
+# Rule over adapters, replacing required_adapters when set. Patterns match an
+# adapter's name, connection name or GUID, with * ? [...] wildcards and
+# ignoring case; quote them if they contain spaces. AND, OR, NOT and
+# parentheses combine them. Deluge's interface adapters are ANDed on.
+# Example: adapter_policy = 'VPN_TAP AND (Ethernet OR "Wi-Fi*")'
+adapter_policy = ""
+
+# Seconds the adapter list offered by the UIs (list_adapters) may be old.
+# The list always comes from the monitor's latest check; an older one brings
+# the next check forward instead of querying the backend per request.
+adapter_list_ttl = 5.0
+
 # Enable debug logging
 debug = False
+
+# How to notice adapter changes:
+#   "event" - react to the backend's change notifications (WMI adapter
+#             modification events) and only poll every fallback_interval
+#             seconds as a safety net
+#   "poll"  - check every check_interval seconds
+monitor_mode = "event"
+
+# Safety-net poll interval in seconds while change notifications are active
+fallback_interval = 60
+
+# Keep Deluge's session paused from plugin start until the first check shows
+# the monitored adapters up, so nothing can leak while the backend starts.
+hold_until_first_check = True
+
+# Where adapter information comes from: "auto", "wmi", "linux" or "fake"
+# ("fake:poll" without change events), or "replay:PATH[@SPEED]" to play a
+# recorded trace back, SPEED times faster
+backend = "auto"
+
+# Adaptive polling: while adapters are stable the interval grows from
+# check_interval toward max_check_interval (fallback_interval when change
+# notifications are active). As soon as an adapter looks degraded
+# (connecting, authenticating, media disconnected...) or a check errors,
+# checks run every fast_check_interval seconds. Each delay gets
+# +/- check_jitter (a fraction) of randomness.
+max_check_interval = 30
+fast_check_interval = 0.5
+check_jitter = 0.1
+
+# Flap suppression: an adapter only counts as down once trip_samples of the
+# last trip_window checks failed and it has been failing for at least
+# min_down_duration seconds. Hardware-not-present trips immediately.
+# Set all three to 1, 1 and 0 to act on the first failed check.
+trip_samples = 3
+trip_window = 5
+min_down_duration = 2.0
+
+# What to do when the required adapters are confirmed down:
+#   "shutdown" - shut the Deluge daemon down (restart it by hand)
+#   "pause"    - pause the libtorrent session at once and resume it, with
+#                every torrent's own state intact, when the adapters are
+#                confirmed up again
+action = "shutdown"
+
+# Before a kill-switch shutdown the session is paused at once, then the
+# resume data of every torrent and the torrent state are written out in one
+# go, for at most this many seconds, before the daemon is stopped. 0 leaves
+# all the saving to Deluge's own shutdown.
+shutdown_flush_budget = 10.0
+
+# When the adapter behind Deluge's listen_interface / outgoing_interface
+# address gets a new address (e.g. the VPN reconnected), point Deluge at the
+# new address instead of tripping. The session is held paused during the switch.
+rebind_on_address_change = True
+
+# Run backend queries in a supervised worker process. A query that takes
+# longer than probe_timeout seconds gets the worker killed and restarted,
+# and counts according to probe_timeout_policy:
+#   "down"       - every adapter is treated as down for that sample
+#   "last_known" - the last successful result is used again
+#   "ignore"     - the sample is skipped
+probe_isolation = True
+probe_timeout = 10.0
+probe_timeout_policy = "down"
+
+# Egress probes: once the monitored adapters look connected, check that
+# traffic actually gets out of them. Targets are "tcp:host:port" (a connection
+# is established) or "udp:host:port" (a DNS server answers a query), sent from
+# the address of the adapter behind Deluge's interface, else of the required
+# adapters. All probes run at once; the first answer within egress_timeout
+# seconds passes. Failures go through the same flap suppression as adapters.
+# A check with no address to probe from (e.g. the adapter has no routable
+# address yet) sends no probes and leaves the last outcome as it was.
+# Example: egress_targets = ["udp:1.1.1.1:53", "tcp:9.9.9.9:443"]
+egress_targets = []
+egress_timeout = 2.0
+
+# Stall detection: read each adapter's byte, packet and error counters along
+# with every check, and warn when a monitored adapter moved fewer than
+# stall_min_rate bytes per second over stall_window seconds, or had at least
+# as many errors as packets, while Deluge had peers connected. Monitored means
+# named by required_adapters, adapter_policy or Deluge's interfaces; with
+# none of those, only every connected adapter stalling at once counts. Off by
+# default because on Windows it adds a query of the network performance
+# counters to each check.
+stall_detection = False
+stall_window = 30.0
+stall_min_rate = 16.0
+
+# Status samples (and, separately, transitions) kept per adapter for the
+# history view. Each sample takes about 13 bytes.
+history_size = 4096
+
+# Record every check's adapter statuses, change events and probe timeouts to
+# this file (relative to Deluge's config directory), for replaying later
+# with "python -m delugenm.replay". Appended to, never rotated; "" is off.
+trace_file = ""
+
+# Publish whether the kill-switch is armed or tripped and every adapter's
+# status to this memory-mapped file (relative to Deluge's config directory)
+# after every check, for local tools to poll with delugenm/status.py. "" is off.
+status_file = ""
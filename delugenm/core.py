@@ -2,74 +2,168 @@
 Core plugin logic for Network Monitor
 """
 
+import copy
 import logging
-import threading
+import os
 import time
+from collections import deque
 from datetime import datetime
 
-try:
-    import wmi
-    WMI_AVAILABLE = True
-except ImportError:
-    WMI_AVAILABLE = False
+from twisted.internet import defer, reactor, threads
+from twisted.python.threadpool import ThreadPool
 
-from deluge.core.pluginmanager import CorePluginBase
+from deluge.plugins.pluginbase import CorePluginBase
 from deluge import component
-from deluge.configmanager import ConfigManager
+from deluge.configmanager import ConfigManager, get_config_dir
+from deluge.core.rpcserver import export
+
+from .addrindex import AddressIndex
+from .backends import (
+    get_backend,
+    AdapterEvent,
+    AdapterSnapshot,
+    EVENT_ADDRESS,
+    EVENT_ADDRESS_ADDED,
+    EVENT_ADDRESS_REMOVED,
+    EVENT_LINK,
+    EVENT_LOST,
+)
+from .common import (
+    STATUS_DISCONNECTED,
+    STATUS_CONNECTING,
+    STATUS_CONNECTED,
+    STATUS_DISCONNECTING,
+    STATUS_HARDWARE_NOT_PRESENT,
+    STATUS_MEDIA_DISCONNECTED,
+    STATUS_AUTHENTICATING,
+    STATUS_AUTHENTICATION_SUCCEEDED,
+    STATUS_AUTHENTICATION_FAILED,
+    STATUS_INVALID_ADDRESS,
+    STATUS_CREDENTIALS_REQUIRED,
+    ACTIVE_STATUSES,
+)
+from .decision import INTERFACE_KEYS, Decider
+from .history import HistoryStore
+from .metrics import MetricsRegistry
+from .scheduler import AdaptiveSchedule
+from .status import STATUS_MISSING, StatusWriter
+from .settings import (
+    CONFIG_FILE,
+    CONFIG_KEYS,
+    DEFAULTS,
+    RESTART_KEYS,
+    MODE_EVENT,
+    ACTION_PAUSE,
+    TIMEOUT_DOWN,
+    TIMEOUT_LAST_KNOWN,
+    Settings,
+    coerce_floats,
+)
+from .trace import TraceWriter
+from .traffic import TrafficMonitor
+from .worker import ProbeTimeout, ProbeWorker, isolation_supported
 
 log = logging.getLogger(__name__)
 
-# Network adapter status codes
-STATUS_DISCONNECTED = 0
-STATUS_CONNECTING = 1
-STATUS_CONNECTED = 2
-STATUS_DISCONNECTING = 3
-STATUS_HARDWARE_NOT_PRESENT = 5
-STATUS_MEDIA_DISCONNECTED = 7
-STATUS_AUTHENTICATING = 8
-STATUS_AUTHENTICATION_SUCCEEDED = 9
-STATUS_AUTHENTICATION_FAILED = 10
-STATUS_INVALID_ADDRESS = 11
-STATUS_CREDENTIALS_REQUIRED = 12
 
-# Active connection statuses (adapter is up/connected)
-ACTIVE_STATUSES = {STATUS_CONNECTED, STATUS_AUTHENTICATION_SUCCEEDED}
+# Worker threads for blocking backend queries
+PROBE_THREADS = 2
+
+# Config keys that shape the adaptive check schedule
+SCHEDULE_KEYS = ("check_interval", "fallback_interval", "max_check_interval", "fast_check_interval", "check_jitter")
+
+# Config keys for flagging adapters that move no traffic
+STALL_KEYS = ("stall_detection", "stall_window", "stall_min_rate")
+
+# Number of recent probe durations kept for latency percentiles
+PROBE_LATENCY_SAMPLES = 1000
+
+# Seconds before resubscribing to change notifications that failed, doubling up to the maximum
+WATCH_RETRY_MIN = 5.0
+WATCH_RETRY_MAX = 300.0
 
 
 class Core(CorePluginBase):
     def enable(self):
         """Enable the plugin"""
         try:
-            if not WMI_AVAILABLE:
-                log.error("WMI module not available. Install pywin32 to use this plugin.")
-                return
-            
             log.info("Network Monitor plugin enabled")
-            self.monitor_thread = None
+            self._enabled = True
+            self.backend = None
+            self.holding = False
+            # {interface key: address} Deluge was rebound to, until a check confirms it
+            self._rebinding = None
             self.monitoring = False
+            self.events_active = False
+            self._watch_retry = None
+            self._watch_retry_delay = WATCH_RETRY_MIN
+            self._pool = None
+            self._next_check = None
+            self._check_running = False
+            self._recheck = False
+            self._degraded = False
+            self._last_check_failed = False
+            self.tripped = False
+            self._resume_session_on_recovery = False
+            self.last_trip_latency = None
+            self.last_resume_latency = None
+            self.prober = None
+            self._last_snapshot = None
+            self.probe_durations = deque(maxlen=PROBE_LATENCY_SAMPLES)
+            self._pending_events = []
+            self._interfaces_dirty = False
+            self._last_success = None
+            self._last_success_time = None
+            self.state_version = 0
+            self._state_fingerprint = None
+            self._state_cache = None
+            self._adapter_list_cache = None
+            self._build_metrics()
+            self.address_index = AddressIndex()
+            self.interface_adapters = {}
+            self.interface_values = {}
+            self._bound_addresses = set()
+            self.last_egress = None
+            self.stalled_adapters = []
             
-            # Load configuration
-            self.config = ConfigManager("deluge_windows_network_monitor.conf", defaults={
-                "check_interval": 5,
-                "required_adapters": []
-            })
+            # Load configuration. The running configuration is self.settings, an
+            # immutable snapshot that is only ever replaced as a whole.
+            self.config = ConfigManager(CONFIG_FILE, defaults=copy.deepcopy(DEFAULTS))
+            coerce_floats(self.config.config)
+            self._config_path = get_config_dir(CONFIG_FILE)
+            self._config_stat = self._stat_config_file()
+            self.settings = Settings.build({key: self.config[key] for key in CONFIG_KEYS}, strict=False)
+            settings = self.settings
+            self.decider = Decider(settings, on_transition=self._on_transition)
+            self._build_traffic_monitor()
+            self.history = HistoryStore(settings.history_size)
+            self.trace = None
+            self._open_trace()
+            self.status = None
+            self._status_version = None
+            self._open_status()
             
-            self.check_interval = self.config["check_interval"]
-            self.required_adapters = self.config["required_adapters"].copy() if self.config["required_adapters"] else []
+            # Also monitor the adapters behind Deluge's configured network interfaces,
+            # and follow them when core.conf changes
+            self.deluge_config = ConfigManager("core.conf")
+            for key in INTERFACE_KEYS:
+                self.deluge_config.register_set_function(key, self._on_interface_changed, apply_now=False)
             
-            # Add Deluge's configured network interface if set
-            deluge_config = ConfigManager("core.conf")
-            deluge_interface = deluge_config.get("listen_interface")
-            if deluge_interface:
-                # Get the network adapter name associated with this interface
-                adapter_name = self._get_adapter_for_interface(deluge_interface)
-                if adapter_name and adapter_name not in self.required_adapters:
-                    self.required_adapters.append(adapter_name)
-                    log.info(f"Added Deluge interface adapter '{adapter_name}' to required_adapters")
+            log.info(f"Configuration loaded - action: {settings.action}, monitor_mode: {settings.monitor_mode}, "
+                     f"check_interval: {settings.check_interval}s, max_check_interval: {settings.max_check_interval}s, "
+                     f"fast_check_interval: {settings.fast_check_interval}s, trip after {settings.trip_samples} of "
+                     f"{settings.trip_window} failed checks over {settings.min_down_duration}s, "
+                     f"fallback_interval: {settings.fallback_interval}s, required_adapters: {list(settings.required_adapters)}, "
+                     f"adapter_policy: '{settings.adapter_policy}', egress_targets: {list(settings.egress_targets)}")
             
-            log.info(f"Configuration loaded - check_interval: {self.check_interval}s, required_adapters: {self.required_adapters}")
+            # Nothing can leak while the backend starts up and the first check runs
+            if settings.hold_until_first_check:
+                self._hold_session()
             
-            self._start_monitoring()
+            # Importing the backend, COM setup and the first full adapter scan are slow;
+            # do them off the reactor so the daemon's startup doesn't wait for them
+            d = threads.deferToThread(self._start_backend)
+            d.addCallbacks(self._on_backend_started, self._on_backend_error)
         except Exception as e:
             log.error(f"Error enabling Network Monitor plugin: {e}", exc_info=True)
             raise
@@ -77,139 +171,1023 @@ class Core(CorePluginBase):
     def disable(self):
         """Disable the plugin"""
         log.info("Network Monitor plugin disabled")
+        self._enabled = False
         self._stop_monitoring()
+        self._stop_prober()
+        self._close_trace()
+        if self.holding or (self.tripped and self.settings.action == ACTION_PAUSE):
+            # Don't leave the session paused with nothing watching to resume it
+            log.info("Resuming session paused by the kill-switch")
+            self.tripped = False
+            self.holding = False
+            self._resume_session()
+        # Readers see the monitor disarmed rather than a record going stale
+        self._publish_status()
+        self._close_status()
+    
+    def _start_backend(self):
+        """
+        Import and set up the adapter backend, and build the address index
+        from a first full query. Runs in a thread. Returns the seconds taken.
+        """
+        started = time.monotonic()
+        backend = get_backend(self.settings.backend)
+        if backend is None:
+            return None
+        self.backend = backend
+        self._start_prober()
+        self._build_address_index()
+        return time.monotonic() - started
+    
+    def _on_backend_started(self, elapsed):
+        if not self._enabled:
+            # Disabled while the backend was starting
+            self._stop_prober()
+            return
+        if elapsed is None:
+            log.error(f"No usable network adapter backend ({self.settings.backend}). "
+                      "On Windows install pywin32 to use this plugin.")
+            self._release_hold()
+            return
+        log.info(f"Using {self.backend.name} adapter backend, ready in {elapsed:.2f}s")
+        self._resolve_interfaces()
+        self._start_monitoring()
+    
+    def _on_backend_error(self, failure):
+        log.error(f"Error starting the adapter backend: {failure.getErrorMessage()}")
+        if self._enabled:
+            self._release_hold()
+    
+    def _hold_session(self, until="the first good adapter check"):
+        """Pause Deluge's traffic until a good check releases it"""
+        self.holding = True
+        self._hold_started = time.monotonic()
+        self._pause_session()
+        self._publish_status()
+        log.info(f"Holding Deluge's traffic until {until}")
+    
+    def _release_hold(self):
+        if not self.holding:
+            return
+        self.holding = False
+        self._rebinding = None
+        self._resume_session()
+        self._publish_status()
+        log.info(f"Released Deluge's traffic after holding it for {time.monotonic() - self._hold_started:.2f}s")
     
     def _start_monitoring(self):
-        """Start the network monitoring thread"""
+        """Start checking on the reactor, with backend queries in a thread pool"""
         if self.monitoring:
             return
         
         self.monitoring = True
-        self.monitor_thread = threading.Thread(target=self._monitor_loop, daemon=True)
-        self.monitor_thread.start()
+        self._start_watching()
+        self._build_schedule()
+        self._pool = ThreadPool(minthreads=0, maxthreads=PROBE_THREADS, name="NetworkMonitor")
+        self._pool.start()
+        self._schedule_check(0)
+        self._publish_status()
         log.info("Network monitoring started")
     
     def _stop_monitoring(self):
-        """Stop the network monitoring thread"""
+        """Stop checking. Never waits for a backend query in progress."""
         self.monitoring = False
-        if self.monitor_thread:
-            self.monitor_thread.join(timeout=5)
+        self._stop_watching()
+        if self._next_check and self._next_check.active():
+            self._next_check.cancel()
+        self._next_check = None
+        if self._pool:
+            # A query stuck in the backend would block ThreadPool.stop(), so stop it off the reactor
+            threads.deferToThread(self._pool.stop)
+            self._pool = None
         log.info("Network monitoring stopped")
     
-    def _monitor_loop(self):
-        """Main monitoring loop"""
-        while self.monitoring:
-            try:
-                if not self._check_network_status():
-                    log.warning("Network interface not connected - shutting down Deluge")
-                    self._shutdown_deluge()
-                    break
-                
-                time.sleep(self.check_interval)
-            except Exception as e:
-                log.error(f"Error in monitoring loop: {e}")
-                time.sleep(self.check_interval)
+    def _build_metrics(self):
+        """Set up the metrics registry exported by get_metrics"""
+        self.metrics = MetricsRegistry("deluge_network_monitor_")
+        self._probe_duration = self.metrics.histogram(
+            "probe_duration_seconds", "Duration of adapter backend queries, by backend")
+        self._detection_to_action = self.metrics.histogram(
+            "detection_to_action_seconds", "Time from the first failed check to Deluge's traffic being stopped")
+        self._checks_total = self.metrics.counter("checks_total", "Adapter checks completed")
+        self._transitions_total = self.metrics.counter(
+            "state_transitions_total", "Adapter state machine transitions, by new state")
+        self._trips_total = self.metrics.counter("trips_total", "Times the kill-switch tripped")
+        self._recoveries_total = self.metrics.counter("recoveries_total", "Times a paused session was resumed")
+        self._errors_total = self.metrics.counter("errors_total", "Adapter checks that failed with an error")
+        self._timeouts_total = self.metrics.counter("timeouts_total", "Adapter probes that missed their deadline")
+        self._egress_duration = self.metrics.histogram(
+            "egress_duration_seconds", "Time until the first egress probe answered, or all of them failed")
+        self._egress_failures_total = self.metrics.counter(
+            "egress_failures_total", "Egress probe rounds in which no target answered")
+        self._stalls_total = self.metrics.counter(
+            "traffic_stalls_total", "Times a monitored adapter stopped moving traffic while Deluge had peers")
+        self.metrics.gauge("stalled_adapters", "Monitored adapters currently moving no traffic",
+                           lambda: len(self.stalled_adapters))
+        self.metrics.gauge(
+            "seconds_since_last_success", "Seconds since the last successful adapter check",
+            lambda: time.monotonic() - self._last_success if self._last_success is not None else None)
+        self.metrics.gauge("tripped", "1 while the kill-switch is tripped", lambda: int(self.tripped))
+        self.metrics.gauge("monitoring", "1 while checks are scheduled", lambda: int(self.monitoring))
+    
+    def _on_transition(self, key, previous, state, status):
+        self._transitions_total.inc(state=state)
+    
+    def _start_prober(self):
+        """Decide where backend queries run: a supervised worker process, or in-process"""
+        if self.settings.probe_isolation and self.backend.isolatable and isolation_supported():
+            self.prober = ProbeWorker(self.backend.name, self.settings.probe_timeout)
+            log.info(f"Adapter probes run in a worker process with a {self.settings.probe_timeout}s deadline")
+        else:
+            self.prober = self.backend
+            log.info("Adapter probes run in-process")
+    
+    def _stop_prober(self):
+        if isinstance(self.prober, ProbeWorker):
+            self.prober.stop()
+        self.prober = None
+    
+    def _start_watching(self):
+        """Subscribe to adapter change notifications when in event mode"""
+        if self.settings.monitor_mode != MODE_EVENT:
+            return
+        
+        self.events_active = self._subscribe()
+        if self.events_active:
+            log.info(f"Watching {self.backend.name} adapter change events, "
+                     f"polling every {self.settings.fallback_interval}s as a fallback")
+        else:
+            log.warning(f"{self.backend.name} backend has no change notifications, "
+                        f"polling every {self.settings.check_interval}-{self.settings.max_check_interval}s")
     
-    def _check_network_status(self):
+    def _subscribe(self):
+        return self.backend.watch(lambda event: reactor.callFromThread(self._on_adapter_event, event))
+    
+    def _stop_watching(self):
+        """Unsubscribe from adapter change notifications"""
+        if self._watch_retry is not None and self._watch_retry.active():
+            self._watch_retry.cancel()
+        self._watch_retry = None
+        self._watch_retry_delay = WATCH_RETRY_MIN
+        if self.events_active:
+            self.backend.unwatch()
+            self.events_active = False
+    
+    def _on_watch_lost(self):
         """
-        Check if network interfaces are connected.
-        Returns True if at least one active interface is found, False otherwise.
+        The backend's change feed died. Poll at the normal adaptive cadence
+        instead of the slow fallback one, and resubscribe with backoff.
         """
-        if not WMI_AVAILABLE:
-            return True  # Can't check, assume network is OK
-        
+        log.error(f"{self.backend.name} change notifications stopped, polling every "
+                  f"{self.settings.check_interval}-{self.settings.max_check_interval}s until they are back")
+        self.backend.unwatch()
+        self.events_active = False
+        self._build_schedule()
+        # Whatever changed meanwhile went unreported; rebuild the address index
+        self._pending_events.append(AdapterEvent(EVENT_LINK, None))
+        self._schedule_check(0)
+        self._watch_retry = reactor.callLater(self._watch_retry_delay, self._retry_watching)
+    
+    def _retry_watching(self):
+        self._watch_retry = None
+        if not self.monitoring or self.events_active or self.settings.monitor_mode != MODE_EVENT:
+            return
+        if self._subscribe():
+            log.info(f"Watching {self.backend.name} adapter change events again")
+            self.events_active = True
+            self._watch_retry_delay = WATCH_RETRY_MIN
+            self._build_schedule()
+            return
+        self._watch_retry_delay = min(self._watch_retry_delay * 2, WATCH_RETRY_MAX)
+        log.warning(f"Could not resubscribe to {self.backend.name} change notifications, "
+                    f"trying again in {self._watch_retry_delay}s")
+        self._watch_retry = reactor.callLater(self._watch_retry_delay, self._retry_watching)
+    
+    def _on_adapter_event(self, event):
+        """Called on the reactor when the backend reports an adapter change"""
+        if not self.monitoring:
+            return
+        if event.kind == EVENT_LOST:
+            self._on_watch_lost()
+            return
+        self._write_trace("write_event", event)
+        self._pending_events.append(event)
+        self._schedule_check(0)
+    
+    def _on_interface_changed(self, key, value):
+        """Called by Deluge when listen_interface or outgoing_interface changes"""
+        if not self.monitoring:
+            return
+        log.info(f"Deluge {key} changed to '{value}'")
+        self._interfaces_dirty = True
+        self._schedule_check(0)
+    
+    def _process_events(self, events):
+        """
+        Apply adapter events to the address index.
+        Runs in the probe thread pool. Returns True if any addresses changed.
+        """
+        addresses_changed = False
+        for event in events:
+            log.debug("Adapter change event: %s %s %s", event.kind, event.adapter, event.address or "")
+            if event.kind == EVENT_ADDRESS_ADDED:
+                self.address_index.add(event.adapter, event.address, event.prefix)
+            elif event.kind == EVENT_ADDRESS_REMOVED:
+                self.address_index.remove(event.adapter, event.address)
+            elif event.kind == EVENT_ADDRESS:
+                if event.adapter is None:
+                    self._build_address_index()
+                else:
+                    self.address_index.replace(event.adapter, self.prober.addresses().get(event.adapter, []))
+            elif event.adapter is None:
+                # The backend lost track of what changed
+                self._build_address_index()
+            else:
+                continue
+            addresses_changed = True
+        return addresses_changed
+    
+    def _build_address_index(self):
+        """Build the address index from a full backend query"""
         try:
-            c = wmi.WMI()
-            active_adapters = []
+            self.address_index.rebuild(self.prober.addresses(), self.prober.snapshot())
+        except Exception as e:
+            log.error(f"Error building adapter address index: {e}")
+    
+    def _resolve_interfaces(self):
+        """
+        Map Deluge's listen/outgoing interfaces to adapter GUIDs, and rebind
+        Deluge if the adapter behind an interface address got a new address.
+        """
+        rebinds = {}
+        for key in INTERFACE_KEYS:
+            interface = self.deluge_config.get(key)
+            previous = self.interface_adapters.get(key)
+            unchanged = interface and interface == self.interface_values.get(key)
             
-            for nic in c.Win32_NetworkAdapter():
-                if not nic.NetEnabled:
+            if unchanged and previous and self.settings.rebind_on_address_change and key in self._bound_addresses:
+                new_address = self.address_index.moved_address(interface, previous)
+                if new_address:
+                    rebinds[key] = new_address
                     continue
-                
-                adapter_status = nic.NetConnectionStatus
-                adapter_name = nic.Name or "Unknown"
-                
-                # Check if status indicates connected
-                if adapter_status in ACTIVE_STATUSES:
-                    active_adapters.append(adapter_name)
-                    log.debug(f"Active adapter found: {adapter_name} (status: {adapter_status})")
             
-            # If we have required adapters, check if any are active
-            if self.required_adapters:
-                for req_adapter in self.required_adapters:
-                    for nic in c.Win32_NetworkAdapter():
-                        if nic.Name == req_adapter and nic.NetConnectionStatus in ACTIVE_STATUSES:
-                            return True
-                return False
-            else:
-                # If no specific adapters required, just need at least one active
-                if active_adapters:
-                    log.debug(f"Active adapters: {', '.join(active_adapters)}")
-                    return True
-                else:
-                    log.warning("No active network adapters found")
-                    return False
+            guid = self.address_index.resolve(interface) if interface else None
+            if guid is None and unchanged and previous:
+                # The address went away (e.g. the VPN is reconnecting); Deluge is
+                # still bound to it, so keep monitoring the adapter it was on
+                log.debug("Deluge %s '%s' is gone from adapter %s", key, interface, previous)
+                guid = previous
+            elif guid != previous:
+                if guid:
+                    log.info(f"Deluge {key} '{interface}' is on adapter {guid}")
+                elif interface:
+                    log.warning(f"Deluge {key} '{interface}' does not match any adapter")
+            self.interface_adapters[key] = guid
+            self.interface_values[key] = interface
+            # Only an address that was actually assigned to the adapter can move
+            if guid and interface in self.address_index.addresses_for(guid):
+                self._bound_addresses.add(key)
+            elif not unchanged:
+                self._bound_addresses.discard(key)
+        self.decider.set_interfaces(self.interface_adapters.values())
         
+        if rebinds:
+            self._rebind(rebinds)
+    
+    def _rebind(self, changes):
+        """
+        Point Deluge's listen/outgoing interfaces at new addresses in one
+        config change. Unless the kill-switch has the session paused, its
+        traffic is held from here until a check confirms the new binding
+        (see _rebind_confirmed), which is run straight away.
+        """
+        log.info(f"Adapter address changed, rebinding Deluge: {changes}")
+        for key, address in changes.items():
+            self.interface_values[key] = address
+        if not self.tripped:
+            if not self.holding:
+                self._hold_session(f"Deluge is bound to {changes}")
+            self._rebinding = dict(changes)
+        try:
+            component.get("Core").set_config(changes)
         except Exception as e:
-            log.error(f"Error checking network status: {e}")
-            return True  # Assume OK on error to avoid false shutdowns
+            log.error(f"Error rebinding Deluge to {changes}: {e}")
+            # Nothing will confirm it; the next good check releases the hold
+            self._rebinding = None
+        # The next check resolves the interfaces afresh and marks them bound again
+        self._bound_addresses.difference_update(changes)
+        self._interfaces_dirty = True
+        self._schedule_check(0)
     
-    def _get_adapter_for_interface(self, interface_ip):
+    def _rebind_confirmed(self):
         """
-        Get the network adapter name for a given IP interface.
+        Whether Deluge's config holds the addresses of the last rebind, and a
+        check since has found each assigned to its adapter (True if there is
+        no rebind pending)
         """
-        if not WMI_AVAILABLE:
+        if self._rebinding is None:
+            return True
+        for key, address in self._rebinding.items():
+            if self.deluge_config.get(key) != address or key not in self._bound_addresses:
+                return False
+        log.info(f"Deluge is bound to {self._rebinding}")
+        self._rebinding = None
+        return True
+    
+    def _stat_config_file(self):
+        """(mtime, size) of the config file, or None if it can't be read"""
+        try:
+            stat = os.stat(self._config_path)
+        except OSError:
             return None
+        return stat.st_mtime_ns, stat.st_size
+    
+    def _reload_config_file(self):
+        """
+        Apply edits made to the config file while the plugin runs. Called
+        before each check; costs one stat() unless the file changed. An edit
+        that doesn't validate is logged and the running settings are kept.
+        """
+        stat = self._stat_config_file()
+        if stat is None or stat == self._config_stat:
+            return
+        self._config_stat = stat
+        try:
+            self.config.load()
+            coerce_floats(self.config.config)
+            settings = self.settings.updated({key: self.config[key] for key in CONFIG_KEYS})
+        except Exception as e:
+            log.error(f"Ignoring the edited {CONFIG_FILE}: {e}")
+            return
+        self._apply_settings(settings, CONFIG_FILE)
+    
+    def _save_settings(self, settings):
+        """Write settings to the config file (never the adapters merged in from core.conf)"""
+        for key, value in settings.config().items():
+            self.config[key] = value
+        self.config.save()
+        # Our own write is not an edit to reload
+        self._config_stat = self._stat_config_file()
+    
+    def _apply_settings(self, settings, source):
+        """
+        Swap in a new settings snapshot and rebuild only what depends on the
+        keys that changed. Checks pick the new snapshot up as a whole.
+        """
+        previous, self.settings = self.settings, settings
+        changed = previous.changed(settings)
+        if not changed:
+            return
+        log.info(f"Settings changed by {source}: "
+                 + ", ".join(f"{key}={getattr(settings, key)!r}" for key in sorted(changed)))
         
+        self.decider.set_settings(settings, changed)
+        if changed.intersection(STALL_KEYS):
+            self._build_traffic_monitor()
+        if "egress_targets" in changed:
+            self.last_egress = None
+        if "trace_file" in changed:
+            self._open_trace()
+        if "status_file" in changed:
+            self._open_status()
+        if "probe_timeout" in changed and isinstance(self.prober, ProbeWorker):
+            self.prober.timeout = settings.probe_timeout
+        if self.monitoring:
+            if "monitor_mode" in changed:
+                self._stop_watching()
+                self._start_watching()
+            if changed.intersection(SCHEDULE_KEYS + ("monitor_mode",)):
+                self._build_schedule()
+        for key in sorted(changed.intersection(RESTART_KEYS)):
+            log.info(f"{key} takes effect the next time the plugin starts")
+        self._bump_state_version()
+    
+    def _data_path(self, path):
+        """A trace_file / status_file path, relative to Deluge's config directory"""
+        return path if os.path.isabs(path) else get_config_dir(path)
+    
+    def _open_trace(self):
+        """Start recording backend results to trace_file"""
+        self._close_trace()
+        if not self.settings.trace_file:
+            return
+        path = self._data_path(self.settings.trace_file)
         try:
-            c = wmi.WMI()
-            # Search for network adapter configuration with matching IP address
-            for ip_config in c.Win32_NetworkAdapterConfiguration():
-                if not ip_config.IPAddress:
-                    continue
-                
-                # Check if the interface IP is in this adapter's IP list
-                if interface_ip in ip_config.IPAddress:
-                    # Find the corresponding adapter
-                    for nic in c.Win32_NetworkAdapter():
-                        if nic.Index == ip_config.Index:
-                            return nic.Name
-            
+            self.trace = TraceWriter(path)
+            log.info(f"Recording adapter states to {path}")
+        except OSError as e:
+            log.error(f"Could not open trace file {path}: {e}")
+    
+    def _close_trace(self):
+        if self.trace is not None:
+            trace, self.trace = self.trace, None
+            try:
+                trace.close()
+            except OSError as e:
+                log.error(f"Error closing trace {trace.path}: {e}")
+    
+    def _write_trace(self, method, *args):
+        """Append a record to the trace, if one is being recorded"""
+        if self.trace is None:
+            return
+        try:
+            getattr(self.trace, method)(*args)
+        except Exception as e:
+            log.error(f"Error writing trace {self.trace.path}, recording stopped: {e}")
+            self._close_trace()
+    
+    def _open_status(self):
+        """Start publishing the monitor's state to status_file"""
+        self._close_status()
+        if not self.settings.status_file:
+            return
+        path = self._data_path(self.settings.status_file)
+        try:
+            self.status = StatusWriter(path)
+            log.info(f"Publishing status to {path}")
+        except (OSError, ValueError) as e:
+            log.error(f"Could not open status file {path}: {e}")
+            return
+        self._status_version = None
+        self._publish_status()
+    
+    def _close_status(self):
+        if self.status is not None:
+            status, self.status = self.status, None
+            try:
+                status.close()
+            except (OSError, ValueError) as e:
+                log.error(f"Error closing status file {status.path}: {e}")
+    
+    def _publish_status(self):
+        """
+        Write the current state to the status file, if one is published. The
+        adapters are only packed again when the state version has moved on.
+        """
+        if self.status is None:
+            return
+        adapters = None
+        if self._status_version != self.state_version:
+            self._status_version = self.state_version
+            snapshot = self._last_snapshot
+            adapters = [
+                (adapter.name, adapter.guid, adapter.connection_id, adapter.index, adapter.status,
+                 self.decider.is_required(adapter))
+                for adapter in (snapshot.adapters if snapshot else ())
+            ]
+            # Required adapters that are missing altogether
+            adapters.extend((key, None, None, 0, STATUS_MISSING, True) for key in sorted(self.decider.required)
+                            if snapshot is None or snapshot.find(key) is None)
+        try:
+            self.status.publish(self._last_success_time, self.monitoring, self.tripped, self.holding,
+                                self.decider.healthy, adapters)
+        except Exception as e:
+            log.error(f"Error writing status file {self.status.path}, publishing stopped: {e}")
+            self._close_status()
+    
+    def _build_schedule(self):
+        """
+        Set up the adaptive schedule. With change events active, stable checks are
+        only a safety net and back off to fallback_interval instead.
+        """
+        maximum = self.settings.fallback_interval if self.events_active else self.settings.max_check_interval
+        self.schedule = AdaptiveSchedule(
+            base=self.settings.check_interval,
+            maximum=maximum,
+            fast=self.settings.fast_check_interval,
+            jitter=self.settings.check_jitter
+        )
+    
+    def _build_traffic_monitor(self):
+        """Set up the traffic counter windows used to spot stalled adapters"""
+        self.traffic = TrafficMonitor(window=self.settings.stall_window, min_rate=self.settings.stall_min_rate)
+        self.stalled_adapters = []
+    
+    def _wait_interval(self):
+        """Seconds to wait before the next check if no change event arrives"""
+        # While paused by the kill-switch, watch closely so traffic resumes quickly
+        degraded = self._degraded or self.tripped
+        return self.schedule.next_delay(degraded=degraded, errored=self._last_check_failed)
+    
+    def _schedule_check(self, delay):
+        """(Re)schedule the next check on the reactor"""
+        if not self.monitoring:
+            return
+        if self._check_running:
+            # Check again as soon as the one in progress finishes
+            if delay == 0:
+                self._recheck = True
+            return
+        if self._next_check and self._next_check.active():
+            if self._next_check.getTime() - reactor.seconds() <= delay:
+                return
+            self._next_check.cancel()
+        self._next_check = reactor.callLater(delay, self._run_check)
+    
+    def _run_check(self):
+        """Query the backend in the thread pool and act on the result on the reactor"""
+        self._next_check = None
+        if not self.monitoring:
+            return
+        
+        # Edits to the config file apply from this check on
+        self._reload_config_file()
+        # The whole check works from one settings snapshot, even if it's replaced meanwhile
+        settings = self.settings
+        
+        events, self._pending_events = self._pending_events, []
+        self._check_running = True
+        self._recheck = False
+        d = threads.deferToThreadPool(reactor, self._pool, self._probe, events, settings)
+        if self.prober is self.backend:
+            # A hung in-process query can't be killed, but we can stop waiting for it
+            d.addTimeout(settings.probe_timeout, reactor)
+        d.addCallbacks(self._on_probe_result, self._on_probe_error)
+        d.addBoth(self._on_check_done)
+    
+    def _probe(self, events, settings):
+        """
+        Blocking part of a check, run in the thread pool.
+        Returns (addresses changed, AdapterSnapshot, egress result or None,
+        seconds the backend query took).
+        """
+        started = time.monotonic()
+        addresses_changed = self._process_events(events)
+        snapshot = self.prober.snapshot(settings.stall_detection)
+        elapsed = time.monotonic() - started
+        self._probe_duration.observe(elapsed, backend=self.backend.name)
+        egress = self._probe_egress(snapshot, settings) if settings.egress else None
+        return addresses_changed, snapshot, egress, elapsed
+    
+    def _egress_sources(self, snapshot, settings):
+        """
+        Addresses to send egress probes from: those of the adapters behind
+        Deluge's interfaces, else those of the connected required adapters.
+        [None] means unbound (nothing specific is required).
+        """
+        guids = [guid for guid in self.interface_adapters.values() if guid]
+        if not guids:
+            if settings.policy_tree is None and not settings.required_adapters:
+                return [None] if snapshot.active_keys else []
+            guids = [adapter.guid for adapter in snapshot.adapters
+                     if adapter.status in ACTIVE_STATUSES and self.decider.is_required(adapter)]
+        from .egress import usable_sources
+        return usable_sources(address for guid in guids for address in self.address_index.addresses_for(guid))
+    
+    def _probe_egress(self, snapshot, settings):
+        """
+        Check that traffic gets out of the monitored adapters, once the adapters
+        themselves look connected. Runs in the probe thread pool.
+        Returns an egress.EgressResult, or None if there was nothing to probe from.
+        """
+        sources = self._egress_sources(snapshot, settings)
+        if not sources:
             return None
+        from .egress import probe
+        result = probe(settings.egress, sources, settings.egress_timeout)
+        self._egress_duration.observe(result.elapsed)
+        return result
+    
+    def _on_probe_result(self, result):
+        addresses_changed, snapshot, egress, elapsed = result
+        # Only ever touched on the reactor: a timed-out probe can still finish in a pool thread
+        self.probe_durations.append(elapsed)
+        self._last_check_failed = False
+        self._last_snapshot = snapshot
+        self._last_success = time.monotonic()
+        self._last_success_time = time.time()
+        self._checks_total.inc()
+        self._write_trace("write_snapshot", snapshot)
+        if not self.monitoring:
+            return
+        
+        if addresses_changed or self._interfaces_dirty:
+            self._interfaces_dirty = False
+            self._resolve_interfaces()
+        
+        self._on_egress_result(egress)
+        if self.settings.stall_detection:
+            self._check_traffic(snapshot)
+        self._evaluate(snapshot)
+        self._record_history(snapshot)
+    
+    def _check_traffic(self, snapshot):
+        """
+        Flag monitored adapters that moved no traffic, or mostly errors, over
+        stall_window while Deluge had peers connected. The counters came with
+        the snapshot.
+        """
+        self.traffic.update(snapshot.timestamp, snapshot.counters)
+        stalled = []
+        if self._deluge_has_peers():
+            specific = self.decider.specific
+            monitored = [adapter.guid for adapter in snapshot.adapters
+                         if adapter.status in ACTIVE_STATUSES and (not specific or self.decider.is_required(adapter))]
+            stalled = [guid for guid in monitored if self.traffic.stalled(guid)]
+            if not specific and len(stalled) < len(monitored):
+                # With any adapter allowed, one that moves traffic is enough
+                stalled = []
+        
+        newly_stalled = set(stalled).difference(self.stalled_adapters)
+        if newly_stalled:
+            self._stalls_total.inc(len(newly_stalled))
+            for guid in sorted(newly_stalled):
+                log.warning(f"Adapter {guid} is connected but moved no traffic, or mostly errors, in "
+                            f"{self.settings.stall_window}s while Deluge has peers (rates: {self.traffic.rates(guid)})")
+        elif self.stalled_adapters and not stalled:
+            log.info("Traffic is moving through the monitored adapters again")
+        self.stalled_adapters = stalled
+    
+    def _deluge_has_peers(self):
+        """Whether Deluge has any peers connected, i.e. traffic should be moving"""
+        try:
+            return component.get("Core").get_session_status(["num_peers"]).get("num_peers", 0) > 0
         except Exception as e:
-            log.error(f"Error getting adapter for interface {interface_ip}: {e}")
+            log.debug("Could not read Deluge's session status: %s", e)
+            return False
+    
+    def _on_egress_result(self, egress):
+        previous, self.last_egress = self.last_egress, egress
+        if egress is None or egress.ok:
+            if egress is not None and previous is not None and not previous.ok:
+                log.info(f"Egress probe to {egress.target.host}:{egress.target.port} answered again")
+            return
+        self._egress_failures_total.inc()
+        if previous is None or previous.ok:
+            log.warning(f"No egress probe answered within {self.settings.egress_timeout}s: {'; '.join(egress.errors)}")
+    
+    def _record_history(self, snapshot):
+        """Add a sample per adapter (and per missing required adapter) to the history"""
+        samples = {}
+        for adapter in snapshot.adapters:
+            key = adapter.guid or adapter.name
+            samples[key] = (adapter.status, self.address_index.address_hash(key))
+        for key in self.decider.required:
+            if snapshot.find(key) is None:
+                samples[key] = (None, 0)
+        self.history.record(time.time(), samples)
+    
+    def _evaluate(self, snapshot):
+        """Run a snapshot through the trip logic and act on the outcome"""
+        now = time.monotonic()
+        if not self._check_network_status(snapshot, now):
+            if not self.tripped:
+                self._trip(now)
+        elif self.tripped and self.decider.healthy:
+            self._recover(now)
+        elif self.holding and self.decider.healthy and self._rebind_confirmed():
+            self._release_hold()
+        self._update_state_version()
+        self._publish_status()
+    
+    def _on_probe_error(self, failure):
+        self._last_check_failed = True
+        if failure.check(ProbeTimeout, defer.TimeoutError):
+            self.probe_durations.append(self.settings.probe_timeout)
+            self._probe_duration.observe(self.settings.probe_timeout, backend=self.backend.name)
+            self._timeouts_total.inc()
+            self._write_trace("write_timeout")
+            log.warning(f"Adapter probe timed out after {self.settings.probe_timeout}s "
+                        f"(recent probe latency {self._latency_summary()}), treating as {self.settings.probe_timeout_policy}")
+            if not self.monitoring:
+                return
+            if self.settings.probe_timeout_policy == TIMEOUT_DOWN:
+                self._evaluate(AdapterSnapshot([]))
+            elif self.settings.probe_timeout_policy == TIMEOUT_LAST_KNOWN and self._last_snapshot is not None:
+                self._evaluate(self._last_snapshot)
+            return
+        
+        self._errors_total.inc()
+        log.error(f"Error checking network status: {failure.getErrorMessage()}")
+        # Assume OK on error to avoid false shutdowns
+    
+    def _update_state_version(self):
+        """Bump state_version if anything get_state reports (apart from config) changed"""
+        snapshot = self._last_snapshot
+        fingerprint = (
+            tuple((adapter.guid, adapter.name, adapter.connection_id, adapter.status,
+                   self.address_index.address_hash(adapter.guid))
+                  for adapter in snapshot.adapters) if snapshot else None,
+            tuple(sorted(self.decider.detector.states().items())),
+            tuple(sorted(self.interface_adapters.items())),
+            self.events_active,
+            self.tripped,
+            self.holding,
+            self.monitoring,
+            self.last_egress.ok if self.last_egress else None,
+            tuple(self.stalled_adapters),
+        )
+        if fingerprint != self._state_fingerprint:
+            self._state_fingerprint = fingerprint
+            self._bump_state_version()
+    
+    def _bump_state_version(self):
+        self.state_version += 1
+        self._state_cache = None
+        self._adapter_list_cache = None
+    
+    def _adapter_list(self, snapshot):
+        """Adapters of a snapshot as plain dicts for RPC"""
+        if snapshot is None:
+            return []
+        return [
+            {
+                "name": adapter.name,
+                "guid": adapter.guid,
+                "index": adapter.index,
+                "connection_id": adapter.connection_id,
+                "status": adapter.status,
+                "addresses": self.address_index.addresses_for(adapter.guid),
+                "required": self.decider.is_required(adapter),
+            }
+            for adapter in snapshot.adapters
+        ]
+    
+    def _cached_adapter_list(self):
+        """_adapter_list of the latest snapshot, built once per state version"""
+        if self._adapter_list_cache is None:
+            self._adapter_list_cache = self._adapter_list(self._last_snapshot)
+        return self._adapter_list_cache
+    
+    def _egress_summary(self):
+        egress = self.last_egress
+        if egress is None:
             return None
+        return {
+            "ok": egress.ok,
+            "target": f"{egress.target.protocol}:{egress.target.host}:{egress.target.port}" if egress.ok else None,
+            "source": egress.source,
+            "elapsed": egress.elapsed,
+            "errors": egress.errors,
+        }
+    
+    def _health(self):
+        """Health fields that state_version covers; see _check_health() for the rest"""
+        return {
+            "backend": self.backend.name if self.backend else None,
+            "monitoring": self.monitoring,
+            "events_active": self.events_active,
+            "tripped": self.tripped,
+            "holding": self.holding,
+            "adapter_states": self.decider.detector.states(),
+            "interface_adapters": dict(self.interface_adapters),
+            "stalled_adapters": list(self.stalled_adapters),
+            "last_trip_latency": self.last_trip_latency,
+            "last_resume_latency": self.last_resume_latency,
+        }
+    
+    def _check_health(self):
+        """The health fields every successful check changes, which don't move state_version"""
+        return {
+            "last_success": self._last_success_time,
+            "egress": self._egress_summary(),
+        }
+    
+    def _latency_summary(self):
+        """p50/p90/p99/max of the recent probe durations, for logging"""
+        durations = sorted(self.probe_durations)
+        if not durations:
+            return "n/a"
+        
+        def percentile(p):
+            return durations[min(len(durations) - 1, int(p / 100.0 * len(durations)))] * 1000
+        
+        return (f"p50 {percentile(50):.0f}ms, p90 {percentile(90):.0f}ms, "
+                f"p99 {percentile(99):.0f}ms, max {durations[-1] * 1000:.0f}ms")
+    
+    def _on_check_done(self, _result):
+        self._check_running = False
+        if self._recheck:
+            self._schedule_check(0)
+        else:
+            self._schedule_check(self._wait_interval())
+    
+    def _check_network_status(self, snapshot, now=None):
+        """
+        Feed an AdapterSnapshot to the trip detector.
+        Returns False once the adapter policy is confirmed false, or without
+        one, the required adapters (or, with none required, all adapters) are
+        confirmed down. True otherwise.
+        """
+        now = time.monotonic() if now is None else now
+        
+        # Adapters may have appeared or been renamed
+        self.address_index.update_names(snapshot)
+        
+        egress = self.last_egress
+        ok = self.decider.check(snapshot, now, None if egress is None else egress.ok)
+        self._degraded = self.decider.degraded
+        return ok
+    
+    def _trip(self, now):
+        """The required adapters are confirmed down: stop Deluge's traffic"""
+        failing_since = self.decider.detector.failing_since()
+        if self.settings.action == ACTION_PAUSE:
+            log.warning(f"Network interface confirmed down ({self.decider.detector.states()}) - pausing Deluge")
+            self.tripped = True
+            if self.holding:
+                # Still held; the hold becomes the trip
+                self.holding = False
+                self._rebinding = None
+            else:
+                self._pause_session()
+        else:
+            log.warning(f"Network interface confirmed down ({self.decider.detector.states()}) - shutting down Deluge")
+            self.tripped = True
+            self._stop_monitoring()
+            self._shutdown_deluge()
+        
+        self._trips_total.inc()
+        done = time.monotonic()
+        self.last_trip_latency = done - now
+        if failing_since is not None:
+            self._detection_to_action.observe(done - failing_since)
+        log.info(f"Kill-switch tripped in {self.last_trip_latency * 1000:.1f}ms"
+                 + (f", {now - failing_since:.2f}s after the first failed check" if failing_since is not None else ""))
+    
+    def _recover(self, now):
+        """The required adapters are back up after a pause: resume Deluge's traffic"""
+        log.info(f"Network interface back up ({self.decider.detector.states()}) - resuming Deluge")
+        self.tripped = False
+        self._resume_session()
+        self._recoveries_total.inc()
+        self.last_resume_latency = time.monotonic() - now
+        log.info(f"Kill-switch reset in {self.last_resume_latency * 1000:.1f}ms")
+    
+    def _pause_session(self):
+        """
+        Pause the libtorrent session. Torrents keep their own paused/queued
+        state underneath, so resuming the session restores it exactly.
+        """
+        try:
+            core = component.get("Core")
+            # Leave a session the user paused themselves paused when we recover
+            self._resume_session_on_recovery = not core.is_session_paused()
+            core.pause_session()
+        except Exception as e:
+            log.error(f"Error pausing Deluge session: {e}")
+    
+    def _resume_session(self):
+        """Resume the libtorrent session if we were the ones who paused it"""
+        if not self._resume_session_on_recovery:
+            log.info("Session was already paused before the kill-switch tripped, leaving it paused")
+            return
+        self._resume_session_on_recovery = False
+        try:
+            component.get("Core").resume_session()
+        except Exception as e:
+            log.error(f"Error resuming Deluge session: {e}")
     
     def _shutdown_deluge(self):
-        """Shutdown Deluge"""
+        """
+        Shut Deluge down, stopping its traffic first: the session is paused at
+        once, then every torrent's resume data and the torrent state are
+        written out in one bulk request bounded by shutdown_flush_budget, and
+        only then is the daemon stopped, whose own save has little left to do.
+        """
+        started = time.monotonic()
         try:
-            log.info("Initiating Deluge shutdown")
-            # Get the daemon component and shutdown
-            component.get("Daemon").shutdown()
+            component.get("Core").pause_session()
         except Exception as e:
-            log.error(f"Error shutting down Deluge: {e}")
+            log.error(f"Error pausing Deluge session before shutdown: {e}")
+        paused = time.monotonic()
+        log.info(f"Deluge session paused in {(paused - started) * 1000:.1f}ms, shutting down")
+        
+        def shutdown(flushed):
+            done = time.monotonic()
+            if flushed:
+                log.info(f"Flushed resume data and torrent state in {(done - paused) * 1000:.0f}ms")
+            elif flushed is not None:
+                log.warning(f"Resume data and torrent state not flushed within {self.settings.shutdown_flush_budget}s, "
+                            "shutting down anyway")
+            try:
+                log.info("Initiating Deluge shutdown")
+                component.get("Daemon").shutdown()
+            except Exception as e:
+                log.error(f"Error shutting down Deluge: {e}")
+            log.info(f"Deluge shutdown requested {(time.monotonic() - started) * 1000:.0f}ms after the kill-switch "
+                     f"tripped (pause {(paused - started) * 1000:.1f}ms, flush {(done - paused) * 1000:.0f}ms)")
+        
+        self._flush_resume_data(self.settings.shutdown_flush_budget).addCallback(shutdown)
     
-    def update_config(self, **kwargs):
-        """Update configuration settings"""
-        if "check_interval" in kwargs:
-            self.check_interval = kwargs["check_interval"]
-            self.config["check_interval"] = self.check_interval
-            log.info(f"Updated check_interval to {self.check_interval}s")
+    def _flush_resume_data(self, budget):
+        """
+        Ask libtorrent for the resume data of every torrent that needs it, all
+        at once, and save the torrent state alongside. Returns a Deferred that
+        fires True once both are written, False if budget seconds ran out
+        first, or None if there was nothing to do (budget 0 or an error).
+        Deluge's own requests are left running, never cancelled.
+        """
+        if budget <= 0:
+            return defer.succeed(None)
+        try:
+            torrentmanager = component.get("TorrentManager")
+            saves = [
+                defer.maybeDeferred(torrentmanager.save_state),
+                defer.maybeDeferred(torrentmanager.save_resume_data, flush_disk_cache=True),
+            ]
+        except Exception as e:
+            log.error(f"Error flushing resume data before shutdown: {e}")
+            return defer.succeed(None)
+        log.info(f"Flushing resume data of {len(torrentmanager.torrents)} torrents, for up to {budget}s")
         
-        if "required_adapters" in kwargs:
-            self.required_adapters = kwargs["required_adapters"]
-            self.config["required_adapters"] = self.required_adapters
-            log.info(f"Updated required_adapters to {self.required_adapters}")
+        result = defer.Deferred()
+        timer = reactor.callLater(budget, result.callback, False)
         
-        self.config.save()
+        def on_saved(outcomes):
+            for ok, value in outcomes:
+                if not ok:
+                    log.error(f"Error flushing resume data before shutdown: {value.getErrorMessage()}")
+            if timer.active():
+                timer.cancel()
+                result.callback(True)
+        
+        defer.DeferredList(saves, consumeErrors=True).addCallback(on_saved)
+        return result
     
-    def get_config(self):
-        """Get current configuration"""
+    @export
+    def get_metrics(self):
+        """Get the monitor's metrics as {name: {"type", "help", "values"}}"""
+        return self.metrics.collect()
+    
+    @export
+    def get_metrics_text(self):
+        """Get the monitor's metrics in the Prometheus text format"""
+        return self.metrics.render_prometheus()
+    
+    @export
+    def get_history_adapters(self):
+        """Get the adapters (GUIDs, or names for missing required adapters) that have history"""
+        return self.history.adapters()
+    
+    @export
+    def get_history(self, adapter, start=None, end=None, max_points=500):
+        """
+        Get an adapter's status history between start and end (seconds since
+        the epoch), downsampled to at most max_points buckets.
+        Returns None for an adapter without history.
+        """
+        return self.history.query(adapter, start, end, max_points)
+    
+    @export
+    def list_adapters(self):
+        """
+        Get the adapters from the monitor's latest snapshot, with their
+        addresses: {"version", "timestamp", "adapters": [{"name", "guid",
+        "index", "connection_id", "status", "addresses", "required"}, ...]}.
+        Never queries the backend itself. A snapshot older than
+        adapter_list_ttl seconds is still returned, but brings the next
+        check forward so the following call gets a fresh one.
+        """
+        snapshot = self._last_snapshot
+        if (self.monitoring and not self._check_running
+                and (snapshot is None or time.time() - snapshot.timestamp > self.settings.adapter_list_ttl)):
+            self._schedule_check(0)
         return {
-            "check_interval": self.check_interval,
-            "required_adapters": self.required_adapters
+            "version": self.state_version,
+            "timestamp": snapshot.timestamp if snapshot else None,
+            "adapters": self._cached_adapter_list(),
         }
     
+    @export
+    def update_config(self, **kwargs):
+        """
+        Update configuration settings. They are validated together with the
+        rest of the configuration first; an invalid one raises ValueError and
+        nothing changes. The new settings apply from the next check.
+        """
+        settings = self.settings.updated(kwargs)
+        self._save_settings(settings)
+        self._apply_settings(settings, "update_config")
+        # Re-check straight away with the new settings
+        self._schedule_check(0)
+    
+    @export
+    def get_state(self, since_version=None):
+        """
+        Get config, the current adapters and monitor health in one call:
+        {"version", "config", "adapters", "health"}. If since_version is the
+        current version nothing else changed, and only {"version",
+        "last_success"} is returned. health's last_success and egress are
+        always those of the latest check.
+        """
+        if since_version is not None and since_version == self.state_version:
+            return {"version": self.state_version, "last_success": self._last_success_time}
+        if self._state_cache is None:
+            self._state_cache = {
+                "version": self.state_version,
+                "config": self.get_config(),
+                "adapters": self._cached_adapter_list(),
+                "health": self._health(),
+            }
+        # Checks don't bump the version, so their own fields are filled in on every call
+        return dict(self._state_cache, health=dict(self._state_cache["health"], **self._check_health()))
+    
+    @export
+    def get_config(self):
+        """Get current configuration"""
+        return self.settings.config()
+    
     def update(self):
         """Called when config is updated"""
         pass
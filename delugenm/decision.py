@@ -0,0 +1,173 @@
+"""
+Kill-switch decisions for Network Monitor
+
+Works out which adapters are required (required_adapters or adapter_policy,
+the adapters behind Deluge's interfaces, egress probes) and feeds each
+snapshot of them through the flap-suppressing trip detector. No Deluge or
+Twisted dependency (the package only loads the plugin when Deluge is
+installed): the plugin, trace replays and the watchdog decide through this
+same code.
+"""
+
+import logging
+
+from .common import STATUS_CONNECTED, STATUS_DISCONNECTED, DEGRADED_STATUSES
+from .hysteresis import TripDetector
+from .policy import OP_AND, OP_TERM, Policy, any_of
+
+log = logging.getLogger(__name__)
+
+# Trip detector key used when no specific adapters are required
+ANY_ADAPTER = "*"
+
+# Trip detector / policy key of the egress probe result
+EGRESS_KEY = "<egress>"
+
+# Config keys for confirming an adapter is down before acting on it
+HYSTERESIS_KEYS = ("trip_samples", "trip_window", "min_down_duration")
+
+# Config keys the required adapters and their policy are made of
+REQUIRED_KEYS = ("required_adapters", "adapter_policy", "egress_targets")
+
+# Deluge core.conf keys whose adapters are monitored in addition to required_adapters
+INTERFACE_KEYS = ("listen_interface", "outgoing_interface")
+
+
+class Decider(object):
+    """
+    The required adapters and the trip detector watching them, for one
+    settings.Settings at a time. check() feeds it an AdapterSnapshot.
+    """
+
+    def __init__(self, settings, on_transition=None):
+        """on_transition: optional callback(key, previous state, new state, status)"""
+        self.settings = settings
+        self.on_transition = on_transition
+        # GUIDs of the adapters behind Deluge's interfaces
+        self.interfaces = ()
+        # Adapter names/GUIDs that count as required, and the policy over them
+        self.required = frozenset()
+        self.policy = None
+        self._policy_key = None
+        # Whether the last check saw a degraded or suspect adapter
+        self.degraded = False
+        self.detector = None
+        self._build_detector()
+        self._update_required()
+
+    def set_settings(self, settings, changed):
+        """Switch to new settings; changed is the set of config keys that differ"""
+        self.settings = settings
+        if changed.intersection(HYSTERESIS_KEYS):
+            self._build_detector()
+        if changed.intersection(REQUIRED_KEYS):
+            self._update_required()
+
+    def set_interfaces(self, guids):
+        """Also require the adapters behind Deluge's interfaces (None entries are skipped)"""
+        interfaces = tuple(sorted({guid for guid in guids if guid}))
+        if interfaces != self.interfaces:
+            self.interfaces = interfaces
+            self._update_required()
+
+    def _build_detector(self):
+        """Set up the flap-suppressing trip detector"""
+        self.detector = TripDetector(
+            samples=self.settings.trip_samples,
+            window=self.settings.trip_window,
+            min_down_duration=self.settings.min_down_duration,
+            on_transition=self.on_transition,
+            policy=self.policy
+        )
+
+    def _update_required(self):
+        """Recompute the set of adapter names/GUIDs that count as required, and the policy over them"""
+        settings = self.settings
+        interfaces = list(self.interfaces)
+        if settings.policy_tree is None and not settings.egress:
+            self.required = frozenset(settings.required_adapters).union(interfaces)
+            self._set_policy(None)
+            return
+
+        if settings.policy_tree is not None:
+            tree = settings.policy_tree
+            if interfaces:
+                # Traffic bound to an interface's adapter must stop when that adapter goes down
+                tree = (OP_AND, tree, any_of(interfaces))
+        else:
+            required = sorted(set(settings.required_adapters).union(interfaces))
+            tree = any_of(required) if required else (OP_TERM, ANY_ADAPTER)
+        if settings.egress:
+            # Connected adapters are not enough; traffic has to get out too
+            tree = (OP_AND, tree, (OP_TERM, EGRESS_KEY))
+
+        # The policy is only recompiled when its expression changes
+        if tree != self._policy_key:
+            self._policy_key = tree
+            self._set_policy(Policy(tree))
+        # Exact names and GUIDs get a history entry while they are missing
+        self.required = frozenset(term for term in self.policy.literal_terms if term != EGRESS_KEY)
+
+    def _set_policy(self, policy):
+        if policy is self.policy:
+            return
+        self.policy = policy
+        self.detector.set_policy(policy)
+
+    def is_required(self, adapter):
+        if self.policy is not None:
+            return self.policy.matches(adapter)
+        return not self.required.isdisjoint((adapter.name, adapter.connection_id, adapter.guid))
+
+    @property
+    def specific(self):
+        """
+        Whether particular adapters are required, rather than any one. The
+        policy built just to add egress probes to "any adapter" doesn't count.
+        """
+        return self.settings.policy_tree is not None or bool(self.required)
+
+    def check(self, snapshot, now, egress_ok=None):
+        """
+        Feed an AdapterSnapshot taken at now (monotonic seconds) to the trip
+        detector, with the last egress probe outcome (None if unknown, which
+        leaves the egress state as it was: until a probe has been sent, the
+        policy can't be confirmed true).
+        Returns False once the adapter policy is confirmed false, or without
+        one, the required adapters (or, with none required, all adapters) are
+        confirmed down. True otherwise.
+        """
+        unknown = ()
+        if self.policy is not None:
+            statuses = self.policy.statuses(snapshot.adapters)
+            degraded = any(status in DEGRADED_STATUSES for status in statuses.values())
+            if self.settings.egress:
+                if egress_ok is None:
+                    # Nothing was probed (e.g. no routable source address): keep the last outcome
+                    unknown = (EGRESS_KEY,)
+                    del statuses[EGRESS_KEY]
+                else:
+                    statuses[EGRESS_KEY] = STATUS_CONNECTED if egress_ok else STATUS_DISCONNECTED
+        elif self.required:
+            statuses = {}
+            for key in self.required:
+                adapter = snapshot.find(key)
+                statuses[key] = adapter.status if adapter else None
+            degraded = any(status in DEGRADED_STATUSES for status in statuses.values())
+        else:
+            # If no specific adapters required, just need at least one active
+            active = bool(snapshot.active_keys)
+            statuses = {ANY_ADAPTER: STATUS_CONNECTED if active else STATUS_DISCONNECTED}
+            degraded = any(adapter.status in DEGRADED_STATUSES for adapter in snapshot.adapters)
+            if not active:
+                log.warning("No active network adapters found")
+
+        tripped = self.detector.update(statuses, now, unknown)
+        # Confirm or clear suspected failures at the fast cadence
+        self.degraded = degraded or self.detector.suspect
+        return not tripped
+
+    @property
+    def healthy(self):
+        """True once the required adapters are confirmed up"""
+        return self.detector.healthy
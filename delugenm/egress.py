@@ -0,0 +1,205 @@
+"""
+Egress reachability probes for Network Monitor
+
+An adapter reporting "connected" doesn't mean traffic flows: a VPN tunnel
+can be up with a dead peer. Egress probes send traffic out from the
+adapter's own address to a few targets and check that something answers:
+
+- tcp:host:port - a TCP connection is established
+- udp:host:port - a datagram (a DNS query for the root servers) gets a reply
+
+All probes run concurrently under asyncio with one overall deadline, and
+stop as soon as one succeeds. ICMP needs raw sockets (administrator / root
+rights), so it isn't offered.
+"""
+
+import asyncio
+import ipaddress
+import os
+import socket
+import struct
+import time
+from collections import namedtuple
+
+PROTOCOL_TCP = "tcp"
+PROTOCOL_UDP = "udp"
+
+DEFAULT_PORTS = {PROTOCOL_TCP: 443, PROTOCOL_UDP: 53}
+
+EgressTarget = namedtuple("EgressTarget", ["protocol", "host", "port"])
+
+# ok: whether any probe succeeded; target and source: the one that did;
+# elapsed: seconds taken; errors: ["target from source: error", ...]
+EgressResult = namedtuple("EgressResult", ["ok", "target", "source", "elapsed", "errors"])
+
+
+def parse_target(text):
+    """
+    Parse "tcp:host:port" or "udp:host:port" (port optional, IPv6 addresses
+    in brackets) into an EgressTarget. Raises ValueError if it is not valid.
+    """
+    protocol, separator, rest = text.strip().partition(":")
+    protocol = protocol.lower()
+    if not separator or protocol not in DEFAULT_PORTS or not rest:
+        raise ValueError(f"Egress target '{text}' is not tcp:host:port or udp:host:port")
+
+    port = None
+    if rest.startswith("["):
+        host, _, port_part = rest[1:].partition("]")
+        if port_part:
+            if not port_part.startswith(":"):
+                raise ValueError(f"Egress target '{text}' has text after the address")
+            port = port_part[1:]
+    elif rest.count(":") == 1:
+        host, port = rest.split(":")
+    else:
+        # A bare IPv6 address, or just a host
+        host = rest
+    if not host:
+        raise ValueError(f"Egress target '{text}' has no host")
+
+    try:
+        port = int(port) if port else DEFAULT_PORTS[protocol]
+    except ValueError:
+        raise ValueError(f"Egress target '{text}' has an invalid port")
+    if not 0 < port < 65536:
+        raise ValueError(f"Egress target '{text}' has an invalid port")
+    return EgressTarget(protocol, host, port)
+
+
+def _dns_query():
+    """A DNS query for the root name servers, which any resolver answers"""
+    header = struct.pack("!HHHHHH", struct.unpack("!H", os.urandom(2))[0], 0x0100, 1, 0, 0, 0)
+    return header + b"\x00" + struct.pack("!HH", 2, 1)
+
+
+def _family(source):
+    if source is None:
+        return 0
+    return socket.AF_INET6 if ipaddress.ip_address(source).version == 6 else socket.AF_INET
+
+
+def _compatible(target, source):
+    """False for an IP address target of the other IP version than source"""
+    if source is None:
+        return True
+    try:
+        return ipaddress.ip_address(target.host).version == ipaddress.ip_address(source).version
+    except ValueError:
+        return True  # A host name; resolved for the source's IP version
+
+
+def usable_sources(addresses):
+    """The addresses probes can be bound to (link-local ones need a scope, so are left out)"""
+    sources = []
+    for address in addresses:
+        try:
+            parsed = ipaddress.ip_address(address)
+        except ValueError:
+            continue
+        if not parsed.is_link_local:
+            sources.append(str(parsed))
+    return sources
+
+
+class _ReplyProtocol(asyncio.DatagramProtocol):
+    """Resolves a future with the first datagram received"""
+
+    def __init__(self, future):
+        self.future = future
+
+    def datagram_received(self, data, addr):
+        if not self.future.done():
+            self.future.set_result(True)
+
+    def error_received(self, exc):
+        if not self.future.done():
+            self.future.set_exception(exc)
+
+
+async def _probe_one(loop, target, source):
+    """Probe one target from one source address. Raises on failure."""
+    socket_type = socket.SOCK_STREAM if target.protocol == PROTOCOL_TCP else socket.SOCK_DGRAM
+    infos = await loop.getaddrinfo(target.host, target.port, family=_family(source), type=socket_type)
+    if not infos:
+        raise OSError(f"no address for {target.host}")
+    family, _, _, _, sockaddr = infos[0]
+    local_addr = (source, 0) if source is not None else None
+
+    if target.protocol == PROTOCOL_TCP:
+        transport, _ = await loop.create_connection(
+            asyncio.Protocol, sockaddr[0], sockaddr[1], family=family, local_addr=local_addr
+        )
+        transport.close()
+        return
+
+    reply = loop.create_future()
+    transport, _ = await loop.create_datagram_endpoint(
+        lambda: _ReplyProtocol(reply), local_addr=local_addr, remote_addr=sockaddr[:2], family=family
+    )
+    try:
+        transport.sendto(_dns_query())
+        await reply
+    finally:
+        transport.close()
+
+
+async def probe_async(targets, sources=(None,), timeout=2.0, loop=None):
+    """
+    Probe every target from every source address concurrently. Returns an
+    EgressResult as soon as one succeeds, or once all failed or timeout
+    seconds have passed.
+    """
+    loop = loop or asyncio.get_event_loop()
+    started = time.monotonic()
+    deadline = started + timeout
+    tasks = {}
+    for target in targets:
+        for source in sources:
+            if not _compatible(target, source):
+                continue
+            task = loop.create_task(_probe_one(loop, target, source))
+            tasks[task] = (target, source)
+
+    errors = []
+    winner = None
+    pending = set(tasks)
+    try:
+        while pending and winner is None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                target, source = tasks[task]
+                error = task.exception()
+                if error is None:
+                    winner = winner or (target, source)
+                    continue
+                errors.append(f"{_describe(target)} from {source or 'any'}: {str(error) or type(error).__name__}")
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.wait(pending)
+
+    if winner is None and pending:
+        errors.append(f"{len(pending)} probes got no answer within {timeout}s")
+    elapsed = time.monotonic() - started
+    if winner is not None:
+        return EgressResult(True, winner[0], winner[1], elapsed, errors)
+    return EgressResult(False, None, None, elapsed, errors or ["nothing to probe"])
+
+
+def probe(targets, sources=(None,), timeout=2.0):
+    """Blocking probe_async(), on an event loop of its own; call it from a worker thread"""
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(probe_async(targets, sources, timeout, loop))
+    finally:
+        loop.close()
+
+
+def _describe(target):
+    host = f"[{target.host}]" if ":" in target.host else target.host
+    return f"{target.protocol}:{host}:{target.port}"
@@ -3,8 +3,10 @@ GTK UI for Network Monitor plugin (optional UI components)
 """
 
 import logging
+import time
 
 try:
+    import gobject
     import gtk
     from deluge.plugins.init import GtkPluginBase
     from deluge.ui.client import client
@@ -12,8 +14,13 @@ try:
 except ImportError:
     GTKUI_AVAILABLE = False
 
+from .common import STATUS_NAMES
+
 log = logging.getLogger(__name__)
 
+# How often (ms) the status is refreshed while the UI is enabled
+STATE_POLL_INTERVAL = 2000
+
 
 class GtkUI(GtkPluginBase):
     """GTK UI for Network Monitor - configuration UI"""
@@ -25,11 +32,16 @@ class GtkUI(GtkPluginBase):
             return
         
         log.info("Network Monitor GTK UI enabled")
+        self.state_version = None
         self._build_ui()
         self._load_config()
+        self._poll_source = gobject.timeout_add(STATE_POLL_INTERVAL, self._poll_state)
     
     def disable(self):
         """Disable GTK UI"""
+        if GTKUI_AVAILABLE and getattr(self, "_poll_source", None):
+            gobject.source_remove(self._poll_source)
+            self._poll_source = None
         log.info("Network Monitor GTK UI disabled")
     
     def _build_ui(self):
@@ -39,6 +51,19 @@ class GtkUI(GtkPluginBase):
             self.vbox = gtk.VBox(spacing=10)
             self.vbox.set_border_width(10)
             
+            # Status section
+            self.status_label = gtk.Label("Waiting for the monitor...")
+            self.status_label.set_alignment(0, 0)
+            self.vbox.pack_start(self.status_label, False, False)
+            
+            self.last_check_label = gtk.Label("")
+            self.last_check_label.set_alignment(0, 0)
+            self.vbox.pack_start(self.last_check_label, False, False)
+            
+            self.adapters_status_label = gtk.Label("")
+            self.adapters_status_label.set_alignment(0, 0)
+            self.vbox.pack_start(self.adapters_status_label, False, False)
+            
             # Check interval section
             check_interval_hbox = gtk.HBox(spacing=5)
             check_interval_label = gtk.Label("Check Interval (seconds):")
@@ -67,14 +92,38 @@ class GtkUI(GtkPluginBase):
             scrolled_window.add(self.adapters_text)
             self.vbox.pack_start(scrolled_window, True, True)
             
+            # Pick adapters from the monitor's list instead of typing their names
+            picker_hbox = gtk.HBox(spacing=5)
+            self.adapter_picker = gtk.combo_box_new_text()
+            picker_hbox.pack_start(self.adapter_picker, True, True)
+            add_button = gtk.Button("Add")
+            add_button.connect("clicked", self._on_add_adapter_clicked)
+            picker_hbox.pack_start(add_button, False, False)
+            self.vbox.pack_start(picker_hbox, False, False)
+            # Adapter names, in the picker's order
+            self.picker_names = []
+            
             # Info label
             info_label = gtk.Label(
-                "Enter adapter names separated by commas or newlines.\n"
+                "Enter adapter names separated by commas or newlines,\n"
+                "or pick them from the list.\n"
                 "Leave empty to monitor all adapters."
             )
             info_label.set_alignment(0, 0)
             self.vbox.pack_start(info_label, False, False)
             
+            # Adapter policy section
+            policy_hbox = gtk.HBox(spacing=5)
+            policy_label = gtk.Label("Adapter Policy:")
+            policy_label.set_size_request(200, -1)
+            self.policy_entry = gtk.Entry()
+            self.policy_entry.set_tooltip_text(
+                'e.g. VPN_TAP AND (Ethernet OR "Wi-Fi*"). Replaces the required adapters when set.'
+            )
+            policy_hbox.pack_start(policy_label, False, False)
+            policy_hbox.pack_start(self.policy_entry, True, True)
+            self.vbox.pack_start(policy_hbox, False, False)
+            
             # Buttons
             button_hbox = gtk.HBox(spacing=5)
             
@@ -95,20 +144,102 @@ class GtkUI(GtkPluginBase):
             log.error(f"Error building UI: {e}")
     
     def _load_config(self):
-        """Load configuration from core plugin"""
-        try:
-            if client.is_connected():
-                config = client.deluge_windows_network_monitor.get_config()
-                if config:
-                    self.check_interval_spin.set_value(config.get("check_interval", 5))
-                    
-                    adapters = config.get("required_adapters", [])
-                    adapters_text = "\n".join(adapters)
-                    self.adapters_text.get_buffer().set_text(adapters_text)
-                    
-                    log.info("Configuration loaded into UI")
-        except Exception as e:
-            log.error(f"Error loading configuration: {e}")
+        """Load configuration (and status) from core plugin"""
+        if not client.is_connected():
+            return
+        d = client.deluge_windows_network_monitor.get_state(None)
+        d.addCallback(self._on_state, fill_config=True)
+        d.addErrback(self._on_rpc_error, "loading configuration")
+        self._load_adapters()
+    
+    def _load_adapters(self):
+        """Fill the adapter picker from the monitor's cached adapter list"""
+        d = client.deluge_windows_network_monitor.list_adapters()
+        d.addCallback(self._on_adapters)
+        d.addErrback(self._on_rpc_error, "listing adapters")
+    
+    def _on_adapters(self, result):
+        model = self.adapter_picker.get_model()
+        model.clear()
+        self.picker_names = []
+        for adapter in result["adapters"]:
+            text = adapter["name"]
+            if adapter["connection_id"]:
+                text += f" ({adapter['connection_id']})"
+            text += f" - {STATUS_NAMES.get(adapter['status'], adapter['status'])}"
+            if adapter["addresses"]:
+                text += f" - {', '.join(adapter['addresses'])}"
+            self.adapter_picker.append_text(text)
+            self.picker_names.append(adapter["name"])
+    
+    def _on_add_adapter_clicked(self, widget):
+        """Add the adapter picked from the list to the required adapters"""
+        active = self.adapter_picker.get_active()
+        if active < 0:
+            return
+        name = self.picker_names[active]
+        text_buffer = self.adapters_text.get_buffer()
+        text = text_buffer.get_text(text_buffer.get_start_iter(), text_buffer.get_end_iter())
+        adapters = [line.strip() for line in text.replace(",", "\n").split("\n") if line.strip()]
+        if name not in adapters:
+            adapters.append(name)
+            text_buffer.set_text("\n".join(adapters))
+    
+    def _poll_state(self):
+        """Refresh the status; only a version number comes back if nothing changed"""
+        if client.is_connected():
+            d = client.deluge_windows_network_monitor.get_state(self.state_version)
+            d.addCallback(self._on_state)
+            d.addErrback(self._on_rpc_error, "refreshing status")
+        return True  # Keep the timer running
+    
+    def _on_state(self, state, fill_config=False):
+        self.state_version = state["version"]
+        if "health" in state:
+            self._show_status(state)
+        else:
+            self._show_last_check(state["last_success"])
+        if fill_config and "config" in state:
+            config = state["config"]
+            self.check_interval_spin.set_value(config.get("check_interval", 5))
+            
+            adapters = config.get("required_adapters", [])
+            adapters_text = "\n".join(adapters)
+            self.adapters_text.get_buffer().set_text(adapters_text)
+            self.policy_entry.set_text(config.get("adapter_policy", ""))
+            
+            log.info("Configuration loaded into UI")
+    
+    def _show_status(self, state):
+        health = state["health"]
+        if health["tripped"]:
+            status = f"Kill-switch tripped - traffic stopped ({state['config']['action']})"
+        elif health["holding"]:
+            status = "Starting - traffic held until the first good adapter check"
+        elif health["monitoring"]:
+            status = f"Monitoring with the {health['backend']} backend"
+            if health["events_active"]:
+                status += " (change events active)"
+        else:
+            status = "Not monitoring"
+        self.status_label.set_text(status)
+        
+        lines = []
+        for adapter in state["adapters"]:
+            marker = "*" if adapter["required"] else " "
+            status_name = STATUS_NAMES.get(adapter["status"], str(adapter["status"]))
+            lines.append(f"{marker} {adapter['name']} ({adapter['connection_id'] or '-'}): {status_name}")
+        self.adapters_status_label.set_text("\n".join(lines))
+        self._show_last_check(health["last_success"])
+    
+    def _show_last_check(self, last_success):
+        if last_success is None:
+            self.last_check_label.set_text("No successful adapter check yet")
+        else:
+            self.last_check_label.set_text(f"Last good check: {time.strftime('%H:%M:%S', time.localtime(last_success))}")
+    
+    def _on_rpc_error(self, failure, action):
+        log.error(f"Error {action}: {failure.getErrorMessage()}")
     
     def _on_save_clicked(self, widget):
         """Save button clicked"""
@@ -130,48 +261,56 @@ class GtkUI(GtkPluginBase):
             
             config = {
                 "check_interval": check_interval,
-                "required_adapters": adapters
+                "required_adapters": adapters,
+                "adapter_policy": self.policy_entry.get_text().strip()
             }
             
             if client.is_connected():
-                client.deluge_windows_network_monitor.update_config(**config)
-                log.info("Configuration saved successfully")
-                
-                # Show confirmation
-                dialog = gtk.MessageDialog(
-                    None,
-                    gtk.DIALOG_DESTROY_WITH_PARENT,
-                    gtk.MESSAGE_INFO,
-                    gtk.BUTTONS_OK,
-                    "Configuration saved successfully!"
-                )
-                dialog.run()
-                dialog.destroy()
+                d = client.deluge_windows_network_monitor.update_config(**config)
+                d.addCallback(self._on_config_saved)
+                d.addErrback(lambda failure: self._on_save_error(failure.getErrorMessage()))
             
         except Exception as e:
-            log.error(f"Error saving configuration: {e}")
-            dialog = gtk.MessageDialog(
-                None,
-                gtk.DIALOG_DESTROY_WITH_PARENT,
-                gtk.MESSAGE_ERROR,
-                gtk.BUTTONS_OK,
-                f"Error saving configuration: {e}"
-            )
-            dialog.run()
-            dialog.destroy()
+            self._on_save_error(e)
+    
+    def _on_config_saved(self, _result):
+        log.info("Configuration saved successfully")
+        
+        # Show confirmation
+        dialog = gtk.MessageDialog(
+            None,
+            gtk.DIALOG_DESTROY_WITH_PARENT,
+            gtk.MESSAGE_INFO,
+            gtk.BUTTONS_OK,
+            "Configuration saved successfully!"
+        )
+        dialog.run()
+        dialog.destroy()
+    
+    def _on_save_error(self, error):
+        log.error(f"Error saving configuration: {error}")
+        dialog = gtk.MessageDialog(
+            None,
+            gtk.DIALOG_DESTROY_WITH_PARENT,
+            gtk.MESSAGE_ERROR,
+            gtk.BUTTONS_OK,
+            f"Error saving configuration: {error}"
+        )
+        dialog.run()
+        dialog.destroy()
     
     def _on_refresh_clicked(self, widget):
         """Refresh button clicked"""
         self._load_config()
     
     def get_config(self):
-        """Get current configuration from core"""
+        """Get current configuration from core (returns a Deferred)"""
         if client.is_connected():
             return client.deluge_windows_network_monitor.get_config()
         return None
     
     def set_config(self, config):
-        """Update configuration on core"""
+        """Update configuration on core (returns a Deferred)"""
         if client.is_connected():
             return client.deluge_windows_network_monitor.update_config(**config)
         return False
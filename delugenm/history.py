@@ -0,0 +1,188 @@
+"""
+Adapter state history for Network Monitor
+
+Keeps a fixed amount of history per adapter: a ring buffer of every sampled
+status and a second ring buffer of just the transitions, so flaps can still
+be seen weeks later. Samples are stored column-wise in array.array buffers
+(timestamp, status code, address hash), about 13 bytes each, rather than
+one object per sample.
+"""
+
+import array
+import threading
+
+from .common import ACTIVE_STATUSES
+
+# Status code stored when an adapter is missing from the snapshot
+STATUS_MISSING = -1
+
+# Adapters tracked at once; the one seen least recently is dropped beyond this
+MAX_ADAPTERS = 256
+
+
+class RingBuffer(object):
+    """Fixed-capacity, append-only (timestamp, status, address hash) columns"""
+
+    __slots__ = ("capacity", "timestamps", "statuses", "hashes", "_start", "_count")
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.timestamps = array.array("d", bytes(8 * capacity))
+        self.statuses = array.array("b", bytes(capacity))
+        self.hashes = array.array("I", bytes(array.array("I").itemsize * capacity))
+        self._start = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def append(self, timestamp, status, address_hash):
+        if self._count < self.capacity:
+            index = (self._start + self._count) % self.capacity
+            self._count += 1
+        else:
+            index = self._start
+            self._start = (self._start + 1) % self.capacity
+        self.timestamps[index] = timestamp
+        self.statuses[index] = status
+        self.hashes[index] = address_hash
+
+    def first(self):
+        """Return the oldest (timestamp, status, address hash), or None"""
+        if not self._count:
+            return None
+        return self.timestamps[self._start], self.statuses[self._start], self.hashes[self._start]
+
+    def last(self):
+        """Return the newest (timestamp, status, address hash), or None"""
+        if not self._count:
+            return None
+        index = (self._start + self._count - 1) % self.capacity
+        return self.timestamps[index], self.statuses[index], self.hashes[index]
+
+    def _bisect(self, timestamp):
+        """Logical position of the first entry at or after timestamp"""
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self.timestamps[(self._start + middle) % self.capacity] < timestamp:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def range(self, start, end):
+        """Yield (timestamp, status, address hash) with start <= timestamp <= end, oldest first"""
+        first = self._bisect(start)
+        for position in range(first, self._count):
+            index = (self._start + position) % self.capacity
+            timestamp = self.timestamps[index]
+            if timestamp > end:
+                return
+            yield timestamp, self.statuses[index], self.hashes[index]
+
+
+class AdapterHistory(object):
+    """Samples and transitions of one adapter"""
+
+    __slots__ = ("samples", "transitions", "last_seen")
+
+    def __init__(self, capacity):
+        self.samples = RingBuffer(capacity)
+        self.transitions = RingBuffer(capacity)
+        self.last_seen = 0.0
+
+    def record(self, timestamp, status, address_hash):
+        last = self.samples.last()
+        if last is None or last[1] != status or last[2] != address_hash:
+            self.transitions.append(timestamp, status, address_hash)
+        self.samples.append(timestamp, status, address_hash)
+        if status != STATUS_MISSING:
+            self.last_seen = timestamp
+
+
+class HistoryStore(object):
+    """Per-adapter history with time range queries and server-side downsampling"""
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._adapters = {}
+
+    def record(self, timestamp, samples):
+        """
+        Record {adapter key: (status or None, address hash)} sampled at timestamp.
+        Tracked adapters that aren't in samples are recorded as missing.
+        """
+        with self._lock:
+            for key, (status, address_hash) in samples.items():
+                history = self._adapters.get(key)
+                if history is None:
+                    history = self._add(key)
+                history.record(timestamp, STATUS_MISSING if status is None else status, address_hash)
+
+            # Adapters that went away get one "missing" entry, not one per check
+            for key, history in self._adapters.items():
+                if key not in samples and history.samples.last()[1] != STATUS_MISSING:
+                    history.record(timestamp, STATUS_MISSING, 0)
+
+    def adapters(self):
+        """Return the keys of the adapters with history"""
+        with self._lock:
+            return sorted(self._adapters)
+
+    def query(self, adapter, start=None, end=None, max_points=500):
+        """
+        Return the adapter's history between start and end (seconds since the
+        epoch, default everything) with at most max_points samples buckets and
+        at most max_points transitions (the newest are kept):
+
+            {"adapter": ..., "start": ..., "end": ...,
+             "buckets": [[bucket start, fraction up, samples, last status], ...],
+             "transitions": [[timestamp, status, address hash], ...]}
+        """
+        with self._lock:
+            history = self._adapters.get(adapter)
+            if history is None:
+                return None
+            if start is None:
+                first = history.samples.first()
+                start = first[0] if first else 0.0
+            if end is None:
+                last = history.samples.last()
+                end = last[0] if last else start
+            span = max(end - start, 1e-9)
+            max_points = max(1, int(max_points))
+
+            buckets = {}
+            for timestamp, status, _address_hash in history.samples.range(start, end):
+                slot = min(int((timestamp - start) / span * max_points), max_points - 1)
+                bucket = buckets.get(slot)
+                if bucket is None:
+                    bucket = buckets[slot] = [start + slot * span / max_points, 0, 0, status]
+                bucket[1] += status in ACTIVE_STATUSES
+                bucket[2] += 1
+                bucket[3] = status
+
+            transitions = [list(entry) for entry in history.transitions.range(start, end)]
+
+        for bucket in buckets.values():
+            bucket[1] = bucket[1] / float(bucket[2])
+        return {
+            "adapter": adapter,
+            "start": start,
+            "end": end,
+            "buckets": [buckets[slot] for slot in sorted(buckets)],
+            "transitions": transitions[-max_points:],
+        }
+
+    def clear(self):
+        with self._lock:
+            self._adapters = {}
+
+    def _add(self, key):
+        if len(self._adapters) >= MAX_ADAPTERS:
+            oldest = min(self._adapters, key=lambda other: self._adapters[other].last_seen)
+            del self._adapters[oldest]
+        history = self._adapters[key] = AdapterHistory(self.capacity)
+        return history
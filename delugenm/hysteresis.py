@@ -0,0 +1,154 @@
+"""
+Flap suppression for Network Monitor
+
+A Wi-Fi roam or VPN rekey can make an adapter look down for a fraction of
+a second. Restarting Deluge for that costs far more than the blip, so an
+adapter is only considered down once failures are confirmed: N failed
+samples out of the last M, lasting at least a minimum duration. Hard states
+such as hardware-not-present skip the confirmation.
+
+Everything is driven by the timestamps passed in, never the clock, so the
+state machines can be tested deterministically.
+"""
+
+import logging
+from collections import deque
+
+from .common import ACTIVE_STATUSES, HARD_FAILURE_STATUSES
+from .policy import FALSE, TRUE, UNKNOWN
+
+log = logging.getLogger(__name__)
+
+STATE_UP = "up"
+STATE_SUSPECT = "suspect"  # Failing, but not confirmed yet
+STATE_DOWN = "down"
+
+# Policy truth level of each state
+STATE_LEVELS = {STATE_UP: TRUE, STATE_SUSPECT: UNKNOWN, STATE_DOWN: FALSE}
+
+
+class AdapterStateMachine(object):
+    """Up / suspect / down state of one adapter, from a stream of status samples"""
+
+    __slots__ = ("samples", "window", "min_down_duration", "state", "down_since", "_history")
+
+    def __init__(self, samples=3, window=5, min_down_duration=2.0):
+        """
+        samples: failed samples (N) needed within the last window (M) samples
+        min_down_duration: seconds the adapter must have been failing
+        """
+        self.samples = samples
+        self.window = max(window, samples)
+        self.min_down_duration = min_down_duration
+        self.state = STATE_UP
+        self.down_since = None
+        self._history = deque(maxlen=self.window)
+
+    def update(self, status, now):
+        """
+        Feed the adapter's status (None if it is missing) sampled at now.
+        Returns the new state.
+        """
+        ok = status in ACTIVE_STATUSES
+        self._history.append(ok)
+
+        if ok:
+            self.down_since = None
+            # One good sample doesn't wipe earlier failures out of the window
+            self.state = STATE_UP if all(self._history) else STATE_SUSPECT
+            return self.state
+
+        if self.down_since is None:
+            self.down_since = now
+
+        if status in HARD_FAILURE_STATUSES:
+            self.state = STATE_DOWN
+        elif (self._history.count(False) >= self.samples
+              and now - self.down_since >= self.min_down_duration):
+            self.state = STATE_DOWN
+        elif self.state != STATE_DOWN:
+            self.state = STATE_SUSPECT
+        return self.state
+
+
+class TripDetector(object):
+    """
+    Tracks one AdapterStateMachine per monitored adapter (or policy term).
+    Trips when none of them is left up (any one healthy adapter keeps the
+    kill-switch open), or with a policy, when the policy is confirmed false.
+    """
+
+    def __init__(self, samples=3, window=5, min_down_duration=2.0, on_transition=None, policy=None):
+        """
+        on_transition: optional callback(key, previous state, new state, status)
+        policy: optional policy.Policy over the keys passed to update()
+        """
+        self.samples = samples
+        self.window = window
+        self.min_down_duration = min_down_duration
+        self.on_transition = on_transition
+        self.policy = None
+        self.machines = {}
+        self.set_policy(policy)
+
+    def set_policy(self, policy):
+        """Switch to another policy (or None), carrying the current states over"""
+        self.policy = policy
+        if policy is not None:
+            policy.update({key: STATE_LEVELS[machine.state] for key, machine in self.machines.items()})
+
+    def update(self, statuses, now, unknown=()):
+        """
+        Feed {adapter key: status or None} sampled at now. Keys in unknown
+        weren't sampled this time and keep their state.
+        Returns True if the kill-switch should trip.
+        """
+        for key in list(self.machines):
+            if key not in statuses and key not in unknown:
+                del self.machines[key]
+
+        changed = {}
+        for key, status in statuses.items():
+            machine = self.machines.get(key)
+            if machine is None:
+                machine = self.machines[key] = AdapterStateMachine(
+                    self.samples, self.window, self.min_down_duration
+                )
+                changed[key] = None
+            previous = machine.state
+            state = machine.update(status, now)
+            if state != previous:
+                log.info(f"Adapter {key} is now {state} (status: {status})")
+                changed[key] = state
+                if self.on_transition is not None:
+                    self.on_transition(key, previous, state, status)
+
+        if self.policy is not None:
+            # Only the terms whose state changed are re-evaluated
+            levels = {key: STATE_LEVELS[self.machines[key].state] for key in changed}
+            return self.policy.update(levels) == FALSE
+        return bool(self.machines) and all(machine.state == STATE_DOWN for machine in self.machines.values())
+
+    @property
+    def suspect(self):
+        """True if any adapter is failing but not confirmed down yet"""
+        return any(machine.state == STATE_SUSPECT for machine in self.machines.values())
+
+    @property
+    def healthy(self):
+        """True if at least one adapter is confirmed up (with a policy: the policy is confirmed true)"""
+        if self.policy is not None:
+            return self.policy.value == TRUE
+        return any(machine.state == STATE_UP for machine in self.machines.values())
+
+    def failing_since(self):
+        """Timestamp of the earliest failure still being tracked, or None"""
+        times = [machine.down_since for machine in self.machines.values() if machine.down_since is not None]
+        return min(times) if times else None
+
+    def states(self):
+        """Return {adapter key: state}"""
+        return {key: machine.state for key, machine in self.machines.items()}
+
+    def reset(self):
+        self.machines = {}
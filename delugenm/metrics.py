@@ -0,0 +1,171 @@
+"""
+Metrics for Network Monitor
+
+A small, dependency-free registry of counters, gauges and histograms.
+Recording is a lock and an integer add, so it is cheap enough for every
+check. The registry can be read as a plain dict (for RPC) or rendered in
+the Prometheus text exposition format.
+"""
+
+import bisect
+import threading
+
+# Default histogram buckets in seconds, from sub-millisecond sysfs reads to hung WMI calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in pairs
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter(object):
+    """A monotonically increasing count, optionally split by labels"""
+
+    kind = "counter"
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def collect(self):
+        with self._lock:
+            return {_format_labels(key): value for key, value in self._values.items()}
+
+    def render(self):
+        with self._lock:
+            return [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in self._values.items()]
+
+
+class Gauge(object):
+    """A value read from a function whenever the metric is collected"""
+
+    kind = "gauge"
+
+    def __init__(self, name, help_text, function):
+        self.name = name
+        self.help = help_text
+        self.function = function
+
+    def value(self):
+        return self.function()
+
+    def collect(self):
+        value = self.function()
+        return {} if value is None else {"": value}
+
+    def render(self):
+        value = self.function()
+        return [] if value is None else [f"{self.name} {_format_value(value)}"]
+
+
+class Histogram(object):
+    """Cumulative-bucket histogram of observed values, optionally split by labels"""
+
+    kind = "histogram"
+
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        # label key -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series = {}
+
+    def observe(self, value, **labels):
+        index = bisect.bisect_left(self.buckets, value)
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def collect(self):
+        """{labels: {"buckets": {upper bound: cumulative count}, "sum": s, "count": n}}"""
+        result = {}
+        with self._lock:
+            for key, (counts, total, count) in self._series.items():
+                cumulative, buckets = 0, {}
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    buckets[_format_value(bound)] = cumulative
+                result[_format_labels(key)] = {"buckets": buckets, "sum": total, "count": count}
+        return result
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for key, (counts, total, count) in self._series.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    lines.append(f"{self.name}_bucket{_format_labels(key, [('le', _format_value(bound))])} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {count}")
+        return lines
+
+
+class MetricsRegistry(object):
+    """Named collection of metrics sharing a common prefix"""
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self._metrics = []
+
+    def counter(self, name, help_text):
+        return self._register(Counter(self.prefix + name, help_text))
+
+    def gauge(self, name, help_text, function):
+        return self._register(Gauge(self.prefix + name, help_text, function))
+
+    def histogram(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(self.prefix + name, help_text, buckets))
+
+    def collect(self):
+        """Return {metric name: {"type": ..., "help": ..., "values": ...}}"""
+        return {
+            metric.name: {"type": metric.kind, "help": metric.help, "values": metric.collect()}
+            for metric in self._metrics
+        }
+
+    def render_prometheus(self):
+        """Return every metric in the Prometheus text exposition format"""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
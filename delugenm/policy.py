@@ -0,0 +1,309 @@
+"""
+Adapter requirement policies for Network Monitor
+
+required_adapters can only say "any of these adapters". A policy is a small
+boolean expression over adapter patterns instead:
+
+    VPN_TAP AND (Ethernet OR "Wi-Fi*")
+
+A pattern matches an adapter's name, connection name or GUID, with shell
+style wildcards (* ? [...]), ignoring case. Quote patterns that contain
+spaces or parentheses. Operators are AND, OR and NOT (also case-insensitive),
+with the usual precedence NOT > AND > OR.
+
+An expression is compiled once into a DAG with a node per distinct
+sub-expression. Terms are three-valued, because an adapter can be up, down
+or suspect (failing, not confirmed yet): AND is the minimum, OR the maximum
+and NOT the inverse. When terms change, only the nodes above them are
+re-evaluated.
+
+Pure Python with no backend dependency, so it can be tested on its own.
+"""
+
+import fnmatch
+import heapq
+import re
+
+from .common import ACTIVE_STATUSES, DEGRADED_STATUSES
+
+# Three-valued truth levels of a term or expression
+FALSE = 0  # Confirmed down
+UNKNOWN = 1  # Suspect
+TRUE = 2  # Up
+
+OP_TERM = "term"
+OP_NOT = "not"
+OP_AND = "and"
+OP_OR = "or"
+
+KEYWORDS = {"AND": OP_AND, "OR": OP_OR, "NOT": OP_NOT}
+
+_TOKEN = re.compile(r"""\s*(?:(?P<paren>[()])|"(?P<dquoted>[^"]*)"|'(?P<squoted>[^']*)'|(?P<word>[^\s()"']+))""")
+
+# Adapters whose term matches are remembered before the cache is cleared
+MATCH_CACHE_SIZE = 1024
+
+
+class PolicyError(ValueError):
+    """The policy expression is not valid"""
+
+
+def _tokenize(text):
+    """Yield (kind, value, position); kind is "(", ")", "op" or "pattern" """
+    position = 0
+    text = text.rstrip()
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None:
+            rest = text[position:]
+            raise PolicyError(f"Unterminated quote at position {position + len(rest) - len(rest.lstrip())}")
+        start = match.start(match.lastgroup)
+        if match.lastgroup == "paren":
+            yield match.group("paren"), None, start
+        elif match.lastgroup == "word" and match.group("word").upper() in KEYWORDS:
+            yield "op", KEYWORDS[match.group("word").upper()], start
+        else:
+            pattern = match.group(match.lastgroup)
+            if not pattern:
+                raise PolicyError(f"Empty pattern at position {start}")
+            yield "pattern", pattern, start
+        position = match.end()
+
+
+class _Parser(object):
+    """Recursive descent parser producing (op, ...) tuples"""
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = list(_tokenize(text))
+        self.index = 0
+
+    def parse(self):
+        if not self.tokens:
+            raise PolicyError("Empty policy")
+        node = self._or()
+        if self.index < len(self.tokens):
+            kind, value, position = self.tokens[self.index]
+            raise PolicyError(f"Unexpected '{_describe(kind, value)}' at position {position}")
+        return node
+
+    def _peek(self):
+        return self.tokens[self.index] if self.index < len(self.tokens) else (None, None, len(self.text))
+
+    def _binary(self, op, operand):
+        children = [operand()]
+        while self._peek()[:2] == ("op", op):
+            self.index += 1
+            children.append(operand())
+        return children[0] if len(children) == 1 else (op,) + tuple(children)
+
+    def _or(self):
+        return self._binary(OP_OR, self._and)
+
+    def _and(self):
+        return self._binary(OP_AND, self._not)
+
+    def _not(self):
+        if self._peek()[:2] == ("op", OP_NOT):
+            self.index += 1
+            return (OP_NOT, self._not())
+        return self._atom()
+
+    def _atom(self):
+        kind, value, position = self._peek()
+        if kind == "pattern":
+            self.index += 1
+            return (OP_TERM, value)
+        if kind == "(":
+            self.index += 1
+            node = self._or()
+            if self._peek()[0] != ")":
+                raise PolicyError(f"Missing ')' at position {self._peek()[2]}")
+            self.index += 1
+            return node
+        if kind is None:
+            raise PolicyError(f"Unexpected end of policy at position {position}")
+        raise PolicyError(f"Unexpected '{_describe(kind, value)}' at position {position}")
+
+
+def _describe(kind, value):
+    if kind == "op":
+        return value.upper()
+    return value or kind
+
+
+def parse(text):
+    """
+    Parse a policy expression into nested tuples: (OP_TERM, pattern),
+    (OP_NOT, node), (OP_AND, node, node, ...) or (OP_OR, node, node, ...).
+    Raises PolicyError if it is not valid.
+    """
+    return _Parser(text).parse()
+
+
+def any_of(patterns):
+    """Expression that any one of patterns is up, as required_adapters means"""
+    terms = tuple((OP_TERM, pattern) for pattern in patterns)
+    if not terms:
+        raise PolicyError("No adapters given")
+    return terms[0] if len(terms) == 1 else (OP_OR,) + terms
+
+
+def _adapter_rank(status):
+    """Which of several adapters matching a term speaks for it"""
+    if status in ACTIVE_STATUSES:
+        return 2
+    if status in DEGRADED_STATUSES:
+        return 1
+    return 0
+
+
+class Policy(object):
+    """
+    A policy compiled into an evaluation DAG.
+
+    Nodes are numbered so that every node comes after its children, and
+    identical sub-expressions (and patterns differing only in case) share a
+    node. update() feeds new term levels and re-evaluates just the nodes
+    above the terms that changed.
+    """
+
+    def __init__(self, expression):
+        """expression: policy text, or a tree as returned by parse()"""
+        self.text = expression if isinstance(expression, str) else None
+        tree = parse(expression) if self.text is not None else expression
+        self._ops = []
+        self._children = []
+        self._parents = []
+        self._nodes = {}
+        # Lower-cased pattern -> leaf node, and the patterns in first-seen spelling
+        self._leaves = {}
+        self.terms = []
+        self.root = self._compile(tree)
+        self._patterns = [pattern.lower() for pattern in self.terms]
+        self._match_cache = {}
+        # Nodes recomputed so far, to see how much work updates take
+        self.evaluations = 0
+
+        self._values = [UNKNOWN] * len(self._ops)
+        for node in range(len(self._ops)):
+            if self._ops[node] != OP_TERM:
+                self._values[node] = self._compute(node)
+
+    @property
+    def value(self):
+        """Current level of the whole policy"""
+        return self._values[self.root]
+
+    @property
+    def literal_terms(self):
+        """The patterns without wildcards, i.e. exact adapter names or GUIDs"""
+        return [pattern for pattern in self.terms if not any(char in pattern for char in "*?[")]
+
+    def _compile(self, tree):
+        op = tree[0]
+        if op == OP_TERM:
+            key = (OP_TERM, tree[1].lower())
+            if key not in self._nodes:
+                self.terms.append(tree[1])
+                self._leaves[key[1]] = self._add(key, OP_TERM, ())
+            return self._nodes[key]
+        if op not in (OP_NOT, OP_AND, OP_OR):
+            raise PolicyError(f"Unknown operator {op!r}")
+
+        operands = tree[1:]
+        if op != OP_NOT:
+            # Flatten (a AND (b AND c)) into one AND node
+            while any(operand[0] == op for operand in operands):
+                operands = sum((operand[1:] if operand[0] == op else (operand,) for operand in operands), ())
+        children = [self._compile(operand) for operand in operands]
+        if op != OP_NOT:
+            children = sorted(set(children))
+            if len(children) == 1:
+                return children[0]
+        key = (op, tuple(children))
+        if key not in self._nodes:
+            self._add(key, op, children)
+        return self._nodes[key]
+
+    def _add(self, key, op, children):
+        node = len(self._ops)
+        self._ops.append(op)
+        self._children.append(tuple(children))
+        self._parents.append([])
+        for child in children:
+            self._parents[child].append(node)
+        self._nodes[key] = node
+        return node
+
+    def _compute(self, node):
+        self.evaluations += 1
+        op = self._ops[node]
+        values = [self._values[child] for child in self._children[node]]
+        if op == OP_NOT:
+            return TRUE - values[0]
+        if op == OP_AND:
+            return min(values)
+        return max(values)
+
+    def update(self, levels):
+        """
+        Feed {pattern: FALSE / UNKNOWN / TRUE} for the terms that may have
+        changed (unknown patterns are ignored). Returns the policy's level.
+        """
+        pending = []
+        queued = set()
+        for pattern, level in levels.items():
+            node = self._leaves.get(pattern.lower())
+            if node is None or self._values[node] == level:
+                continue
+            self._values[node] = level
+            for parent in self._parents[node]:
+                if parent not in queued:
+                    queued.add(parent)
+                    heapq.heappush(pending, parent)
+
+        # Children have lower numbers, so each node is computed once, after its children
+        while pending:
+            node = heapq.heappop(pending)
+            value = self._compute(node)
+            if value == self._values[node]:
+                continue
+            self._values[node] = value
+            for parent in self._parents[node]:
+                if parent not in queued:
+                    queued.add(parent)
+                    heapq.heappush(pending, parent)
+        return self._values[self.root]
+
+    def matching_terms(self, adapter):
+        """Indices into terms of the patterns that match an adapter"""
+        key = (adapter.name, adapter.connection_id, adapter.guid)
+        matches = self._match_cache.get(key)
+        if matches is None:
+            if len(self._match_cache) >= MATCH_CACHE_SIZE:
+                self._match_cache = {}
+            values = [value.lower() for value in key if value]
+            matches = self._match_cache[key] = tuple(
+                index for index, pattern in enumerate(self._patterns)
+                if any(fnmatch.fnmatchcase(value, pattern) for value in values)
+            )
+        return matches
+
+    def matches(self, adapter):
+        """True if any term of the policy matches the adapter"""
+        return bool(self.matching_terms(adapter))
+
+    def statuses(self, adapters):
+        """
+        Return {pattern: status} for every term, from the best adapter it
+        matches (connected, then degraded, then any), or None if none matches
+        """
+        statuses = dict.fromkeys(self.terms)
+        for adapter in adapters:
+            for index in self.matching_terms(adapter):
+                pattern = self.terms[index]
+                current = statuses[pattern]
+                if current is None or _adapter_rank(adapter.status) > _adapter_rank(current):
+                    statuses[pattern] = adapter.status
+        return statuses
@@ -0,0 +1,191 @@
+"""
+Trace replay for Network Monitor
+
+Runs recorded traces (see trace.py) through the decision pipeline the
+plugin itself uses (decision.Decider and the trip / recover logic of the
+core), to see where the kill-switch would have acted under a given
+configuration. By default time is virtual: the trace's own timestamps drive
+flap suppression and nothing waits, so thousands of traces replay in
+seconds. With a speed, the gaps between records are slept through that
+many times faster than they happened.
+
+    python -m delugenm.replay traces/*.trace --set trip_samples=2 --set action=pause
+
+Needs neither Deluge nor Twisted, so traces can be replayed anywhere.
+
+Egress probe outcomes and Deluge's interface adapters are not recorded, so
+egress_targets is ignored and only the configured adapters are required.
+To watch a trace drive the running plugin instead, use the replay backend
+(backend = "replay:PATH@SPEED").
+"""
+
+import argparse
+import json
+import logging
+import sys
+import time
+from collections import namedtuple
+
+from .backends import AdapterSnapshot
+from .decision import Decider
+from .settings import ACTION_PAUSE, TIMEOUT_DOWN, TIMEOUT_LAST_KNOWN, Settings
+from .trace import RECORD_EVENT, RECORD_SNAPSHOT, RECORD_START, RECORD_TIMEOUT, TraceError, read_trace
+
+log = logging.getLogger(__name__)
+
+DECISION_TRIP = "trip"
+DECISION_RECOVER = "recover"
+
+# kind: DECISION_TRIP or DECISION_RECOVER; timestamp: from the trace;
+# states: {adapter key: state} of the trip detector at that point
+Decision = namedtuple("Decision", ["timestamp", "kind", "states"])
+
+ReplayResult = namedtuple("ReplayResult", ["checks", "timeouts", "events", "sessions", "decisions"])
+
+
+class Replayer(object):
+    """Feeds trace records through a Decider, acting on its outcome as the core does"""
+
+    def __init__(self, settings=None):
+        settings = settings or Settings.build({})
+        if settings.egress:
+            settings = settings.updated({"egress_targets": []})
+        self.settings = settings
+        self.checks = 0
+        self.timeouts = 0
+        self.events = 0
+        self.sessions = 0
+        self.decisions = []
+        self._restart()
+
+    def _restart(self):
+        """The plugin was (re)started: nothing is known yet"""
+        self.decider = Decider(self.settings)
+        self.tripped = False
+        # Shut down by the kill-switch; nothing happens until the next start
+        self.stopped = False
+        self._last_snapshot = None
+
+    def feed(self, record):
+        """Process one trace.TraceRecord. Returns the Decision it led to, or None."""
+        if record.kind == RECORD_START:
+            self.sessions += 1
+            self._restart()
+            return None
+        if self.stopped:
+            return None
+        if record.kind == RECORD_EVENT:
+            # Events only make the plugin check sooner; the snapshot that follows is recorded
+            self.events += 1
+            return None
+        if record.kind == RECORD_TIMEOUT:
+            self.timeouts += 1
+            if self.settings.probe_timeout_policy == TIMEOUT_DOWN:
+                return self._evaluate(AdapterSnapshot([], record.timestamp), record.timestamp)
+            if self.settings.probe_timeout_policy == TIMEOUT_LAST_KNOWN and self._last_snapshot is not None:
+                return self._evaluate(self._last_snapshot, record.timestamp)
+            return None
+        if record.kind == RECORD_SNAPSHOT:
+            self.checks += 1
+            self._last_snapshot = record.value
+            return self._evaluate(record.value, record.timestamp)
+        return None
+
+    def _evaluate(self, snapshot, now):
+        decision = None
+        if not self.decider.check(snapshot, now):
+            if not self.tripped:
+                self.tripped = True
+                self.stopped = self.settings.action != ACTION_PAUSE
+                decision = Decision(now, DECISION_TRIP, self.decider.detector.states())
+        elif self.tripped and self.decider.healthy:
+            self.tripped = False
+            decision = Decision(now, DECISION_RECOVER, self.decider.detector.states())
+        if decision is not None:
+            self.decisions.append(decision)
+        return decision
+
+    def result(self):
+        return ReplayResult(self.checks, self.timeouts, self.events, self.sessions, list(self.decisions))
+
+
+def replay(records, settings=None, speed=None, sleep=time.sleep):
+    """
+    Replay trace records under settings (default: the default settings).
+    speed None replays in virtual time; otherwise gaps between records are
+    slept through speed times faster. Returns a ReplayResult.
+    """
+    replayer = Replayer(settings)
+    previous = None
+    for record in records:
+        if speed and previous is not None and record.timestamp > previous:
+            sleep((record.timestamp - previous) / speed)
+        previous = record.timestamp
+        replayer.feed(record)
+    return replayer.result()
+
+
+def _setting(text):
+    """Parse KEY=VALUE, with VALUE as JSON where it is valid JSON"""
+    key, separator, value = text.partition("=")
+    if not separator:
+        raise argparse.ArgumentTypeError(f"'{text}' is not KEY=VALUE")
+    try:
+        return key.strip(), json.loads(value)
+    except ValueError:
+        return key.strip(), value
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Replay Network Monitor traces through the kill-switch decisions")
+    parser.add_argument("traces", nargs="+", help="trace files recorded with trace_file")
+    parser.add_argument("--set", dest="settings", type=_setting, action="append", default=[], metavar="KEY=VALUE",
+                        help="override a setting (VALUE is JSON, or a plain string)")
+    parser.add_argument("--speed", type=float, help="replay in real time sped up this much, instead of virtual time")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    parser.add_argument("--fail-on-trip", action="store_true", help="exit with status 1 if any trace trips")
+    parser.add_argument("--verbose", action="store_true", help="log adapter state transitions")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format="%(message)s")
+    if not args.verbose:
+        # "No active network adapters" for every check of an outage is just noise here
+        logging.getLogger("delugenm.decision").setLevel(logging.ERROR)
+    try:
+        settings = Settings.build(dict(args.settings))
+    except ValueError as e:
+        parser.error(str(e))
+
+    results = {}
+    failed = False
+    started = time.perf_counter()
+    for path in args.traces:
+        try:
+            result = replay(read_trace(path), settings, args.speed)
+        except (OSError, TraceError) as e:
+            log.error(f"{path}: {e}")
+            failed = True
+            continue
+        results[path] = result
+        failed = failed or (args.fail_on_trip and any(d.kind == DECISION_TRIP for d in result.decisions))
+    elapsed = time.perf_counter() - started
+
+    if args.json:
+        print(json.dumps({
+            "elapsed": elapsed,
+            "traces": {path: dict(result._asdict(), decisions=[d._asdict() for d in result.decisions])
+                       for path, result in results.items()},
+        }, indent=2, sort_keys=True))
+    else:
+        for path, result in results.items():
+            trips = sum(1 for decision in result.decisions if decision.kind == DECISION_TRIP)
+            print(f"{path}: {result.checks} checks, {result.timeouts} timeouts, {result.sessions} sessions, "
+                  f"{trips} trips, {len(result.decisions) - trips} recoveries")
+            for decision in result.decisions:
+                print(f"  {decision.timestamp:.3f} {decision.kind} {decision.states}")
+        print(f"Replayed {len(results)} traces in {elapsed:.2f}s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
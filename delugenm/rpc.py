@@ -0,0 +1,159 @@
+"""
+Minimal DelugeRPC client for Network Monitor
+
+A blocking client for the Deluge 2 daemon protocol: TLS, and each message a
+zlib-compressed rencode payload behind a 5 byte header (protocol version,
+length). The standalone watchdog keeps one of these open per daemon and
+drives them from a thread pool; Deluge's own UI client is tied to the
+Twisted reactor and to a single daemon per process.
+"""
+
+import logging
+import socket
+import ssl
+import struct
+import threading
+import zlib
+
+log = logging.getLogger(__name__)
+
+DEFAULT_PORT = 58846
+
+PROTOCOL_VERSION = 1
+_HEADER = struct.Struct("!BI")
+
+# Message types sent by the daemon
+RPC_RESPONSE = 1
+RPC_ERROR = 2
+RPC_EVENT = 3
+
+# Reported to the daemon at login; it refuses clients older than 2.0
+CLIENT_VERSION = "2.0.0"
+
+
+class RPCError(Exception):
+    """The daemon answered a call with an exception"""
+
+    def __init__(self, exception_type, detail):
+        super().__init__(f"{exception_type}: {detail}")
+        self.exception_type = exception_type
+
+
+def _rencode():
+    """rencode as Deluge uses it; only needed once a daemon is contacted"""
+    try:
+        import rencode
+    except ImportError:
+        from deluge import rencode
+    return rencode
+
+
+class DelugeRPCClient(object):
+    """
+    One persistent connection to a Deluge daemon. Connects and logs in on
+    the first call and again after the connection fails. Calls are
+    serialised, so one client can be shared between threads.
+    """
+
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, username="", password="", timeout=10.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self._socket = None
+        self._request_id = 0
+        self._lock = threading.Lock()
+
+    @property
+    def connected(self):
+        return self._socket is not None
+
+    def connect(self):
+        """
+        (Re)connect and log in. Raises OSError if the daemon can't be
+        reached, RPCError if it refuses the login.
+        """
+        with self._lock:
+            self._connect()
+
+    def call(self, method, *args, **kwargs):
+        """
+        Call method on the daemon and return its result, connecting first if
+        needed. Raises RPCError if the method raised; any other failure
+        closes the connection and is raised as it is.
+        """
+        with self._lock:
+            if self._socket is None:
+                self._connect()
+            try:
+                return self._call(method, args, kwargs)
+            except RPCError:
+                raise
+            except Exception:
+                self._close()
+                raise
+
+    def close(self):
+        with self._lock:
+            self._close()
+
+    def _connect(self):
+        self._close()
+        # Deluge daemons use a self-signed certificate
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        raw = socket.create_connection((self.host, self.port), self.timeout)
+        try:
+            self._socket = context.wrap_socket(raw)
+        except Exception:
+            raw.close()
+            raise
+        try:
+            self._call("daemon.login", (self.username, self.password), {"client_version": CLIENT_VERSION})
+        except Exception:
+            self._close()
+            raise
+        log.debug("Logged in to the Deluge daemon at %s:%s", self.host, self.port)
+
+    def _close(self):
+        sock, self._socket = self._socket, None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def _call(self, method, args, kwargs):
+        rencode = _rencode()
+        self._request_id += 1
+        request_id = self._request_id
+        body = zlib.compress(rencode.dumps(((request_id, method, list(args), kwargs),)))
+        self._socket.sendall(_HEADER.pack(PROTOCOL_VERSION, len(body)) + body)
+
+        while True:
+            message = self._receive(rencode)
+            # Events (only sent if registered for) and answers to abandoned calls are skipped
+            if message[0] == RPC_EVENT or message[1] != request_id:
+                continue
+            if message[0] == RPC_RESPONSE:
+                return message[2]
+            if message[0] == RPC_ERROR:
+                raise RPCError(message[2], message[3] if len(message) > 3 else "")
+            raise ConnectionError(f"Unexpected message type {message[0]} from the daemon")
+
+    def _receive(self, rencode):
+        version, length = _HEADER.unpack(self._read(_HEADER.size))
+        if version != PROTOCOL_VERSION:
+            raise ConnectionError(f"Unsupported DelugeRPC protocol version {version}")
+        return rencode.loads(zlib.decompress(self._read(length)), decode_utf8=True)
+
+    def _read(self, size):
+        data = b""
+        while len(data) < size:
+            chunk = self._socket.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("The daemon closed the connection")
+            data += chunk
+        return data
@@ -0,0 +1,50 @@
+"""
+Adaptive check scheduling for Network Monitor
+
+Backs off toward a maximum interval while adapters are stable and drops to a
+fast cadence as soon as one looks degraded or a check fails, so a quiet
+network costs few backend queries and a failing one is caught quickly.
+"""
+
+import random
+
+
+class AdaptiveSchedule(object):
+    """Computes the delay before the next check"""
+
+    def __init__(self, base, maximum, fast, backoff=1.5, jitter=0.1, rand=random.random):
+        """
+        base: interval (s) used when things first become stable
+        maximum: the interval stable checks back off toward
+        fast: interval while degraded or erroring
+        backoff: factor the interval grows by per stable check
+        jitter: +/- fraction of randomness added to each delay
+        rand: source of floats in [0, 1), replaceable for tests
+        """
+        self.base = float(base)
+        self.maximum = max(float(maximum), self.base)
+        self.fast = min(float(fast), self.base)
+        self.backoff = backoff
+        self.jitter = jitter
+        self._rand = rand
+        self.current = self.base
+
+    def reset(self):
+        """Start again from the base interval (e.g. after a config change)"""
+        self.current = self.base
+
+    def next_delay(self, degraded=False, errored=False):
+        """Return the delay before the next check given how the last one went"""
+        if degraded or errored:
+            self.current = self.fast
+        elif self.current < self.base:
+            # First stable check after a fast period
+            self.current = self.base
+        else:
+            self.current = min(self.current * self.backoff, self.maximum)
+        return self._jittered(self.current)
+
+    def _jittered(self, delay):
+        if not self.jitter:
+            return delay
+        return delay * (1 + self.jitter * (2 * self._rand() - 1))
@@ -0,0 +1,239 @@
+"""
+Configuration snapshots for Network Monitor
+
+The running configuration is a Settings: an immutable snapshot of every
+config key, validated, with the adapter policy and egress targets already
+parsed. A configuration change builds a whole new Settings and swaps it in
+with one assignment, so a check always sees one consistent configuration
+and never parses or validates anything itself.
+"""
+
+import logging
+import math
+from collections import namedtuple
+
+from .policy import parse as parse_policy
+
+log = logging.getLogger(__name__)
+
+CONFIG_FILE = "deluge_windows_network_monitor.conf"
+
+# Monitor modes
+MODE_EVENT = "event"  # React to backend change notifications, poll slowly as a safety net
+MODE_POLL = "poll"  # Poll every check_interval seconds
+
+# What to do when the kill-switch trips
+ACTION_SHUTDOWN = "shutdown"  # Shut the daemon down; restart by hand
+ACTION_PAUSE = "pause"  # Pause the session, resume it when the adapters come back
+
+# What a probe that misses its deadline counts as
+TIMEOUT_DOWN = "down"  # Every adapter down
+TIMEOUT_LAST_KNOWN = "last_known"  # The last successful snapshot again
+TIMEOUT_IGNORE = "ignore"  # Nothing; skip the sample
+
+# Deluge's Config casts a new value to the type of the one it replaces, so
+# settings that take fractions have float defaults
+DEFAULTS = {
+    "check_interval": 5.0,
+    "required_adapters": [],
+    "adapter_policy": "",
+    "monitor_mode": MODE_EVENT,
+    "fallback_interval": 60.0,
+    "max_check_interval": 30.0,
+    "fast_check_interval": 0.5,
+    "check_jitter": 0.1,
+    "trip_samples": 3,
+    "trip_window": 5,
+    "min_down_duration": 2.0,
+    "action": ACTION_SHUTDOWN,
+    "shutdown_flush_budget": 10.0,
+    "rebind_on_address_change": True,
+    "probe_isolation": True,
+    "probe_timeout": 10.0,
+    "probe_timeout_policy": TIMEOUT_DOWN,
+    "history_size": 4096,
+    "egress_targets": [],
+    "egress_timeout": 2.0,
+    "stall_detection": False,
+    "stall_window": 30.0,
+    "stall_min_rate": 16.0,
+    "adapter_list_ttl": 5.0,
+    "hold_until_first_check": True,
+    "trace_file": "",
+    "status_file": "",
+    "backend": "auto",
+}
+
+CONFIG_KEYS = tuple(DEFAULTS)
+
+# Settings that take fractions
+FLOAT_KEYS = tuple(key for key, value in DEFAULTS.items() if isinstance(value, float))
+
+# Keys only read when the plugin starts
+RESTART_KEYS = ("probe_isolation", "history_size", "hold_until_first_check", "backend")
+
+
+def coerce_floats(values):
+    """
+    Store whole numbers under FLOAT_KEYS in values (a dict) as floats.
+    Config files saved before those defaults were floats hold ints, and
+    Deluge's Config would cast every new value to int, saving 0.5 as 0.
+    """
+    for key in FLOAT_KEYS:
+        value = values.get(key)
+        if isinstance(value, int) and not isinstance(value, bool):
+            values[key] = float(value)
+
+
+def _number(value, whole=False, minimum=0, inclusive=False):
+    if isinstance(value, str):
+        try:
+            value = float(value)
+        except ValueError:
+            raise ValueError(f"must be a number, not {value!r}")
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise ValueError(f"must be a number, not {value!r}")
+    if whole:
+        if value != int(value):
+            raise ValueError(f"must be a whole number, not {value!r}")
+        value = int(value)
+    if value < minimum or (value == minimum and not inclusive):
+        raise ValueError(f"must be {'at least' if inclusive else 'more than'} {minimum}, not {value!r}")
+    return value
+
+
+def _flag(value):
+    # Forms and hand-edited JSON send strings; bool("false") would be True
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in ("true", "yes", "on", "1"):
+            return True
+        if text in ("false", "no", "off", "0"):
+            return False
+    elif value in (True, False):
+        return bool(value)
+    raise ValueError(f"must be true or false, not {value!r}")
+
+
+def _choice(value, choices):
+    if value not in choices:
+        raise ValueError(f"must be one of {', '.join(choices)}, not {value!r}")
+    return value
+
+
+def _strings(value):
+    if value is None:
+        return ()
+    if isinstance(value, str) or not all(isinstance(item, str) for item in value):
+        raise ValueError(f"must be a list of strings, not {value!r}")
+    return tuple(item.strip() for item in value if item.strip())
+
+
+def _parse_egress_targets(targets):
+    """Parse egress target strings. Raises ValueError for an invalid one."""
+    if not targets:
+        return ()
+    # egress pulls in asyncio, which is slow to import; only load it when probes are configured
+    from .egress import parse_target
+    return tuple(parse_target(target) for target in targets)
+
+
+_VALIDATORS = {
+    "check_interval": _number,
+    "required_adapters": _strings,
+    "adapter_policy": lambda value: (value or "").strip(),
+    "monitor_mode": lambda value: _choice(value, (MODE_EVENT, MODE_POLL)),
+    "fallback_interval": _number,
+    "max_check_interval": _number,
+    "fast_check_interval": _number,
+    "check_jitter": lambda value: _number(value, inclusive=True),
+    "trip_samples": lambda value: _number(value, whole=True, minimum=1, inclusive=True),
+    "trip_window": lambda value: _number(value, whole=True, minimum=1, inclusive=True),
+    "min_down_duration": lambda value: _number(value, inclusive=True),
+    "action": lambda value: _choice(value, (ACTION_SHUTDOWN, ACTION_PAUSE)),
+    "shutdown_flush_budget": lambda value: _number(value, inclusive=True),
+    "rebind_on_address_change": _flag,
+    "probe_isolation": _flag,
+    "probe_timeout": _number,
+    "probe_timeout_policy": lambda value: _choice(value, (TIMEOUT_DOWN, TIMEOUT_LAST_KNOWN, TIMEOUT_IGNORE)),
+    "history_size": lambda value: _number(value, whole=True, minimum=1, inclusive=True),
+    "egress_targets": _strings,
+    "egress_timeout": _number,
+    "stall_detection": _flag,
+    "stall_window": _number,
+    "stall_min_rate": lambda value: _number(value, inclusive=True),
+    "adapter_list_ttl": lambda value: _number(value, inclusive=True),
+    "hold_until_first_check": _flag,
+    "trace_file": lambda value: (value or "").strip(),
+    "status_file": lambda value: (value or "").strip(),
+    "backend": str,
+}
+
+# Parsed forms of config values, derived from the key they follow
+_DERIVED = {
+    "adapter_policy": ("policy_tree", lambda text: parse_policy(text) if text else None),
+    "egress_targets": ("egress", _parse_egress_targets),
+}
+
+
+class Settings(namedtuple("Settings", CONFIG_KEYS + ("policy_tree", "egress"))):
+    """
+    Immutable configuration snapshot: every config key, plus policy_tree
+    (adapter_policy parsed, or None) and egress (egress_targets parsed).
+    Lists are kept as tuples.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def build(cls, values, previous=None, strict=True):
+        """
+        Validate {key: value} (missing keys take their defaults) into a
+        Settings. Parsed values are reused from previous where their source
+        didn't change. Raises ValueError for an unknown key or an invalid
+        value; with strict=False an invalid value is logged and replaced by
+        its default instead.
+        """
+        unknown = set(values).difference(DEFAULTS)
+        if unknown:
+            raise ValueError(f"Unknown settings: {', '.join(sorted(unknown))}")
+
+        fields = {}
+        for key, default in DEFAULTS.items():
+            value = values.get(key, default)
+            try:
+                fields.update(cls._validate(key, value, previous))
+            except ValueError as e:
+                if strict:
+                    raise ValueError(f"Invalid {key}: {e}")
+                log.error(f"Invalid {key} {value!r}, using {default!r}: {e}")
+                fields.update(cls._validate(key, default, None))
+        return cls(**fields)
+
+    @staticmethod
+    def _validate(key, value, previous):
+        """Return {field: value} for a key and whatever is derived from it"""
+        value = _VALIDATORS[key](value)
+        fields = {key: value}
+        if key in _DERIVED:
+            field, parse = _DERIVED[key]
+            if previous is not None and getattr(previous, key) == value:
+                fields[field] = getattr(previous, field)
+            else:
+                fields[field] = parse(value)
+        return fields
+
+    def updated(self, changes, strict=True):
+        """A new Settings with changes ({key: value}) applied"""
+        values = self.config()
+        values.update(changes)
+        return Settings.build(values, self, strict)
+
+    def config(self):
+        """The config keys as {key: value}, with lists as lists, as saved and reported"""
+        return {key: list(value) if isinstance(value, tuple) else value
+                for key, value in zip(CONFIG_KEYS, self)}
+
+    def changed(self, other):
+        """The config keys whose values differ in other"""
+        return {key for key, mine, theirs in zip(CONFIG_KEYS, self, other) if mine != theirs}
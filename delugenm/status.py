@@ -0,0 +1,256 @@
+"""
+Shared-memory status for Network Monitor
+
+The core publishes whether the kill-switch is armed or tripped, and the
+status of every adapter, to a small memory-mapped file (status_file), so
+local tools (firewall scripts, health checkers, other plugins) can poll it
+as often as they like without an RPC round trip or a query of their own.
+This module has no other dependencies and can be copied into such a tool;
+StatusReader is all a reader needs.
+
+The file has a fixed layout (little-endian, never resized while in use):
+
+    offset  size  header
+    0       8     magic b"DNMSTAT\\0"
+    8       4     u32 layout version (1)
+    12      4     u32 adapter slots
+    16      8     u64 sequence: odd while the record is being written
+    24      8     u64 version: bumped whenever anything but the times changes
+    32      8     f64 last successful check, seconds since the epoch (0: none yet)
+    40      8     f64 last written, seconds since the epoch
+    48      4     u32 flags: 1 armed, 2 tripped, 4 holding, 8 healthy
+    52      4     u32 pid of the writer
+    56      2     u16 adapter count
+    64            adapter slots, 128 bytes each:
+                    i8 status (-1: a required adapter that is missing,
+                    -2: the backend reported no status),
+                    u8 flags (1: required), 2 pad, i32 index,
+                    then name, GUID and connection name, 40 bytes each,
+                    UTF-8 padded with NULs
+
+Writers follow the seqlock protocol: bump the sequence to odd, write,
+bump it to even. A reader copies the record between two reads of the
+sequence and retries if they differ or are odd.
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+from collections import namedtuple
+
+MAGIC = b"DNMSTAT\0"
+LAYOUT_VERSION = 1
+
+# Adapters the file has room for; required adapters are published first
+MAX_ADAPTERS = 64
+
+FLAG_ARMED = 1  # Checks are running
+FLAG_TRIPPED = 2  # The kill-switch has stopped Deluge's traffic
+FLAG_HOLDING = 4  # Traffic is held until the first good check
+FLAG_HEALTHY = 8  # The required adapters are confirmed up
+
+ADAPTER_REQUIRED = 1
+
+STATUS_MISSING = -1
+# NetConnectionStatus of a connected adapter (common.STATUS_CONNECTED)
+STATUS_CONNECTED = 2
+# Statuses of an adapter that is up: connected, or 802.1X authenticated (common.ACTIVE_STATUSES)
+ACTIVE_STATUSES = frozenset((STATUS_CONNECTED, 9))
+
+_HEADER = struct.Struct("<8sII")
+_SEQUENCE = struct.Struct("<Q")
+# version, last check, written, flags, pid, adapter count
+_RECORD = struct.Struct("<QddIIH6x")
+_ADAPTER = struct.Struct("<bB2xi40s40s40s")
+
+SEQUENCE_OFFSET = _HEADER.size
+RECORD_OFFSET = SEQUENCE_OFFSET + _SEQUENCE.size
+ADAPTERS_OFFSET = RECORD_OFFSET + _RECORD.size
+
+# Attempts at a consistent copy before giving up on a writer that keeps writing
+READ_RETRIES = 1000
+
+AdapterStatus = namedtuple("AdapterStatus", ["name", "guid", "connection_id", "index", "status", "required"])
+
+# last_check and written are seconds since the epoch; adapters: AdapterStatus tuples
+Status = namedtuple("Status", [
+    "version", "last_check", "written", "armed", "tripped", "holding", "healthy", "pid", "adapters",
+])
+
+
+class StatusError(ValueError):
+    """The file is not a status file, or its layout is not supported"""
+
+
+def _file_size(slots):
+    return ADAPTERS_OFFSET + slots * _ADAPTER.size
+
+
+def _text(value):
+    data = (value or "").encode("utf-8")[:40]
+    # Never cut a character in half
+    return data.decode("utf-8", "ignore").encode("utf-8")
+
+
+def _untext(data):
+    return data.rstrip(b"\0").decode("utf-8", "replace") or None
+
+
+class StatusWriter(object):
+    """Publishes status records to a status file"""
+
+    def __init__(self, path, slots=MAX_ADAPTERS):
+        self.path = path
+        self.slots = slots
+        size = _file_size(slots)
+        fd = os.open(path, os.O_RDWR | os.O_CREAT | getattr(os, "O_BINARY", 0), 0o644)
+        try:
+            self._file = os.fdopen(fd, "r+b")
+        except Exception:
+            os.close(fd)
+            raise
+        # Keep a file readers may still have mapped, carrying on from its version
+        existing = self._file.read(ADAPTERS_OFFSET)
+        if len(existing) == ADAPTERS_OFFSET and _HEADER.unpack_from(existing) == (MAGIC, LAYOUT_VERSION, slots) \
+                and os.fstat(self._file.fileno()).st_size == size:
+            self._sequence = _SEQUENCE.unpack_from(existing, SEQUENCE_OFFSET)[0] & ~1
+            self.version = _RECORD.unpack_from(existing, RECORD_OFFSET)[0]
+        else:
+            self._file.seek(0)
+            self._file.truncate(size)
+            self._file.write(_HEADER.pack(MAGIC, LAYOUT_VERSION, slots))
+            self._file.flush()
+            self._sequence = 0
+            self.version = 0
+        self._map = mmap.mmap(self._file.fileno(), size)
+        self._state = None
+        self._adapters = b""
+        self._count = 0
+
+    def publish(self, last_check, armed, tripped, holding, healthy, adapters=None):
+        """
+        Write a record. adapters: (name, GUID, connection name, index, status,
+        required) tuples, or None if they haven't changed since the last call.
+        """
+        if adapters is not None:
+            # Required adapters first, in case there are more than fit
+            adapters = sorted(adapters, key=lambda adapter: not adapter[5])[:self.slots]
+            packed = b"".join(
+                _ADAPTER.pack(status, ADAPTER_REQUIRED if required else 0, index or 0,
+                              _text(name), _text(guid), _text(connection_id))
+                for name, guid, connection_id, index, status, required in adapters
+            )
+            count = len(adapters)
+        else:
+            packed, count = self._adapters, self._count
+        flags = ((FLAG_ARMED if armed else 0) | (FLAG_TRIPPED if tripped else 0)
+                 | (FLAG_HOLDING if holding else 0) | (FLAG_HEALTHY if healthy else 0))
+
+        changed = (flags, packed) != self._state
+        if changed:
+            self._state = (flags, packed)
+            self.version += 1
+        self._adapters, self._count = packed, count
+
+        record = _RECORD.pack(self.version, last_check or 0.0, time.time(), flags, os.getpid(), count)
+        self._sequence += 1
+        _SEQUENCE.pack_into(self._map, SEQUENCE_OFFSET, self._sequence)
+        if changed:
+            self._map[RECORD_OFFSET:ADAPTERS_OFFSET + len(packed)] = record + packed
+        else:
+            self._map[RECORD_OFFSET:ADAPTERS_OFFSET] = record
+        self._sequence += 1
+        _SEQUENCE.pack_into(self._map, SEQUENCE_OFFSET, self._sequence)
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+class StatusReader(object):
+    """Reads a status file; keep one open and poll it"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as status_file:
+            header = status_file.read(_HEADER.size)
+            if len(header) < _HEADER.size:
+                raise StatusError(f"{path} is not a Network Monitor status file")
+            magic, layout, slots = _HEADER.unpack(header)
+            if magic != MAGIC:
+                raise StatusError(f"{path} is not a Network Monitor status file")
+            if layout != LAYOUT_VERSION:
+                raise StatusError(f"Unsupported status layout {layout}")
+            self._map = mmap.mmap(status_file.fileno(), _file_size(slots), access=mmap.ACCESS_READ)
+        self._sequence = None
+        self._status = None
+
+    def sequence(self):
+        """The writer's sequence number; changes with every record written"""
+        return _SEQUENCE.unpack_from(self._map, SEQUENCE_OFFSET)[0]
+
+    def read(self):
+        """
+        The current Status. Returns the previous result without copying
+        anything if nothing was written since. Raises StatusError if the
+        writer never lets go long enough to read a consistent record.
+        """
+        status_map = self._map
+        for _ in range(READ_RETRIES):
+            before = _SEQUENCE.unpack_from(status_map, SEQUENCE_OFFSET)[0]
+            if before & 1:
+                # Mid-write; let the writer finish if it was descheduled
+                time.sleep(0)
+                continue
+            if before == self._sequence:
+                return self._status
+            version, last_check, written, flags, pid, count = _RECORD.unpack_from(status_map, RECORD_OFFSET)
+            count = min(count, (len(status_map) - ADAPTERS_OFFSET) // _ADAPTER.size)
+            adapters = status_map[ADAPTERS_OFFSET:ADAPTERS_OFFSET + count * _ADAPTER.size]
+            if _SEQUENCE.unpack_from(status_map, SEQUENCE_OFFSET)[0] != before:
+                time.sleep(0)
+                continue
+            self._sequence = before
+            self._status = Status(
+                version, last_check or None, written, bool(flags & FLAG_ARMED), bool(flags & FLAG_TRIPPED),
+                bool(flags & FLAG_HOLDING), bool(flags & FLAG_HEALTHY), pid,
+                tuple(AdapterStatus(_untext(name), _untext(guid), _untext(connection_id), index, status,
+                                    bool(adapter_flags & ADAPTER_REQUIRED))
+                      for status, adapter_flags, index, name, guid, connection_id in _ADAPTER.iter_unpack(adapters))
+            )
+            return self._status
+        raise StatusError(f"{self.path} kept changing while being read")
+
+    def close(self):
+        self._map.close()
+
+
+def adapter_up(status, key):
+    """Whether the adapter with this name, GUID or connection name is up"""
+    return any(adapter.status in ACTIVE_STATUSES for adapter in status.adapters
+               if key in (adapter.name, adapter.guid, adapter.connection_id))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Show the status published by Network Monitor")
+    parser.add_argument("path", help="the plugin's status_file")
+    parser.add_argument("--check", action="store_true",
+                        help="exit with status 1 unless armed, healthy and not tripped")
+    args = parser.parse_args(argv)
+
+    reader = StatusReader(args.path)
+    status = reader.read()
+    reader.close()
+    print(json.dumps(dict(status._asdict(), adapters=[adapter._asdict() for adapter in status.adapters]),
+                     indent=2, sort_keys=True))
+    if args.check and not (status.armed and status.healthy and not status.tripped):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+"""
+Adapter state traces for Network Monitor
+
+A trace is an append-only binary file of what the backend reported: every
+snapshot as (timestamp, [(adapter, status code), ...]), change events and
+probe timeouts, so flaps seen on a user's machine can be replayed through
+the decision pipeline later (see replay.py). Addresses, counters and
+anything else are left out.
+
+Little-endian records, each starting with a type byte:
+
+    header    b"DNMTRACE" + version (u8), once at the start of the file
+    start     f64 timestamp; the recorder was (re)started
+    adapter   u16 id, i32 index, then name, GUID and connection name, each
+              u8 length + UTF-8; defines an id for the records after it
+    snapshot  f64 timestamp, u16 count, count x (u16 id, i8 status)
+    event     f64 timestamp, u8 kind, u16 id (0xFFFF: no adapter)
+    timeout   f64 timestamp; a probe missed its deadline
+
+A snapshot of n adapters takes 11 + 3n bytes. Ids are only valid until the
+next start record, so a file can be appended to across restarts.
+"""
+
+import logging
+import struct
+import time
+from collections import namedtuple
+
+from .backends import (
+    Adapter,
+    AdapterEvent,
+    AdapterSnapshot,
+    EVENT_ADDRESS,
+    EVENT_ADDRESS_ADDED,
+    EVENT_ADDRESS_REMOVED,
+    EVENT_LINK,
+)
+
+log = logging.getLogger(__name__)
+
+MAGIC = b"DNMTRACE"
+VERSION = 1
+
+RECORD_START = 1
+RECORD_ADAPTER = 2
+RECORD_SNAPSHOT = 3
+RECORD_EVENT = 4
+RECORD_TIMEOUT = 5
+
+# Event kinds by their code in the trace
+EVENT_KINDS = (EVENT_LINK, EVENT_ADDRESS, EVENT_ADDRESS_ADDED, EVENT_ADDRESS_REMOVED)
+NO_ADAPTER = 0xFFFF
+
+_TIME = struct.Struct("<Bd")
+_ADAPTER = struct.Struct("<BHi")
+_SNAPSHOT = struct.Struct("<BdH")
+_ENTRY = struct.Struct("<Hb")
+_EVENT = struct.Struct("<BdBH")
+
+# Distinct snapshots kept while parsing; traces mostly repeat the same few
+SNAPSHOT_CACHE_SIZE = 4096
+
+# kind: one of the RECORD_* types; timestamp: seconds since the epoch;
+# value: the AdapterSnapshot or AdapterEvent, None for start and timeout
+TraceRecord = namedtuple("TraceRecord", ["kind", "timestamp", "value"])
+
+
+class TraceError(ValueError):
+    """The file is not a trace, or is damaged"""
+
+
+def _text(value):
+    data = (value or "").encode("utf-8")[:255]
+    return bytes((len(data),)) + data
+
+
+class TraceWriter(object):
+    """Appends snapshots, events and timeouts to a trace file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(MAGIC + bytes((VERSION,)))
+        self._ids = {}
+        self._start()
+
+    def _start(self):
+        # Adapter (guid, name, connection name, index) -> id, until the next start record
+        self._ids = {}
+        self._file.write(_TIME.pack(RECORD_START, time.time()))
+
+    def _reserve(self, count):
+        """Make sure count more ids fit; adapters that keep being renamed could use them all up"""
+        if len(self._ids) + count >= NO_ADAPTER:
+            self._start()
+
+    def _id(self, adapter):
+        key = (adapter.guid, adapter.name, adapter.connection_id, adapter.index)
+        adapter_id = self._ids.get(key)
+        if adapter_id is None:
+            adapter_id = self._ids[key] = len(self._ids)
+            self._file.write(
+                _ADAPTER.pack(RECORD_ADAPTER, adapter_id, adapter.index or 0)
+                + _text(adapter.name) + _text(adapter.guid) + _text(adapter.connection_id)
+            )
+        return adapter_id
+
+    def _event_id(self, key):
+        if key is None:
+            return NO_ADAPTER
+        for (guid, name, _connection_id, _index), adapter_id in self._ids.items():
+            if key in (guid, name):
+                return adapter_id
+        return self._id(Adapter(key, key, 0, None, 0))
+
+    def _write(self, data):
+        self._file.write(data)
+        # One write per record reaches the OS, so a crash loses at most the last
+        self._file.flush()
+
+    def write_snapshot(self, snapshot):
+        self._reserve(len(snapshot.adapters))
+        ids = [(self._id(adapter), adapter.status) for adapter in snapshot.adapters]
+        self._write(
+            _SNAPSHOT.pack(RECORD_SNAPSHOT, snapshot.timestamp, len(ids))
+            + b"".join(_ENTRY.pack(adapter_id, status) for adapter_id, status in ids)
+        )
+
+    def write_event(self, event, timestamp=None):
+        kind = EVENT_KINDS.index(event.kind) if event.kind in EVENT_KINDS else 0
+        self._reserve(1)
+        adapter_id = self._event_id(event.adapter)
+        self._write(_EVENT.pack(RECORD_EVENT, time.time() if timestamp is None else timestamp, kind, adapter_id))
+
+    def write_timeout(self, timestamp=None):
+        self._write(_TIME.pack(RECORD_TIMEOUT, time.time() if timestamp is None else timestamp))
+
+    def close(self):
+        self._file.close()
+
+
+def parse_trace(data):
+    """
+    Yield the TraceRecords in trace file contents (bytes). A record cut
+    short at the end (the recorder was killed mid-write) is dropped.
+    Raises TraceError if data is not a trace.
+    """
+    if len(data) <= len(MAGIC) or data[:len(MAGIC)] != MAGIC:
+        raise TraceError("Not a Network Monitor trace")
+    if data[len(MAGIC)] != VERSION:
+        raise TraceError(f"Unsupported trace version {data[len(MAGIC)]}")
+
+    adapters = {}
+    # Raw snapshot entries -> AdapterSnapshot, valid until the next start record
+    snapshots = {}
+    offset = len(MAGIC) + 1
+    end = len(data)
+    try:
+        while offset < end:
+            kind = data[offset]
+            if kind == RECORD_SNAPSHOT:
+                _, timestamp, count = _SNAPSHOT.unpack_from(data, offset)
+                offset += _SNAPSHOT.size
+                size = count * _ENTRY.size
+                if offset + size > end:
+                    raise IndexError
+                raw = data[offset:offset + size]
+                snapshot = snapshots.get(raw)
+                if snapshot is None:
+                    if len(snapshots) >= SNAPSHOT_CACHE_SIZE:
+                        snapshots = {}
+                    snapshot = snapshots[raw] = AdapterSnapshot(
+                        (Adapter(*adapters[adapter_id], status) for adapter_id, status in _ENTRY.iter_unpack(raw)),
+                        timestamp
+                    )
+                else:
+                    snapshot = snapshot.at(timestamp)
+                offset += size
+                yield TraceRecord(RECORD_SNAPSHOT, timestamp, snapshot)
+            elif kind == RECORD_ADAPTER:
+                _, adapter_id, index = _ADAPTER.unpack_from(data, offset)
+                offset += _ADAPTER.size
+                texts = []
+                for _ in range(3):
+                    length = data[offset]
+                    if offset + 1 + length > end:
+                        raise IndexError
+                    texts.append(data[offset + 1:offset + 1 + length].decode("utf-8", "replace") or None)
+                    offset += 1 + length
+                name, guid, connection_id = texts
+                # Everything but the status, which each snapshot gives
+                adapters[adapter_id] = (name, guid, index, connection_id)
+                snapshots = {}
+            elif kind == RECORD_EVENT:
+                _, timestamp, event_kind, adapter_id = _EVENT.unpack_from(data, offset)
+                offset += _EVENT.size
+                adapter = adapters.get(adapter_id)
+                key = (adapter[1] or adapter[0]) if adapter is not None else None
+                yield TraceRecord(RECORD_EVENT, timestamp, AdapterEvent(EVENT_KINDS[event_kind], key))
+            elif kind in (RECORD_START, RECORD_TIMEOUT):
+                _, timestamp = _TIME.unpack_from(data, offset)
+                offset += _TIME.size
+                if kind == RECORD_START:
+                    adapters = {}
+                    snapshots = {}
+                yield TraceRecord(kind, timestamp, None)
+            else:
+                raise TraceError(f"Unknown record type {kind} at offset {offset}")
+    except (struct.error, IndexError):
+        log.warning(f"Trace ends with a partial record at offset {offset}")
+    except KeyError as e:
+        raise TraceError(f"Snapshot at offset {offset} refers to undefined adapter {e}")
+
+
+def read_trace(path):
+    """Read a trace file into a list of TraceRecords"""
+    with open(path, "rb") as trace_file:
+        return list(parse_trace(trace_file.read()))
@@ -0,0 +1,142 @@
+"""
+Traffic stall detection for Network Monitor
+
+Some failures leave an adapter "connected" while nothing moves through it,
+or only its error counters climb. The adapters' cumulative byte, packet and
+error counters come with each check's snapshot (read in the same backend
+pass) and are kept per adapter in array.array columns. Rates are worked out
+a whole row at a time, from the newest sample and the newest one at least a
+window older. An adapter is stalled if its byte rate is below the minimum,
+or if at least as many packets failed as got through.
+"""
+
+import array
+
+from .backends import AdapterCounters
+
+FIELDS = AdapterCounters._fields
+WIDTH = len(FIELDS)
+RX_BYTES = FIELDS.index("rx_bytes")
+TX_BYTES = FIELDS.index("tx_bytes")
+RX_PACKETS = FIELDS.index("rx_packets")
+TX_PACKETS = FIELDS.index("tx_packets")
+RX_ERRORS = FIELDS.index("rx_errors")
+TX_ERRORS = FIELDS.index("tx_errors")
+
+
+class CounterWindow(object):
+    """Fixed-capacity ring of (timestamp, counters) samples of one adapter"""
+
+    __slots__ = ("capacity", "timestamps", "values", "_start", "_count")
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.timestamps = array.array("d", bytes(8 * capacity))
+        # One row of WIDTH counters per sample; doubles hold 53-bit counters exactly
+        self.values = array.array("d", bytes(8 * WIDTH * capacity))
+        self._start = 0
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def _index(self, position):
+        return (self._start + position) % self.capacity
+
+    def last_timestamp(self):
+        return self.timestamps[self._index(self._count - 1)] if self._count else None
+
+    def append(self, timestamp, counters):
+        if self._count < self.capacity:
+            index = self._index(self._count)
+            self._count += 1
+        else:
+            index = self._start
+            self._start = (self._start + 1) % self.capacity
+        self.timestamps[index] = timestamp
+        self.values[index * WIDTH:(index + 1) * WIDTH] = array.array("d", counters)
+
+    def rates(self, window):
+        """
+        Per-second rate of each counter between the newest sample and the
+        newest one at least window seconds older, or None until the samples
+        span the window. A counter that went backwards (reset or wrapped) has
+        rate None.
+        """
+        if self._count < 2:
+            return None
+        newest = self._index(self._count - 1)
+        cutoff = self.timestamps[newest] - window
+
+        # Newest position with timestamp <= cutoff
+        low, high = 0, self._count - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.timestamps[self._index(middle)] <= cutoff:
+                low = middle
+            else:
+                high = middle - 1
+        oldest = self._index(low)
+        if self.timestamps[oldest] > cutoff:
+            return None
+
+        span = self.timestamps[newest] - self.timestamps[oldest]
+        old_row = self.values[oldest * WIDTH:(oldest + 1) * WIDTH]
+        new_row = self.values[newest * WIDTH:(newest + 1) * WIDTH]
+        return AdapterCounters(*(
+            (new - old) / span if new >= old else None
+            for old, new in zip(old_row, new_row)
+        ))
+
+
+class TrafficMonitor(object):
+    """
+    Counter windows of every adapter, and which of them are stalled: moved
+    fewer than min_rate bytes per second (both directions) over window
+    seconds, or had at least as many errors as packets.
+    """
+
+    def __init__(self, window=30.0, min_rate=16.0, capacity=128):
+        self.window = window
+        self.min_rate = min_rate
+        self.capacity = capacity
+        # Samples closer together than this are skipped, so a window always fits
+        self.min_spacing = window * 2.0 / capacity
+        self._windows = {}
+
+    def update(self, timestamp, counters):
+        """Add a sample of {adapter key: AdapterCounters}; adapters not in it are forgotten"""
+        for key in list(self._windows):
+            if key not in counters:
+                del self._windows[key]
+        for key, value in counters.items():
+            window = self._windows.get(key)
+            if window is None:
+                window = self._windows[key] = CounterWindow(self.capacity)
+            last = window.last_timestamp()
+            if last is None or timestamp - last >= self.min_spacing:
+                window.append(timestamp, value)
+
+    def rates(self, key):
+        """AdapterCounters of per-second rates over the window, or None if not known yet"""
+        window = self._windows.get(key)
+        return window.rates(self.window) if window is not None else None
+
+    def stalled(self, key):
+        """
+        True if the adapter moved (almost) nothing over the window, or mostly
+        errors (a link that is up but corrupting everything still moves a few
+        bytes), None if that's not known yet
+        """
+        rates = self.rates(key)
+        if rates is None or rates[RX_BYTES] is None or rates[TX_BYTES] is None:
+            return None
+        if rates[RX_BYTES] + rates[TX_BYTES] < self.min_rate:
+            return True
+        # A counter that was reset has no rate; leave it out
+        errors = (rates[RX_ERRORS] or 0.0) + (rates[TX_ERRORS] or 0.0)
+        packets = (rates[RX_PACKETS] or 0.0) + (rates[TX_PACKETS] or 0.0)
+        return errors > 0 and errors >= packets
+
+    def clear(self):
+        self._windows = {}
@@ -0,0 +1,400 @@
+"""
+Standalone watchdog for Network Monitor
+
+Guards several Deluge daemons on one host from a single process, instead of
+each daemon loading its own copy of the plugin and polling the same
+adapters. Every tick the adapters are enumerated once, each daemon's own
+decision.Decider (its required adapters or policy, plus the adapters behind
+its listen/outgoing interfaces) judges that one snapshot, and the pauses,
+resumes and shutdowns go out to all daemons at once, each over a persistent
+DelugeRPC connection.
+
+    python -m delugenm.watchdog watchdog.json
+
+Deluge and Twisted don't have to be installed where it runs, only the
+rencode package DelugeRPC messages are encoded with.
+
+The config file is JSON:
+
+    {
+        "settings": {"check_interval": 5, "action": "pause"},
+        "rpc_timeout": 10,
+        "daemons": [
+            {"name": "vpn-a", "port": 58846, "username": "localclient", "password": "...",
+             "required_adapters": ["wg-a"]},
+            {"name": "vpn-b", "port": 58847, "username": "localclient", "password": "...",
+             "adapter_policy": "wg-b AND NOT Ethernet", "action": "shutdown"}
+        ]
+    }
+
+"settings" takes the plugin's config keys and applies to every daemon; a
+daemon can override the ones that decide for it (DAEMON_KEYS). Disable the
+plugin in the daemons the watchdog guards.
+"""
+
+import argparse
+import json
+import logging
+import signal
+import sys
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from .addrindex import AddressIndex
+from .backends import AdapterSnapshot, get_backend
+from .decision import HYSTERESIS_KEYS, INTERFACE_KEYS, Decider
+from .rpc import DEFAULT_PORT, DelugeRPCClient
+from .scheduler import AdaptiveSchedule
+from .settings import ACTION_PAUSE, ACTION_SHUTDOWN, TIMEOUT_DOWN, TIMEOUT_LAST_KNOWN, Settings
+from .worker import ProbeTimeout, ProbeWorker, isolation_supported
+
+log = logging.getLogger(__name__)
+
+# Settings a daemon can give for itself; the rest are shared
+DAEMON_KEYS = HYSTERESIS_KEYS + ("required_adapters", "adapter_policy", "action")
+
+# Keys of a daemon entry that say how to reach it
+CONNECTION_KEYS = ("name", "host", "port", "username", "password")
+
+# Seconds an RPC exchange with one daemon may take
+DEFAULT_RPC_TIMEOUT = 10.0
+
+# Sent to a daemon to undo a pause
+ACTION_RESUME = "resume"
+
+DaemonSpec = namedtuple("DaemonSpec", ["name", "host", "port", "username", "password", "settings"])
+
+# The outcome of one round of RPC calls to a daemon. action: what was sent
+# (None for nothing); resume_on_recovery: for a new pause, whether the
+# session was running before it (None otherwise); interfaces: Deluge's
+# {interface key: value}, None if not read
+Exchange = namedtuple("Exchange", ["reconnected", "action", "resume_on_recovery", "interfaces"])
+
+
+def load_config(path):
+    """
+    Read a watchdog config file. Returns (shared Settings, rpc_timeout,
+    [DaemonSpec]). Raises OSError, or ValueError for an invalid config.
+    """
+    with open(path) as config_file:
+        data = json.load(config_file)
+    if not isinstance(data, dict):
+        raise ValueError("The watchdog config must be a JSON object")
+    unknown = set(data).difference(("settings", "rpc_timeout", "daemons"))
+    if unknown:
+        raise ValueError(f"Unknown watchdog config keys: {', '.join(sorted(unknown))}")
+
+    settings = Settings.build(data.get("settings") or {})
+    if settings.egress:
+        log.warning("egress_targets is not supported by the watchdog and is ignored")
+        settings = settings.updated({"egress_targets": []})
+
+    rpc_timeout = data.get("rpc_timeout", DEFAULT_RPC_TIMEOUT)
+    if isinstance(rpc_timeout, bool) or not isinstance(rpc_timeout, (int, float)) or rpc_timeout <= 0:
+        raise ValueError(f"Invalid rpc_timeout: must be more than 0, not {rpc_timeout!r}")
+
+    entries = data.get("daemons")
+    if not isinstance(entries, list) or not entries:
+        raise ValueError("The watchdog config needs a list of daemons")
+    daemons = []
+    for entry in entries:
+        if not isinstance(entry, dict):
+            raise ValueError(f"A daemon must be a JSON object, not {entry!r}")
+        unknown = set(entry).difference(CONNECTION_KEYS + DAEMON_KEYS)
+        if unknown:
+            raise ValueError(f"Unknown daemon keys: {', '.join(sorted(unknown))}")
+        host = entry.get("host", "127.0.0.1")
+        port = entry.get("port", DEFAULT_PORT)
+        if isinstance(port, bool) or not isinstance(port, int) or not 0 < port < 65536:
+            raise ValueError(f"Invalid port {port!r}")
+        name = entry.get("name") or f"{host}:{port}"
+        if any(daemon.name == name for daemon in daemons):
+            raise ValueError(f"Daemon '{name}' is listed twice")
+        try:
+            daemon_settings = settings.updated({key: entry[key] for key in DAEMON_KEYS if key in entry})
+        except ValueError as e:
+            raise ValueError(f"Daemon '{name}': {e}")
+        daemons.append(DaemonSpec(name, host, port, entry.get("username", ""), entry.get("password", ""),
+                                  daemon_settings))
+    return settings, float(rpc_timeout), daemons
+
+
+class DaemonGuard(object):
+    """
+    One guarded daemon: its decisions, made on the watchdog's thread, and
+    the RPC calls they lead to, made in the watchdog's pool.
+    """
+
+    def __init__(self, spec, rpc_timeout=DEFAULT_RPC_TIMEOUT):
+        self.name = spec.name
+        self.settings = spec.settings
+        self.client = DelugeRPCClient(spec.host, spec.port, spec.username, spec.password, rpc_timeout)
+        self.decider = Decider(self.settings)
+        self.tripped = False
+        # Shut down by the watchdog; nothing is decided until it is back
+        self.stopped = False
+        # Action decided on but not yet sent: ACTION_PAUSE, ACTION_RESUME, ACTION_SHUTDOWN or None
+        self.pending = None
+        # Leave a session the user paused themselves paused when we recover
+        self.resume_on_recovery = False
+        # Whether the last exchange got through; None before the first
+        self.reachable = None
+        # Deluge's interface values, and the adapter GUIDs behind them
+        self.interfaces = {}
+        self.interface_adapters = {}
+        self._exchange_future = None
+
+    def resolve_interfaces(self, index):
+        """Require the adapters behind Deluge's listen/outgoing interfaces, as the plugin does"""
+        for key in INTERFACE_KEYS:
+            interface = self.interfaces.get(key)
+            guid = index.resolve(interface) if interface else None
+            previous = self.interface_adapters.get(key)
+            if guid is None and interface and previous:
+                # The address went away (e.g. the VPN is reconnecting); Deluge is still bound to it
+                guid = previous
+            elif guid != previous and guid:
+                log.info(f"{self.name}: Deluge {key} '{interface}' is on adapter {guid}")
+            self.interface_adapters[key] = guid
+        self.decider.set_interfaces(self.interface_adapters.values())
+
+    def evaluate(self, snapshot, now):
+        """Run a snapshot through this daemon's trip logic and decide what to send it"""
+        if self.stopped:
+            return
+        if not self.decider.check(snapshot, now):
+            if not self.tripped:
+                self.tripped = True
+                self.pending = self.settings.action
+                log.warning(f"{self.name}: network interface confirmed down ({self.decider.detector.states()}) - "
+                            + ("pausing Deluge" if self.settings.action == ACTION_PAUSE else "shutting down Deluge"))
+        elif self.tripped and self.decider.healthy and self.settings.action == ACTION_PAUSE:
+            log.info(f"{self.name}: network interface back up ({self.decider.detector.states()}) - resuming Deluge")
+            self.tripped = False
+            self.pending = ACTION_RESUME
+
+    @property
+    def busy(self):
+        """Whether an exchange with the daemon is still running"""
+        return self._exchange_future is not None and not self._exchange_future.done()
+
+    def start_exchange(self, executor):
+        """Send what was decided, and read Deluge's interfaces, in the pool. Returns the future."""
+        if self.busy:
+            return self._exchange_future
+        # A daemon that restarts while paused by the kill-switch has to be paused again
+        repause = self.tripped and self.settings.action == ACTION_PAUSE
+        self._exchange_future = executor.submit(self._exchange, self.pending, repause, self.resume_on_recovery)
+        return self._exchange_future
+
+    def _exchange(self, action, repause, resume_on_recovery):
+        """Runs in a pool thread; touches nothing but the client"""
+        established = self.client.connected
+        try:
+            return self._exchange_once(action, repause, resume_on_recovery)
+        except OSError:
+            if not established:
+                raise
+            # The connection went stale (e.g. the daemon restarted); try once on a fresh one
+            return self._exchange_once(action, repause, resume_on_recovery)
+
+    def _exchange_once(self, action, repause, resume_on_recovery):
+        client = self.client
+        reconnected = not client.connected
+        if reconnected:
+            client.connect()
+        fresh_pause = None
+        if action is None and reconnected and repause:
+            action = ACTION_PAUSE
+        elif action == ACTION_PAUSE:
+            fresh_pause = not client.call("core.is_session_paused")
+
+        if action == ACTION_PAUSE:
+            client.call("core.pause_session")
+        elif action == ACTION_RESUME:
+            if resume_on_recovery:
+                client.call("core.resume_session")
+        elif action == ACTION_SHUTDOWN:
+            client.call("daemon.shutdown")
+            client.close()
+            return Exchange(reconnected, action, None, None)
+        return Exchange(reconnected, action, fresh_pause, client.call("core.get_config_values", list(INTERFACE_KEYS)))
+
+    def finish_exchange(self):
+        """Take in the outcome of a finished exchange, on the watchdog's thread"""
+        future = self._exchange_future
+        if future is None or not future.done():
+            return
+        self._exchange_future = None
+        try:
+            exchange = future.result()
+        except Exception as e:
+            if self.reachable is not False:
+                log.warning(f"{self.name}: can't reach the daemon at {self.client.host}:{self.client.port}: {e}")
+            self.reachable = False
+            return
+
+        if not self.reachable:
+            log.info(f"{self.name}: connected to the daemon at {self.client.host}:{self.client.port}")
+        self.reachable = True
+        if self.stopped and exchange.reconnected:
+            # Restarted by hand after a shutdown: start over, as the plugin would
+            log.info(f"{self.name}: the daemon is back, guarding it again")
+            self.decider = Decider(self.settings)
+            self.stopped = self.tripped = False
+            self.interface_adapters = {}
+        if exchange.action == self.pending:
+            self.pending = None
+        if exchange.action == ACTION_PAUSE and exchange.resume_on_recovery is not None:
+            self.resume_on_recovery = exchange.resume_on_recovery
+        elif exchange.action == ACTION_RESUME:
+            if not self.resume_on_recovery:
+                log.info(f"{self.name}: session was already paused before the kill-switch tripped, leaving it paused")
+            self.resume_on_recovery = False
+        elif exchange.action == ACTION_SHUTDOWN:
+            self.stopped = True
+        if exchange.interfaces is not None:
+            self.interfaces = {key: exchange.interfaces.get(key) for key in INTERFACE_KEYS}
+
+
+class Watchdog(object):
+    """Checks the adapters once per tick and guards every configured daemon with the result"""
+
+    def __init__(self, settings, daemons, rpc_timeout=DEFAULT_RPC_TIMEOUT, backend=None):
+        self.settings = settings
+        self.rpc_timeout = rpc_timeout
+        self.guards = [DaemonGuard(spec, rpc_timeout) for spec in daemons]
+        self.backend = backend
+        self.prober = None
+        self.address_index = AddressIndex()
+        self._address_key = None
+        self._last_snapshot = None
+        self.schedule = AdaptiveSchedule(
+            base=settings.check_interval,
+            maximum=settings.max_check_interval,
+            fast=settings.fast_check_interval,
+            jitter=settings.check_jitter
+        )
+        # One thread per daemon, so a hung daemon never holds up the others
+        self._executor = ThreadPoolExecutor(max_workers=len(self.guards), thread_name_prefix="NetworkMonitorRPC")
+
+    def start(self):
+        """Set up the adapter backend. Raises RuntimeError if there is none."""
+        if self.backend is None:
+            self.backend = get_backend(self.settings.backend)
+        if self.backend is None:
+            raise RuntimeError(f"No usable network adapter backend ({self.settings.backend})")
+        if self.settings.probe_isolation and self.backend.isolatable and isolation_supported():
+            self.prober = ProbeWorker(self.backend.name, self.settings.probe_timeout)
+        else:
+            self.prober = self.backend
+        log.info(f"Guarding {len(self.guards)} Deluge daemons with the {self.backend.name} adapter backend")
+        # Connect and read Deluge's interfaces before the first decision
+        self._exchange_all()
+
+    def _exchange_all(self):
+        """Run every daemon's exchange at once, waiting up to rpc_timeout for them"""
+        wait([guard.start_exchange(self._executor) for guard in self.guards], timeout=self.rpc_timeout)
+        for guard in self.guards:
+            guard.finish_exchange()
+
+    def close(self):
+        """Stop, resuming the sessions the kill-switch paused, as disabling the plugin does"""
+        for guard in self.guards:
+            if guard.tripped and guard.settings.action == ACTION_PAUSE and not guard.busy:
+                guard.tripped = False
+                guard.pending = ACTION_RESUME
+                guard.start_exchange(self._executor)
+        wait([guard._exchange_future for guard in self.guards if guard.busy], timeout=self.rpc_timeout)
+        for guard in self.guards:
+            guard.finish_exchange()
+            guard.client.close()
+        self._executor.shutdown(wait=False)
+        if isinstance(self.prober, ProbeWorker):
+            self.prober.stop()
+        self.prober = None
+
+    def tick(self):
+        """One check of every daemon. Returns the seconds until the next."""
+        now = time.monotonic()
+        errored = False
+        snapshot = None
+        try:
+            snapshot = self.prober.snapshot()
+            self._last_snapshot = snapshot
+        except ProbeTimeout as e:
+            log.warning(f"{e}, treating as {self.settings.probe_timeout_policy}")
+            if self.settings.probe_timeout_policy == TIMEOUT_DOWN:
+                snapshot = AdapterSnapshot([])
+            elif self.settings.probe_timeout_policy == TIMEOUT_LAST_KNOWN:
+                snapshot = self._last_snapshot
+        except Exception as e:
+            # Assume OK on error to avoid false shutdowns
+            log.error(f"Error checking network status: {e}")
+            errored = True
+
+        if snapshot is not None:
+            self._update_interfaces(snapshot)
+            for guard in self.guards:
+                guard.evaluate(snapshot, now)
+
+        self._exchange_all()
+
+        # Actions that didn't get through are retried at the fast cadence
+        degraded = any(guard.decider.degraded or guard.pending is not None for guard in self.guards)
+        return self.schedule.next_delay(degraded=degraded, errored=errored)
+
+    def _update_interfaces(self, snapshot):
+        """Map each daemon's interfaces to adapters; addresses are only queried when something changed"""
+        interfaces = tuple(value for guard in self.guards for value in guard.interfaces.values() if value)
+        key = (interfaces, tuple((adapter.guid, adapter.status) for adapter in snapshot.adapters))
+        if interfaces and key != self._address_key:
+            try:
+                self.address_index.rebuild(self.prober.addresses(), snapshot)
+                self._address_key = key
+            except Exception as e:
+                log.error(f"Error building adapter address index: {e}")
+        elif interfaces:
+            self.address_index.update_names(snapshot)
+        for guard in self.guards:
+            guard.resolve_interfaces(self.address_index)
+
+    def run(self, stop):
+        """Tick until stop (a threading.Event) is set"""
+        self.start()
+        try:
+            while not stop.is_set():
+                stop.wait(self.tick())
+        finally:
+            self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Guard several Deluge daemons with one network monitor")
+    parser.add_argument("config", help="watchdog config file (JSON)")
+    parser.add_argument("--verbose", action="store_true", help="log debug messages")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    try:
+        settings, rpc_timeout, daemons = load_config(args.config)
+    except (OSError, ValueError) as e:
+        log.error(f"Could not load {args.config}: {e}")
+        return 2
+
+    stop = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stop.set())
+    try:
+        Watchdog(settings, daemons, rpc_timeout).run(stop)
+    except RuntimeError as e:
+        log.error(str(e))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,6 +4,7 @@ Web UI for Network Monitor plugin
 
 import logging
 from deluge.plugins.webui import WebUIPluginBase
+from deluge.ui.client import client
 from deluge.web.auth import requires_auth
 import json
 
@@ -11,49 +12,128 @@ log = logging.getLogger(__name__)
 
 
 class WebUI(WebUIPluginBase):
-    """Web UI for Network Monitor - configuration API and UI"""
+    """
+    Web UI for Network Monitor - configuration API and UI. The core runs in
+    the daemon, so every handler calls it over RPC and returns the Deferred
+    of its JSON answer.
+    """
     
     def enable(self):
         """Enable Web UI"""
         log.info("Network Monitor Web UI enabled")
+        # ((version, last success), JSON) of the last full state, so polling doesn't re-serialise it
+        self._state_json = (None, None)
+        # ((version, snapshot timestamp), JSON) of the last adapter list, shared by every session
+        self._adapters_json = (None, None)
     
     def disable(self):
         """Disable Web UI"""
         log.info("Network Monitor Web UI disabled")
     
+    def _on_rpc_error(self, failure, action):
+        log.error(f"Error {action}: {failure.getErrorMessage()}")
+        return json.dumps({"error": failure.getErrorMessage()})
+    
     @requires_auth
     def get_config(self):
         """Get current configuration"""
-        try:
-            config = self.core.get_config()
-            return json.dumps(config)
-        except Exception as e:
-            log.error(f"Error getting config: {e}")
-            return json.dumps({"error": str(e)})
+        d = client.deluge_windows_network_monitor.get_config()
+        d.addCallback(json.dumps)
+        d.addErrback(self._on_rpc_error, "getting config")
+        return d
+    
+    @requires_auth
+    def get_state(self, since_version=None):
+        """
+        Get config, adapters and monitor health. Pass the version from the
+        previous response to get just {"version": ...} back when nothing changed.
+        """
+        if since_version is not None:
+            try:
+                since_version = int(since_version)
+            except ValueError:
+                return json.dumps({"error": f"Invalid since_version {since_version!r}"})
+        d = client.deluge_windows_network_monitor.get_state(since_version)
+        d.addCallback(self._on_state)
+        d.addErrback(self._on_rpc_error, "getting state")
+        return d
+    
+    def _on_state(self, state):
+        if "config" not in state:
+            return json.dumps(state)
+        # Every check moves last_success (and with it egress) without a new version
+        key = (state["version"], state["health"]["last_success"])
+        cached_key, text = self._state_json
+        if cached_key != key:
+            text = json.dumps(state)
+            self._state_json = (key, text)
+        return text
     
     @requires_auth
-    def set_config(self, check_interval=None, required_adapters=None):
+    def list_adapters(self):
+        """Get the adapters from the monitor's latest snapshot, for picking required adapters"""
+        d = client.deluge_windows_network_monitor.list_adapters()
+        d.addCallback(self._on_adapters)
+        d.addErrback(self._on_rpc_error, "listing adapters")
+        return d
+    
+    def _on_adapters(self, adapters):
+        key = (adapters["version"], adapters["timestamp"])
+        cached_key, text = self._adapters_json
+        if cached_key != key:
+            text = json.dumps(adapters)
+            self._adapters_json = (key, text)
+        return text
+    
+    @requires_auth
+    def set_config(self, check_interval=None, required_adapters=None, adapter_policy=None):
         """Update configuration"""
         try:
             config = {}
             if check_interval is not None:
-                config["check_interval"] = int(check_interval)
+                config["check_interval"] = float(check_interval)
             if required_adapters is not None:
                 # Handle both list and comma-separated string
                 if isinstance(required_adapters, str):
                     config["required_adapters"] = [
-                        adapter.strip() 
+                        adapter.strip()
                         for adapter in required_adapters.replace(",", ";").split(";")
                         if adapter.strip()
                     ]
                 else:
                     config["required_adapters"] = required_adapters
-            
-            if config:
-                self.core.update_config(**config)
-                return json.dumps({"success": True, "config": self.core.get_config()})
-            else:
-                return json.dumps({"error": "No configuration provided"})
+            if adapter_policy is not None:
+                config["adapter_policy"] = adapter_policy.strip()
         except Exception as e:
             log.error(f"Error setting config: {e}")
             return json.dumps({"error": str(e)})
+        if not config:
+            return json.dumps({"error": "No configuration provided"})
+        
+        d = client.deluge_windows_network_monitor.update_config(**config)
+        d.addCallback(lambda _: client.deluge_windows_network_monitor.get_config())
+        d.addCallback(lambda config: json.dumps({"success": True, "config": config}))
+        d.addErrback(self._on_rpc_error, "setting config")
+        return d
+    
+    @requires_auth
+    def get_metrics(self):
+        """Get the monitor's metrics"""
+        d = client.deluge_windows_network_monitor.get_metrics()
+        d.addCallback(json.dumps)
+        d.addErrback(self._on_rpc_error, "getting metrics")
+        return d
+    
+    def metrics(self):
+        """Get the monitor's metrics in the Prometheus text format, for scraping
+        
+        Served without a web session so a Prometheus scraper can reach it. It is
+        read-only and carries only counters and adapter counts.
+        """
+        d = client.deluge_windows_network_monitor.get_metrics_text()
+        d.addErrback(self._on_metrics_error)
+        return d
+    
+    def _on_metrics_error(self, failure):
+        log.error(f"Error getting metrics: {failure.getErrorMessage()}")
+        return f"# error: {failure.getErrorMessage()}\n"
@@ -0,0 +1,151 @@
+"""
+Isolated probe worker for Network Monitor
+
+WMI calls can hang for tens of seconds when the WMI service is wedged,
+which is exactly when the kill-switch matters most. Backend queries are
+therefore run in a separate process with a deadline per call; a worker that
+misses its deadline is killed and a fresh one is started for the next call.
+"""
+
+import logging
+import multiprocessing
+import sys
+import threading
+
+log = logging.getLogger(__name__)
+
+# Never fork the daemon: a forked Twisted reactor and COM apartment are unusable
+_context = multiprocessing.get_context("spawn")
+
+# Seconds a new worker gets to import and initialise its backend
+STARTUP_TIMEOUT = 30.0
+
+
+class ProbeTimeout(Exception):
+    """The worker didn't answer before the deadline and was killed"""
+
+
+class ProbeError(Exception):
+    """The backend raised an exception inside the worker"""
+
+
+def isolation_supported():
+    """
+    Whether probes can run in a worker process. A frozen deluged.exe can't
+    spawn Python workers, so it has to query in-process.
+    """
+    return not getattr(sys, "frozen", False)
+
+
+def _worker_main(conn, backend_name):
+    """Entry point of the worker process: answer (method, args) requests"""
+    from .backends import get_backend
+
+    backend = get_backend(backend_name)
+    if backend is None:
+        conn.send((False, f"adapter backend '{backend_name}' is not available"))
+        return
+    conn.send((True, None))
+
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            return
+        if request is None:
+            return
+
+        method, args = request
+        try:
+            conn.send((True, getattr(backend, method)(*args)))
+        except Exception as e:
+            conn.send((False, f"{type(e).__name__}: {e}"))
+
+
+class ProbeWorker(object):
+    """
+    Runs backend queries in a supervised worker process.
+    Offers the same snapshot() / addresses() calls as an AdapterBackend.
+    """
+
+    def __init__(self, backend_name, timeout=10.0):
+        self.backend_name = backend_name
+        self.timeout = timeout
+        self.restarts = 0
+        self._lock = threading.Lock()
+        self._process = None
+        self._conn = None
+
+    @property
+    def name(self):
+        return self.backend_name
+
+    def snapshot(self, counters=False):
+        return self.call("snapshot", counters)
+
+    def addresses(self):
+        return self.call("addresses")
+
+    def call(self, method, *args):
+        """
+        Call method(*args) on the worker's backend and return the result.
+        Raises ProbeTimeout if it takes longer than self.timeout seconds, and
+        ProbeError if the backend raised or the worker died.
+        """
+        with self._lock:
+            if self._process is None or not self._process.is_alive():
+                self._spawn()
+
+            try:
+                self._conn.send((method, args))
+                if not self._conn.poll(self.timeout):
+                    log.warning(f"Probe worker did not answer {method}() within {self.timeout}s, restarting it")
+                    self.restarts += 1
+                    self._kill()
+                    raise ProbeTimeout(f"{self.backend_name} {method}() timed out after {self.timeout}s")
+                ok, result = self._conn.recv()
+            except (EOFError, OSError):
+                # The worker died mid-call; the next call starts a fresh one
+                process = self._process
+                self.restarts += 1
+                self._kill()
+                exitcode = process.exitcode if process is not None else None
+                raise ProbeError(f"{self.backend_name} probe worker exited during {method}() (exit code {exitcode})")
+
+        if not ok:
+            raise ProbeError(result)
+        return result
+
+    def stop(self):
+        """Shut the worker down without waiting on it"""
+        self._kill()
+
+    def _spawn(self):
+        parent_conn, child_conn = _context.Pipe()
+        process = _context.Process(
+            target=_worker_main,
+            args=(child_conn, self.backend_name),
+            name="NetworkMonitorProbe",
+            daemon=True
+        )
+        process.start()
+        child_conn.close()
+        self._process, self._conn = process, parent_conn
+
+        if not parent_conn.poll(STARTUP_TIMEOUT):
+            self._kill()
+            raise ProbeTimeout(f"{self.backend_name} probe worker did not start within {STARTUP_TIMEOUT}s")
+        ok, error = parent_conn.recv()
+        if not ok:
+            self._kill()
+            raise ProbeError(error)
+        log.info(f"Started {self.backend_name} probe worker (pid {process.pid})")
+
+    def _kill(self):
+        process, conn = self._process, self._conn
+        self._process = self._conn = None
+        if conn is not None:
+            conn.close()
+        if process is not None and process.is_alive():
+            process.terminate()
+            process.join(timeout=0.1)
@@ -20,7 +20,7 @@ setup(
     },
     install_requires=[
         'deluge',
-        'pywin32',  # Required for WMI access on Windows
+        'pywin32; sys_platform == "win32"',  # Required for WMI access on Windows
     ],
     python_requires='>=3.6',
     classifiers=[
@@ -30,6 +30,7 @@ setup(
         'License :: OSI Approved :: GNU General Public License v3 (GPLv3)',
         'Natural Language :: English',
         'Operating System :: Microsoft :: Windows',
+        'Operating System :: POSIX :: Linux',
         'Programming Language :: Python :: 3',
         'Topic :: Internet :: WWW/HTTP',
         'Topic :: System :: Networking',
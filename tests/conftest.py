@@ -0,0 +1,169 @@
+"""Shared fixtures: a stand-in Deluge daemon speaking DelugeRPC over TLS"""
+
+import shutil
+import socket
+import ssl
+import struct
+import subprocess
+import threading
+import zlib
+
+import pytest
+
+from delugenm.rpc import PROTOCOL_VERSION, RPC_ERROR, RPC_EVENT, RPC_RESPONSE, _rencode
+
+_HEADER = struct.Struct("!BI")
+
+USERNAME = "localclient"
+PASSWORD = "secret"
+
+
+@pytest.fixture(scope="session")
+def certificate(tmp_path_factory):
+    """(certificate, key) paths of a throwaway self-signed certificate, as a daemon makes for itself"""
+    openssl = shutil.which("openssl")
+    if openssl is None:
+        pytest.skip("openssl is needed to make a certificate for the stand-in daemon")
+    directory = tmp_path_factory.mktemp("ssl")
+    cert, key = str(directory / "daemon.cert"), str(directory / "daemon.pkey")
+    subprocess.run(
+        [openssl, "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=localhost", "-keyout", key, "-out", cert],
+        check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    return cert, key
+
+
+class StandInDaemon(object):
+    """
+    A Deluge daemon reduced to its RPC layer: checks the login, keeps a
+    paused flag and records every call. Before each answer it sends an event
+    and a reply to a request that was never made, both of which a client
+    must skip.
+    """
+
+    def __init__(self, certificate, interfaces=None):
+        self.rencode = _rencode()
+        self.paused = False
+        self.calls = []
+        self.logins = 0
+        self.interfaces = dict(interfaces or {})
+        self._context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        self._context.load_cert_chain(*certificate)
+        self._connections = []
+        self._server = socket.socket()
+        self._server.bind(("127.0.0.1", 0))
+        self._server.listen(8)
+        self.port = self._server.getsockname()[1]
+        threading.Thread(target=self._accept, daemon=True).start()
+
+    def drop_connections(self):
+        """Close every open connection, as a daemon restart would"""
+        for connection in self._connections:
+            try:
+                connection.shutdown(socket.SHUT_RDWR)
+                connection.close()
+            except OSError:
+                pass
+        self._connections = []
+
+    def close(self):
+        # Shut down first: closing alone leaves the blocked accept() listening
+        try:
+            self._server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._server.close()
+        self.drop_connections()
+
+    def _accept(self):
+        while True:
+            try:
+                connection, _ = self._server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._serve, args=(connection,), daemon=True).start()
+
+    def _serve(self, connection):
+        try:
+            connection = self._context.wrap_socket(connection, server_side=True)
+        except OSError:
+            return
+        self._connections.append(connection)
+        logged_in = False
+        try:
+            while True:
+                version, length = _HEADER.unpack(self._read(connection, _HEADER.size))
+                assert version == PROTOCOL_VERSION
+                requests = self.rencode.loads(zlib.decompress(self._read(connection, length)), decode_utf8=True)
+                for request_id, method, args, kwargs in requests:
+                    self.calls.append(method)
+                    self._send(connection, (RPC_EVENT, "TorrentAddedEvent", ["abc", False]))
+                    self._send(connection, (RPC_RESPONSE, request_id + 1000, "not yours"))
+                    if method == "daemon.login":
+                        logged_in = tuple(args) == (USERNAME, PASSWORD) and "client_version" in kwargs
+                        if logged_in:
+                            self.logins += 1
+                            self._send(connection, (RPC_RESPONSE, request_id, 10))
+                        else:
+                            self._error(connection, request_id, "BadLoginError", "Password does not match")
+                    elif not logged_in:
+                        self._error(connection, request_id, "NotAuthorizedError", "Not authenticated")
+                    elif method == "daemon.shutdown":
+                        self._send(connection, (RPC_RESPONSE, request_id, None))
+                        self.close()
+                        return
+                    else:
+                        self._answer(connection, request_id, method, args)
+        except (ConnectionError, OSError, struct.error):
+            pass
+
+    def _answer(self, connection, request_id, method, args):
+        if method == "core.is_session_paused":
+            result = self.paused
+        elif method == "core.pause_session":
+            self.paused, result = True, None
+        elif method == "core.resume_session":
+            self.paused, result = False, None
+        elif method == "core.get_config_values":
+            result = {key: self.interfaces.get(key, "") for key in args[0]}
+        else:
+            self._error(connection, request_id, "WrappedException", f"Unknown method {method}")
+            return
+        self._send(connection, (RPC_RESPONSE, request_id, result))
+
+    def _error(self, connection, request_id, exception_type, message):
+        self._send(connection, (RPC_ERROR, request_id, exception_type, message, {}, "Traceback"))
+
+    def _send(self, connection, message):
+        body = zlib.compress(self.rencode.dumps(message))
+        connection.sendall(_HEADER.pack(PROTOCOL_VERSION, len(body)) + body)
+
+    @staticmethod
+    def _read(connection, size):
+        data = b""
+        while len(data) < size:
+            chunk = connection.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("closed")
+            data += chunk
+        return data
+
+
+@pytest.fixture
+def deluge_daemon(certificate):
+    """Make stand-in daemons, closed at the end of the test"""
+    try:
+        _rencode()
+    except ImportError:
+        pytest.skip("rencode is needed to speak DelugeRPC")
+    daemons = []
+
+    def make(**kwargs):
+        daemon = StandInDaemon(certificate, **kwargs)
+        daemons.append(daemon)
+        return daemon
+
+    yield make
+    for daemon in daemons:
+        daemon.close()
@@ -0,0 +1,103 @@
+"""IP address and name to adapter index"""
+
+import pytest
+
+from delugenm.addrindex import AddressIndex
+from delugenm.backends import Adapter, AdapterSnapshot
+from delugenm.common import STATUS_CONNECTED
+
+
+@pytest.fixture
+def index():
+    index = AddressIndex()
+    index.rebuild(
+        {
+            "{ETH}": [("192.168.1.10", 24), ("fe80::1", 64), ("2001:db8::10", 64)],
+            "{WG}": [("10.8.0.2", 32), ("fd00:8::2", 128)],
+        },
+        AdapterSnapshot([
+            Adapter("eth0", "{ETH}", 1, "Ethernet", STATUS_CONNECTED),
+            Adapter("wg0", "{WG}", 2, "wg-b", STATUS_CONNECTED),
+        ]),
+    )
+    return index
+
+
+@pytest.mark.parametrize("interface, guid", [
+    ("192.168.1.10", "{ETH}"),
+    (" 10.8.0.2 ", "{WG}"),
+    ("2001:db8::10", "{ETH}"),
+    ("[2001:db8::10]", "{ETH}"),
+    ("fe80::1%eth0", "{ETH}"),
+    ("[fe80::1%12]", "{ETH}"),
+    ("fd00:8::2", "{WG}"),
+    # Not assigned, but inside an adapter's subnet
+    ("192.168.1.99", "{ETH}"),
+    ("2001:db8::99", "{ETH}"),
+    ("172.16.0.1", None),
+    ("", None),
+])
+def test_resolve_addresses(index, interface, guid):
+    assert index.resolve(interface) == guid
+
+
+@pytest.mark.parametrize("interface, guid", [
+    ("eth0", "{ETH}"),
+    ("Ethernet", "{ETH}"),
+    ("wg-b", "{WG}"),
+    ("{WG}", "{WG}"),
+    ("tun0", None),
+])
+def test_resolve_names(index, interface, guid):
+    assert index.resolve(interface) == guid
+
+
+def test_names_follow_renames(index):
+    index.update_names(AdapterSnapshot([Adapter("eth0", "{ETH}", 1, "LAN", STATUS_CONNECTED)]))
+    assert index.resolve("LAN") == "{ETH}"
+    assert index.resolve("Ethernet") is None
+    assert index.resolve("wg-b") is None
+
+
+def test_longest_prefix_wins(index):
+    index.add("{WG}", "192.168.1.200", 28)
+    assert index.resolve("192.168.1.195") == "{WG}"
+    assert index.resolve("192.168.1.20") == "{ETH}"
+
+
+def test_events_keep_the_index_current(index):
+    index.add("{WG}", "10.8.0.3", 32)
+    assert index.resolve("10.8.0.3") == "{WG}"
+    index.remove("{WG}", "10.8.0.3")
+    assert index.resolve("10.8.0.3") is None
+    assert "10.8.0.3" not in index.addresses_for("{WG}")
+
+    index.replace("{ETH}", [("192.168.2.10", 24)])
+    assert index.addresses_for("{ETH}") == ["192.168.2.10"]
+    assert index.resolve("192.168.1.10") is None
+    assert index.resolve("2001:db8::10") is None
+
+
+def test_address_hash(index):
+    before = index.address_hash("{WG}")
+    assert before != 0
+    assert index.address_hash("{NONE}") == 0
+    index.add("{WG}", "10.8.0.3", 32)
+    assert index.address_hash("{WG}") != before
+    index.remove("{WG}", "10.8.0.3")
+    assert index.address_hash("{WG}") == before
+
+
+def test_moved_address(index):
+    # Still assigned: nothing moved
+    assert index.moved_address("10.8.0.2", "{WG}") is None
+    index.replace("{WG}", [("10.8.0.7", 32), ("fd00:8::7", 128)])
+    assert index.moved_address("10.8.0.2", "{WG}") == "10.8.0.7"
+    assert index.moved_address("[fd00:8::2]", "{WG}") == "fd00:8::7"
+    # Global addresses are preferred over link-local ones
+    index.replace("{ETH}", [("fe80::2", 64), ("2001:db8::20", 64)])
+    assert index.moved_address("2001:db8::10", "{ETH}") == "2001:db8::20"
+    # Nothing of the same IP version left, or not an address at all
+    index.replace("{WG}", [("fd00:8::7", 128)])
+    assert index.moved_address("10.8.0.2", "{WG}") is None
+    assert index.moved_address("wg-b", "{WG}") is None
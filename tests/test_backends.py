@@ -0,0 +1,141 @@
+"""Backend selection and the fake backend"""
+
+import pytest
+
+from delugenm.backends import get_backend
+from delugenm.backends.fake import FakeBackend
+from delugenm.common import STATUS_CONNECTED, STATUS_MEDIA_DISCONNECTED
+
+
+@pytest.mark.parametrize("spec", ["linux:x", "wmi:x", "fake:x", "fake:1", "replay:", "nonsense"])
+def test_bad_specs_are_reported_not_raised(spec):
+    assert get_backend(spec) is None
+
+
+@pytest.mark.parametrize("spec, events", [("fake", True), ("fake:events", True), ("fake:poll", False)])
+def test_fake_backend_argument(spec, events):
+    backend = get_backend(spec)
+    assert isinstance(backend, FakeBackend)
+    assert backend.supports_events is events
+
+
+def test_fake_backend_snapshot_and_events():
+    backend = FakeBackend()
+    events = []
+    assert backend.watch(events.append)
+    backend.set_adapter("eth0", STATUS_CONNECTED, guid="{ETH0}")
+    snapshot = backend.snapshot()
+    assert [adapter.name for adapter in snapshot.adapters] == ["eth0"]
+    assert snapshot.by_guid["{ETH0}"].status == STATUS_CONNECTED
+
+    backend.set_adapter("eth0", STATUS_MEDIA_DISCONNECTED, guid="{ETH0}")
+    assert events[-1].adapter == "{ETH0}"
+    assert backend.snapshot().by_guid["{ETH0}"].status == STATUS_MEDIA_DISCONNECTED
+
+
+def test_snapshot_normalises_a_missing_status(tmp_path):
+    from delugenm.backends import Adapter, AdapterSnapshot
+    from delugenm.common import STATUS_UNKNOWN
+    from delugenm.history import HistoryStore
+    from delugenm.status import StatusReader, StatusWriter
+    from delugenm.trace import TraceWriter, read_trace
+
+    snapshot = AdapterSnapshot([Adapter("wmi0", "{WMI0}", 1, "Ethernet", None)], timestamp=100.0)
+    assert snapshot.adapters[0].status == STATUS_UNKNOWN
+    assert not snapshot.active_keys
+
+    # Every consumer that packs statuses takes it
+    writer = StatusWriter(str(tmp_path / "status"))
+    writer.publish(100.0, True, False, False, False,
+                   [(adapter.name, adapter.guid, adapter.connection_id, adapter.index, adapter.status, True)
+                    for adapter in snapshot])
+    assert StatusReader(str(tmp_path / "status")).read().adapters[0].status == STATUS_UNKNOWN
+
+    trace = TraceWriter(str(tmp_path / "trace"))
+    trace.write_snapshot(snapshot)
+    trace.close()
+    records = [record for record in read_trace(str(tmp_path / "trace")) if record.value is not None]
+    assert records[0].value.adapters[0].status == STATUS_UNKNOWN
+
+    history = HistoryStore(16)
+    history.record(100.0, {"{WMI0}": (snapshot.adapters[0].status, 0)})
+    assert history.query("{WMI0}")["transitions"] == [[100.0, STATUS_UNKNOWN, 0]]
+
+
+@pytest.mark.skipif(not __import__("sys").platform.startswith("linux"), reason="rtnetlink is Linux only")
+def test_linux_watcher_reports_a_dead_feed():
+    import errno
+    import threading
+
+    from delugenm.backends import EVENT_LOST
+    from delugenm.backends.linux import LinuxBackend
+
+    if not LinuxBackend.available():
+        pytest.skip("no /sys/class/net")
+
+    def fail(sock, watching):
+        raise OSError(errno.EBADF, "Bad file descriptor")
+
+    backend = LinuxBackend()
+    backend._read_events = fail
+    lost = threading.Event()
+    events = []
+    try:
+        started = backend.watch(lambda event: (events.append(event), lost.set()))
+    except OSError:
+        pytest.skip("rtnetlink sockets are not permitted here")
+    if not started:
+        pytest.skip("rtnetlink sockets are not permitted here")
+    assert lost.wait(5)
+    assert [event.kind for event in events] == [EVENT_LOST]
+    backend.unwatch()
+
+
+@pytest.mark.skipif(not __import__("sys").platform.startswith("linux"), reason="rtnetlink is Linux only")
+def test_linux_watcher_survives_an_unwatch_before_it_runs(monkeypatch):
+    import threading
+    import types
+
+    from delugenm.backends import linux
+
+    if not linux.LinuxBackend.available():
+        pytest.skip("no /sys/class/net")
+
+    class HeldThread(threading.Thread):
+        """A thread that only starts when the test says so"""
+
+        def start(self):
+            pass
+
+        def release(self):
+            threading.Thread.start(self)
+
+    monkeypatch.setattr(linux, "threading", types.SimpleNamespace(Event=threading.Event, Thread=HeldThread))
+    backend = linux.LinuxBackend()
+    events = []
+    try:
+        started = backend.watch(events.append)
+    except OSError:
+        pytest.skip("rtnetlink sockets are not permitted here")
+    if not started:
+        pytest.skip("rtnetlink sockets are not permitted here")
+    thread = backend._watch_thread
+    backend.unwatch()
+
+    errors = []
+    monkeypatch.setattr(threading, "excepthook", errors.append)
+    thread.release()
+    thread.join(5)
+    assert not thread.is_alive()
+    assert errors == []
+    assert events == []
+
+
+def test_fake_backend_can_lose_its_feed():
+    from delugenm.backends import EVENT_LOST
+
+    backend = FakeBackend()
+    events = []
+    backend.watch(events.append)
+    backend.lose_watch()
+    assert events[-1].kind == EVENT_LOST and events[-1].adapter is None
@@ -0,0 +1,155 @@
+"""The core plugin driven by the fake backend's change feed, on a simulated reactor"""
+
+import time
+import types
+
+import pytest
+
+pytest.importorskip("twisted")
+pytest.importorskip("deluge")
+
+from deluge import component, configmanager  # noqa: E402
+from twisted.internet import defer, task  # noqa: E402
+
+from delugenm import core  # noqa: E402
+from delugenm.backends.fake import FakeBackend  # noqa: E402
+from delugenm.common import STATUS_CONNECTED, STATUS_MEDIA_DISCONNECTED  # noqa: E402
+from delugenm.settings import CONFIG_FILE  # noqa: E402
+
+
+class _Session(component.Component):
+    """The bits of Deluge's core the plugin calls"""
+
+    def __init__(self):
+        super().__init__("Core")
+        self.paused = False
+
+    def is_session_paused(self):
+        return self.paused
+
+    def pause_session(self):
+        self.paused = True
+
+    def resume_session(self):
+        self.paused = False
+
+    def get_session_status(self, keys):
+        return {"num_peers": 0}
+
+
+class _Reactor(task.Clock):
+    """A clock that runs calls from other threads at once; here they all come from this one"""
+
+    def callFromThread(self, function, *args, **kwargs):
+        function(*args, **kwargs)
+
+
+def _now(function, *args, **kwargs):
+    return defer.maybeDeferred(function, *args, **kwargs)
+
+
+@pytest.fixture
+def plugin(tmp_path, monkeypatch):
+    """(Core, FakeBackend, clock): the plugin enabled with wg0 required, before its first check"""
+    configmanager.set_config_dir(str(tmp_path))
+    config = configmanager.ConfigManager(CONFIG_FILE)
+    config["backend"] = "fake"
+    config["required_adapters"] = ["wg0"]
+    config["hold_until_first_check"] = False
+    config["check_jitter"] = 0.0
+    config.save()
+    configmanager.close(CONFIG_FILE)
+
+    backend = FakeBackend()
+    backend.set_adapter("wg0", STATUS_CONNECTED, notify=False)
+    clock = _Reactor()
+    monkeypatch.setattr(core, "reactor", clock)
+    # Backend queries run inline, so each check completes when the clock fires it
+    monkeypatch.setattr(core, "threads", types.SimpleNamespace(
+        deferToThread=_now, deferToThreadPool=lambda reactor, pool, *args, **kwargs: _now(*args, **kwargs)))
+    monkeypatch.setattr(core, "get_backend", lambda spec: backend)
+    session = _Session()
+
+    plugin = core.Core.__new__(core.Core)
+    plugin.enable()
+    yield plugin, backend, clock
+    plugin.disable()
+    component.deregister(session)
+    configmanager.close(CONFIG_FILE)
+    configmanager.close("core.conf")
+
+
+def _checks(plugin):
+    return plugin._checks_total.value()
+
+
+def test_link_event_triggers_a_check(plugin):
+    plugin, backend, clock = plugin
+    assert plugin.events_active
+    assert plugin.schedule.maximum == plugin.settings.fallback_interval
+    clock.advance(0)
+    assert _checks(plugin) == 1
+    # Nothing else is due for a while
+    assert min(call.getTime() for call in clock.getDelayedCalls()) >= plugin.settings.check_interval
+
+    backend.set_adapter("wg0", STATUS_MEDIA_DISCONNECTED)
+    clock.advance(0)
+    assert _checks(plugin) == 2
+    assert clock.seconds() == 0
+    assert plugin._last_snapshot.find("wg0").status == STATUS_MEDIA_DISCONNECTED
+
+
+def test_lost_feed_falls_back_to_polling_and_resubscribes(plugin):
+    plugin, backend, clock = plugin
+    clock.advance(0)
+    assert _checks(plugin) == 1
+
+    backend.supports_events = False
+    backend.lose_watch()
+    assert not plugin.events_active
+    assert plugin.schedule.maximum == plugin.settings.max_check_interval
+    # Checked again at once, since changes may have gone unreported
+    clock.advance(0)
+    assert _checks(plugin) == 2
+
+    # The first resubscription fails and backs off
+    clock.advance(core.WATCH_RETRY_MIN)
+    assert not plugin.events_active
+    assert plugin._watch_retry_delay == core.WATCH_RETRY_MIN * 2
+
+    backend.supports_events = True
+    clock.advance(core.WATCH_RETRY_MIN * 2)
+    # Polling went on at the normal cadence meanwhile
+    assert _checks(plugin) == 3
+    assert plugin.events_active
+    assert plugin._watch_retry_delay == core.WATCH_RETRY_MIN
+    assert plugin.schedule.maximum == plugin.settings.fallback_interval
+
+    # Events trigger checks again
+    checks = _checks(plugin)
+    backend.set_adapter("wg0", STATUS_MEDIA_DISCONNECTED)
+    clock.advance(0)
+    assert _checks(plugin) == checks + 1
+
+
+def test_state_reports_the_latest_check(plugin, monkeypatch):
+    plugin, backend, clock = plugin
+    wall = [1000.0]
+    monkeypatch.setattr(core, "time", types.SimpleNamespace(time=lambda: wall[0], monotonic=time.monotonic))
+    clock.advance(0)
+    state = plugin.get_state()
+    assert state["health"]["last_success"] == 1000.0
+    assert [adapter["name"] for adapter in state["adapters"]] == ["wg0"]
+
+    # A check that changes nothing keeps the version, but not the time of the last success
+    wall[0] = 1005.0
+    plugin._schedule_check(0)
+    clock.advance(0)
+    assert plugin.get_state(state["version"]) == {"version": state["version"], "last_success": 1005.0}
+    assert plugin.get_state()["health"]["last_success"] == 1005.0
+
+    backend.set_adapter("wg0", STATUS_MEDIA_DISCONNECTED)
+    clock.advance(0)
+    changed = plugin.get_state(state["version"])
+    assert changed["version"] > state["version"]
+    assert changed["adapters"][0]["status"] == STATUS_MEDIA_DISCONNECTED
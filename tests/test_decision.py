@@ -0,0 +1,140 @@
+"""Trip decisions from adapter snapshots"""
+
+from delugenm.backends import Adapter, AdapterSnapshot
+from delugenm.common import (
+    STATUS_CONNECTED,
+    STATUS_CONNECTING,
+    STATUS_DISCONNECTED,
+    STATUS_HARDWARE_NOT_PRESENT,
+    STATUS_MEDIA_DISCONNECTED,
+)
+from delugenm.decision import EGRESS_KEY, Decider
+from delugenm.settings import Settings
+
+
+def _settings(**values):
+    return Settings.build(dict({"trip_samples": 3, "trip_window": 5, "min_down_duration": 2.0}, **values))
+
+
+def _snapshot(**statuses):
+    """A snapshot of adapters named after the keywords, each with its status"""
+    return AdapterSnapshot(Adapter(name, "{" + name.upper() + "}", index, name, status)
+                           for index, (name, status) in enumerate(statuses.items()))
+
+
+def _run(decider, samples, start=0.0, step=1.0):
+    """Check each snapshot a step apart; return the results"""
+    return [decider.check(snapshot, start + number * step) for number, snapshot in enumerate(samples)]
+
+
+def test_any_active_adapter_keeps_traffic_going():
+    decider = Decider(_settings())
+    assert not decider.specific
+    assert decider.check(_snapshot(eth=STATUS_CONNECTED, wlan=STATUS_DISCONNECTED), 0.0)
+    assert decider.healthy
+    assert decider.degraded is False
+
+
+def test_required_adapter_trips_once_confirmed_down():
+    decider = Decider(_settings(required_adapters=["wg"]))
+    assert decider.required == {"wg"}
+    assert decider.check(_snapshot(wg=STATUS_CONNECTED, eth=STATUS_CONNECTED), 0.0)
+    down = _snapshot(wg=STATUS_DISCONNECTED, eth=STATUS_CONNECTED)
+    # Suspect for the first samples, down after three failures spanning two seconds
+    assert _run(decider, [down] * 4, start=1.0) == [True, True, False, False]
+    # Confirmed down is no longer worth checking fast
+    assert decider.degraded is False
+
+
+def test_a_blip_is_only_suspect():
+    decider = Decider(_settings(required_adapters=["wg"]))
+    samples = [_snapshot(wg=STATUS_CONNECTED), _snapshot(wg=STATUS_MEDIA_DISCONNECTED), _snapshot(wg=STATUS_CONNECTED)]
+    assert _run(decider, samples) == [True, True, True]
+    # One failure is still in the window, so it isn't confirmed up again yet
+    assert decider.degraded
+    assert not decider.healthy
+
+
+def test_hardware_gone_trips_at_once():
+    decider = Decider(_settings(required_adapters=["wg"]))
+    assert not decider.check(_snapshot(wg=STATUS_HARDWARE_NOT_PRESENT), 0.0)
+
+
+def test_missing_required_adapter_counts_as_down():
+    decider = Decider(_settings(required_adapters=["wg"]))
+    assert _run(decider, [_snapshot(eth=STATUS_CONNECTED)] * 3) == [True, True, False]
+
+
+def test_degraded_adapter_speeds_checks_up():
+    decider = Decider(_settings(required_adapters=["wg"]))
+    assert decider.check(_snapshot(wg=STATUS_CONNECTING), 0.0)
+    assert decider.degraded
+
+
+def test_policy():
+    decider = Decider(_settings(adapter_policy="wg AND NOT eth"))
+    assert decider.specific
+    assert decider.is_required(Adapter("eth", "{ETH}", 0, "eth", STATUS_CONNECTED))
+    # Unknown until Ethernet is confirmed down, which a missing adapter takes a few samples for
+    assert _run(decider, [_snapshot(wg=STATUS_CONNECTED)] * 3) == [True, True, True]
+    assert decider.healthy
+    # Ethernet coming back makes the policy false once its failures leave the window
+    both = _snapshot(wg=STATUS_CONNECTED, eth=STATUS_CONNECTED)
+    assert _run(decider, [both] * 5, start=3.0) == [True, True, True, True, False]
+
+
+def test_interfaces_are_required_alongside_the_policy():
+    decider = Decider(_settings(adapter_policy="wg OR eth"))
+    decider.set_interfaces(["{WG}", None])
+    assert decider.interfaces == ("{WG}",)
+    assert decider.required == {"wg", "eth", "{WG}"}
+    # eth alone no longer satisfies it; the bound adapter is gone
+    assert not decider.check(_snapshot(eth=STATUS_CONNECTED, wg=STATUS_HARDWARE_NOT_PRESENT), 0.0)
+
+
+def test_egress_probe_is_part_of_the_policy():
+    decider = Decider(_settings(required_adapters=["wg"], egress_targets=["tcp:192.0.2.1:443"]))
+    assert EGRESS_KEY not in decider.required
+    up = _snapshot(wg=STATUS_CONNECTED)
+    assert decider.check(up, 0.0, egress_ok=True)
+    assert decider.healthy
+    # Connected adapters are not enough once the probes confirm traffic can't get out
+    assert [decider.check(up, 1.0 + second, egress_ok=False) for second in range(3)] == [True, True, False]
+
+
+def test_new_settings_rebuild_only_what_changed():
+    transitions = []
+    decider = Decider(_settings(required_adapters=["wg"]), on_transition=lambda *args: transitions.append(args))
+    decider.check(_snapshot(wg=STATUS_CONNECTED), 0.0)
+    detector = decider.detector
+    settings = decider.settings.updated({"check_interval": 2.0})
+    decider.set_settings(settings, settings.changed(decider.settings))
+    assert decider.detector is detector
+
+    settings = decider.settings.updated({"trip_samples": 1, "min_down_duration": 0.0})
+    decider.set_settings(settings, {"trip_samples", "min_down_duration"})
+    assert decider.detector is not detector
+    assert not decider.check(_snapshot(wg=STATUS_DISCONNECTED), 1.0)
+    assert transitions[-1][:3] == ("wg", "up", "down")
+
+
+def test_egress_alone_requires_no_particular_adapter():
+    decider = Decider(_settings(egress_targets=["tcp:192.0.2.1:443"]))
+    assert decider.policy is not None
+    assert not decider.specific
+    decider.set_interfaces(["{WG}"])
+    assert decider.specific
+
+
+def test_unknown_egress_keeps_the_last_outcome():
+    decider = Decider(_settings(required_adapters=["wg"], egress_targets=["tcp:192.0.2.1:443"]))
+    up = _snapshot(wg=STATUS_CONNECTED)
+    # Nothing probed yet: not confirmed either way
+    assert _run(decider, [up] * 3) == [True, True, True]
+    assert not decider.healthy
+    assert decider.check(up, 3.0, egress_ok=True)
+    assert decider.healthy
+    # No source address to probe from is no failure
+    assert _run(decider, [up] * 5, start=4.0) == [True] * 5
+    assert decider.healthy
+    assert decider.detector.states()[EGRESS_KEY] == "up"
@@ -0,0 +1,127 @@
+"""Egress probes against stand-in responders on the loopback interface"""
+
+import socket
+import threading
+
+import pytest
+
+from delugenm.egress import EgressTarget, parse_target, probe, usable_sources
+
+
+@pytest.fixture
+def tcp_listener():
+    """Port of a TCP listener that accepts connections"""
+    server = socket.socket()
+    server.bind(("127.0.0.1", 0))
+    server.listen(8)
+    yield server.getsockname()[1]
+    server.close()
+
+
+@pytest.fixture
+def udp_echo():
+    """Port of a UDP responder that echoes every datagram"""
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(("127.0.0.1", 0))
+
+    def echo():
+        while True:
+            try:
+                data, address = server.recvfrom(512)
+                server.sendto(data, address)
+            except OSError:
+                return
+
+    threading.Thread(target=echo, daemon=True).start()
+    yield server.getsockname()[1]
+    server.close()
+
+
+@pytest.fixture
+def udp_silent():
+    """Port of a UDP socket that takes datagrams and never answers"""
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(("127.0.0.1", 0))
+    yield server.getsockname()[1]
+    server.close()
+
+
+@pytest.fixture
+def refused_port():
+    """A TCP port nothing listens on"""
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+
+def test_tcp_connection(tcp_listener):
+    result = probe([EgressTarget("tcp", "127.0.0.1", tcp_listener)], ["127.0.0.1"], 2.0)
+    assert result.ok
+    assert result.target.port == tcp_listener
+    assert result.source == "127.0.0.1"
+
+
+def test_udp_reply(udp_echo):
+    result = probe([EgressTarget("udp", "127.0.0.1", udp_echo)], ["127.0.0.1"], 2.0)
+    assert result.ok
+    assert result.errors == []
+
+
+def test_silent_udp_target_hits_the_deadline(udp_silent):
+    result = probe([EgressTarget("udp", "127.0.0.1", udp_silent)], [None], 0.3)
+    assert not result.ok
+    assert 0.3 <= result.elapsed < 2.0
+    assert result.errors == ["1 probes got no answer within 0.3s"]
+
+
+def test_refused_tcp_port(refused_port):
+    result = probe([EgressTarget("tcp", "127.0.0.1", refused_port)], [None], 2.0)
+    assert not result.ok
+    # Refused at once, well before the deadline
+    assert result.elapsed < 1.0
+    assert len(result.errors) == 1
+    assert result.errors[0].startswith(f"tcp:127.0.0.1:{refused_port} from any: ")
+
+
+def test_first_success_ends_the_round(tcp_listener, udp_silent, refused_port):
+    targets = [
+        EgressTarget("udp", "127.0.0.1", udp_silent),
+        EgressTarget("tcp", "127.0.0.1", refused_port),
+        EgressTarget("tcp", "127.0.0.1", tcp_listener),
+    ]
+    result = probe(targets, [None], 5.0)
+    assert result.ok
+    assert result.target.port == tcp_listener
+    # The silent target is abandoned, not waited for
+    assert result.elapsed < 2.0
+
+
+def test_targets_of_the_other_ip_version_are_skipped(tcp_listener):
+    result = probe([EgressTarget("tcp", "::1", tcp_listener)], ["127.0.0.1"], 0.5)
+    assert not result.ok
+    assert result.errors == ["nothing to probe"]
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("tcp:9.9.9.9:443", EgressTarget("tcp", "9.9.9.9", 443)),
+    ("UDP:1.1.1.1", EgressTarget("udp", "1.1.1.1", 53)),
+    ("tcp:[2606:4700::1111]:853", EgressTarget("tcp", "2606:4700::1111", 853)),
+    ("udp:2606:4700::1111", EgressTarget("udp", "2606:4700::1111", 53)),
+    ("tcp:example.com", EgressTarget("tcp", "example.com", 443)),
+])
+def test_parse_target(text, expected):
+    assert parse_target(text) == expected
+
+
+@pytest.mark.parametrize("text", ["icmp:1.1.1.1", "tcp:", "tcp:host:0", "tcp:host:x", "tcp:[::1]x", "1.1.1.1"])
+def test_invalid_targets(text):
+    with pytest.raises(ValueError):
+        parse_target(text)
+
+
+def test_usable_sources():
+    assert usable_sources(["10.0.0.2", "fe80::1", "169.254.1.1", "2001:db8::2", "bogus"]) == [
+        "10.0.0.2", "2001:db8::2",
+    ]
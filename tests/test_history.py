@@ -0,0 +1,91 @@
+"""Bounded per-adapter state history"""
+
+from delugenm import history
+from delugenm.common import STATUS_CONNECTED, STATUS_DISCONNECTED
+from delugenm.history import STATUS_MISSING, HistoryStore, RingBuffer
+
+
+def test_ring_buffer_wraps_around():
+    ring = RingBuffer(4)
+    assert ring.first() is None and ring.last() is None
+    for second in range(10):
+        ring.append(float(second), second % 3, second)
+    assert len(ring) == 4
+    assert ring.first() == (6.0, 0, 6)
+    assert ring.last() == (9.0, 0, 9)
+    # Oldest first across the wrap, within the bounds given
+    assert [entry[0] for entry in ring.range(0.0, 100.0)] == [6.0, 7.0, 8.0, 9.0]
+    assert [entry[0] for entry in ring.range(7.0, 8.5)] == [7.0, 8.0]
+    assert list(ring.range(10.0, 20.0)) == []
+
+
+def test_transitions_outlive_samples():
+    store = HistoryStore(capacity=4)
+    statuses = [STATUS_CONNECTED] * 3 + [STATUS_DISCONNECTED] + [STATUS_CONNECTED] * 6
+    for second, status in enumerate(statuses):
+        store.record(float(second), {"eth": (status, 7)})
+    result = store.query("eth")
+    # Only the last 4 samples are left, but every change is
+    assert result["start"] == 6.0
+    assert [transition[:2] for transition in store.query("eth", 0.0, 10.0)["transitions"]] == [
+        [0.0, STATUS_CONNECTED], [3.0, STATUS_DISCONNECTED], [4.0, STATUS_CONNECTED],
+    ]
+
+
+def test_address_change_is_a_transition():
+    store = HistoryStore(capacity=16)
+    store.record(0.0, {"eth": (STATUS_CONNECTED, 1)})
+    store.record(1.0, {"eth": (STATUS_CONNECTED, 1)})
+    store.record(2.0, {"eth": (STATUS_CONNECTED, 2)})
+    assert store.query("eth")["transitions"] == [[0.0, STATUS_CONNECTED, 1], [2.0, STATUS_CONNECTED, 2]]
+
+
+def test_query_buckets():
+    store = HistoryStore(capacity=64)
+    # Up for the first half, down for the second
+    for second in range(40):
+        store.record(float(second), {"eth": (STATUS_CONNECTED if second < 20 else STATUS_DISCONNECTED, 0)})
+    result = store.query("eth", 0.0, 40.0, max_points=4)
+    assert [bucket[0] for bucket in result["buckets"]] == [0.0, 10.0, 20.0, 30.0]
+    assert [bucket[1] for bucket in result["buckets"]] == [1.0, 1.0, 0.0, 0.0]
+    assert [bucket[2] for bucket in result["buckets"]] == [10, 10, 10, 10]
+    assert [bucket[3] for bucket in result["buckets"]] == [STATUS_CONNECTED, STATUS_CONNECTED,
+                                                          STATUS_DISCONNECTED, STATUS_DISCONNECTED]
+
+    # A bucket straddling the change reports the fraction up and the last status
+    result = store.query("eth", 15.0, 25.0, max_points=1)
+    assert result["buckets"] == [[15.0, 5 / 11.0, 11, STATUS_DISCONNECTED]]
+    # Empty stretches have no bucket
+    assert store.query("eth", 100.0, 200.0)["buckets"] == []
+    assert store.query("unknown") is None
+
+
+def test_transitions_are_capped_to_the_newest():
+    store = HistoryStore(capacity=64)
+    for second in range(20):
+        store.record(float(second), {"eth": (STATUS_CONNECTED if second % 2 else STATUS_DISCONNECTED, 0)})
+    transitions = store.query("eth", max_points=5)["transitions"]
+    assert [transition[0] for transition in transitions] == [15.0, 16.0, 17.0, 18.0, 19.0]
+
+
+def test_missing_adapters_get_one_entry():
+    store = HistoryStore(capacity=16)
+    store.record(0.0, {"eth": (STATUS_CONNECTED, 0), "wg": (None, 0)})
+    store.record(1.0, {"wg": (STATUS_CONNECTED, 0)})
+    store.record(2.0, {"wg": (STATUS_CONNECTED, 0)})
+    assert store.query("wg")["transitions"][0] == [0.0, STATUS_MISSING, 0]
+    result = store.query("eth")
+    assert result["transitions"] == [[0.0, STATUS_CONNECTED, 0], [1.0, STATUS_MISSING, 0]]
+    assert result["buckets"][-1][2] == 1
+
+
+def test_least_recently_seen_adapter_is_evicted(monkeypatch):
+    monkeypatch.setattr(history, "MAX_ADAPTERS", 3)
+    store = HistoryStore(capacity=8)
+    store.record(0.0, {"a": (STATUS_CONNECTED, 0), "b": (STATUS_CONNECTED, 0), "c": (STATUS_CONNECTED, 0)})
+    # b and c stay in sight; a goes missing, which doesn't count as being seen
+    store.record(1.0, {"b": (STATUS_CONNECTED, 0), "c": (STATUS_CONNECTED, 0)})
+    store.record(2.0, {"b": (STATUS_CONNECTED, 0), "c": (STATUS_CONNECTED, 0), "d": (STATUS_CONNECTED, 0)})
+    assert store.adapters() == ["b", "c", "d"]
+    store.record(3.0, {"c": (STATUS_CONNECTED, 0), "d": (STATUS_CONNECTED, 0), "e": (STATUS_CONNECTED, 0)})
+    assert store.adapters() == ["c", "d", "e"]
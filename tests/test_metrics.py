@@ -0,0 +1,109 @@
+"""Counters, gauges and histograms and their text rendering"""
+
+import threading
+
+from delugenm.metrics import Counter, Gauge, Histogram, MetricsRegistry
+
+
+def test_counter_by_labels():
+    counter = Counter("checks_total", "Checks")
+    counter.inc()
+    counter.inc(2)
+    counter.inc(state="down")
+    assert counter.value() == 3
+    assert counter.value(state="down") == 1
+    assert counter.value(state="up") == 0
+    assert counter.collect() == {"": 3, '{state="down"}': 1}
+    assert counter.render() == ["checks_total 3", 'checks_total{state="down"} 1']
+
+
+def test_counter_from_many_threads():
+    counter = Counter("checks_total", "Checks")
+
+    def count():
+        for _ in range(1000):
+            counter.inc()
+
+    threads = [threading.Thread(target=count) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counter.value() == 4000
+
+
+def test_label_values_are_escaped():
+    counter = Counter("errors_total", "Errors")
+    counter.inc(backend='a"b\\c\nd')
+    assert counter.render() == ['errors_total{backend="a\\"b\\\\c\\nd"} 1']
+
+
+def test_gauge_reads_its_function():
+    value = [None]
+    gauge = Gauge("tripped", "Tripped", lambda: value[0])
+    # No value yet: left out rather than rendered as 0
+    assert gauge.collect() == {}
+    assert gauge.render() == []
+    value[0] = 1.5
+    assert gauge.value() == 1.5
+    assert gauge.collect() == {"": 1.5}
+    assert gauge.render() == ["tripped 1.5"]
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("probe_seconds", "Probe", buckets=(0.5, 0.1, 1.0))
+    assert histogram.buckets == (0.1, 0.5, 1.0)
+    for value in (0.05, 0.1, 0.3, 0.7, 5.0):
+        histogram.observe(value, backend="fake")
+    series = histogram.collect()['{backend="fake"}']
+    # Bounds are inclusive
+    assert series["buckets"] == {"0.1": 2, "0.5": 3, "1.0": 4, "+Inf": 5}
+    assert series["count"] == 5
+    assert abs(series["sum"] - 6.15) < 1e-9
+
+
+def test_histogram_render():
+    histogram = Histogram("probe_seconds", "Probe", buckets=(0.1, 1.0))
+    histogram.observe(0.25)
+    histogram.observe(2)
+    assert histogram.render() == [
+        'probe_seconds_bucket{le="0.1"} 0',
+        'probe_seconds_bucket{le="1.0"} 1',
+        'probe_seconds_bucket{le="+Inf"} 2',
+        "probe_seconds_sum 2.25",
+        "probe_seconds_count 2",
+    ]
+    histogram = Histogram("probe_seconds", "Probe", buckets=(1.0,))
+    histogram.observe(0.5, backend="wmi")
+    assert histogram.render()[0] == 'probe_seconds_bucket{backend="wmi",le="1.0"} 1'
+
+
+def test_registry_render_prometheus():
+    registry = MetricsRegistry("nm_")
+    checks = registry.counter("checks_total", "Adapter checks run")
+    registry.gauge("tripped", "1 while tripped", lambda: 0)
+    registry.gauge("seconds_since_last_success", "Age of the last good check", lambda: None)
+    registry.histogram("probe_seconds", "Probe durations", buckets=(1.0,)).observe(0.5)
+    checks.inc()
+
+    assert registry.render_prometheus() == (
+        "# HELP nm_checks_total Adapter checks run\n"
+        "# TYPE nm_checks_total counter\n"
+        "nm_checks_total 1\n"
+        "# HELP nm_tripped 1 while tripped\n"
+        "# TYPE nm_tripped gauge\n"
+        "nm_tripped 0\n"
+        "# HELP nm_seconds_since_last_success Age of the last good check\n"
+        "# TYPE nm_seconds_since_last_success gauge\n"
+        "# HELP nm_probe_seconds Probe durations\n"
+        "# TYPE nm_probe_seconds histogram\n"
+        'nm_probe_seconds_bucket{le="1.0"} 1\n'
+        'nm_probe_seconds_bucket{le="+Inf"} 1\n'
+        "nm_probe_seconds_sum 0.5\n"
+        "nm_probe_seconds_count 1\n"
+    )
+
+    collected = registry.collect()
+    assert collected["nm_checks_total"] == {"type": "counter", "help": "Adapter checks run", "values": {"": 1}}
+    assert collected["nm_seconds_since_last_success"]["values"] == {}
+    assert collected["nm_probe_seconds"]["values"][""]["count"] == 1
@@ -0,0 +1,92 @@
+"""Adapter policy parsing and evaluation"""
+
+import pytest
+
+from delugenm.backends import Adapter
+from delugenm.common import STATUS_CONNECTED, STATUS_CONNECTING, STATUS_DISCONNECTED
+from delugenm.policy import (
+    FALSE,
+    OP_AND,
+    OP_NOT,
+    OP_OR,
+    OP_TERM,
+    TRUE,
+    UNKNOWN,
+    Policy,
+    PolicyError,
+    any_of,
+    parse,
+)
+
+
+def test_precedence_is_not_then_and_then_or():
+    assert parse("a OR b AND NOT c") == (
+        OP_OR, (OP_TERM, "a"), (OP_AND, (OP_TERM, "b"), (OP_NOT, (OP_TERM, "c")))
+    )
+    assert parse("(a or b) and c") == (OP_AND, (OP_OR, (OP_TERM, "a"), (OP_TERM, "b")), (OP_TERM, "c"))
+
+
+def test_quoted_patterns_keep_spaces_and_keywords():
+    assert parse('"Wi-Fi 2" OR \'and\'') == (OP_OR, (OP_TERM, "Wi-Fi 2"), (OP_TERM, "and"))
+
+
+@pytest.mark.parametrize("text, message", [
+    ("", "Empty policy"),
+    ("a AND", "Unexpected end"),
+    ("(a OR b", r"Missing '\)'"),
+    ("a b", "Unexpected 'b'"),
+    ("a OR OR b", "Unexpected 'OR'"),
+    ('"open', "Unterminated quote"),
+])
+def test_invalid_policies(text, message):
+    with pytest.raises(PolicyError, match=message):
+        parse(text)
+
+
+def test_any_of():
+    assert any_of(["a"]) == (OP_TERM, "a")
+    assert any_of(["a", "b"]) == (OP_OR, (OP_TERM, "a"), (OP_TERM, "b"))
+    with pytest.raises(PolicyError):
+        any_of([])
+
+
+def test_three_valued_evaluation():
+    policy = Policy("wg-b AND NOT Ethernet")
+    assert policy.value == UNKNOWN
+    assert policy.update({"wg-b": TRUE, "Ethernet": FALSE}) == TRUE
+    assert policy.update({"Ethernet": UNKNOWN}) == UNKNOWN
+    assert policy.update({"ethernet": TRUE}) == FALSE
+    # Patterns the policy doesn't mention are ignored
+    assert policy.update({"other": FALSE}) == FALSE
+
+
+def test_shared_subexpressions_are_compiled_once():
+    policy = Policy("(a AND b) OR (B AND A) OR (a AND (b))")
+    assert policy.terms == ["a", "b"]
+    # Two leaves and one AND; the OR of identical operands collapses into it
+    assert len(policy._ops) == 3
+
+
+def test_updates_only_recompute_what_changed():
+    policy = Policy("(a AND b) OR (c AND d)")
+    policy.update({"a": TRUE, "b": TRUE, "c": TRUE, "d": TRUE})
+    before = policy.evaluations
+    policy.update({"a": FALSE})
+    # The left AND and the OR above it, not the right AND
+    assert policy.evaluations - before == 2
+    assert policy.value == TRUE
+
+
+def test_statuses_take_the_best_matching_adapter():
+    policy = Policy("wg-* AND Ethernet")
+    adapters = [
+        Adapter("wg-a", "{A}", 1, "wg-a", STATUS_DISCONNECTED),
+        Adapter("wg-b", "{B}", 2, "wg-b", STATUS_CONNECTED),
+        Adapter("eth0", "{E}", 3, "Ethernet", STATUS_CONNECTING),
+        Adapter("wlan0", "{W}", 4, "Wi-Fi", STATUS_CONNECTED),
+    ]
+    assert policy.statuses(adapters) == {"wg-*": STATUS_CONNECTED, "Ethernet": STATUS_CONNECTING}
+    assert policy.literal_terms == ["Ethernet"]
+    assert policy.matches(adapters[2])
+    assert not policy.matches(adapters[3])
+    assert policy.statuses(adapters[3:]) == {"wg-*": None, "Ethernet": None}
@@ -0,0 +1,71 @@
+"""DelugeRPC client against a stand-in daemon"""
+
+import pytest
+
+from conftest import PASSWORD, USERNAME
+from delugenm.rpc import DelugeRPCClient, RPCError
+
+
+def _client(daemon, password=PASSWORD):
+    return DelugeRPCClient("127.0.0.1", daemon.port, USERNAME, password, timeout=5.0)
+
+
+def test_login_and_calls(deluge_daemon):
+    daemon = deluge_daemon(interfaces={"listen_interface": "10.8.0.2"})
+    client = _client(daemon)
+    assert not client.connected
+    # Connects and logs in on the first call; events and stray replies are skipped
+    assert client.call("core.is_session_paused") is False
+    assert client.connected
+    assert client.call("core.pause_session") is None
+    assert client.call("core.is_session_paused") is True
+    assert client.call("core.get_config_values", ["listen_interface", "outgoing_interface"]) == {
+        "listen_interface": "10.8.0.2", "outgoing_interface": "",
+    }
+    assert daemon.calls == ["daemon.login", "core.is_session_paused", "core.pause_session",
+                            "core.is_session_paused", "core.get_config_values"]
+    assert daemon.logins == 1
+    client.close()
+    assert not client.connected
+
+
+def test_bad_login(deluge_daemon):
+    daemon = deluge_daemon()
+    client = _client(daemon, password="wrong")
+    with pytest.raises(RPCError, match="BadLoginError: Password does not match") as raised:
+        client.connect()
+    assert raised.value.exception_type == "BadLoginError"
+    assert not client.connected
+
+
+def test_error_reply_keeps_the_connection(deluge_daemon):
+    daemon = deluge_daemon()
+    client = _client(daemon)
+    with pytest.raises(RPCError, match="WrappedException: Unknown method core.nothing"):
+        client.call("core.nothing")
+    assert client.connected
+    assert client.call("core.is_session_paused") is False
+    assert daemon.logins == 1
+
+
+def test_reconnects_after_the_daemon_drops_the_connection(deluge_daemon):
+    daemon = deluge_daemon()
+    client = _client(daemon)
+    client.call("core.pause_session")
+    daemon.drop_connections()
+    with pytest.raises((ConnectionError, OSError)):
+        client.call("core.is_session_paused")
+    assert not client.connected
+    # The next call logs in again
+    assert client.call("core.is_session_paused") is True
+    assert daemon.logins == 2
+    client.close()
+
+
+def test_unreachable_daemon(deluge_daemon):
+    daemon = deluge_daemon()
+    daemon.close()
+    client = _client(daemon)
+    with pytest.raises(OSError):
+        client.call("core.is_session_paused")
+    assert not client.connected
@@ -0,0 +1,39 @@
+"""Adaptive check scheduling"""
+
+import pytest
+
+from delugenm.scheduler import AdaptiveSchedule
+
+
+def test_stable_checks_back_off_to_the_maximum():
+    schedule = AdaptiveSchedule(5.0, 30.0, 0.5, backoff=2.0, jitter=0)
+    assert [schedule.next_delay() for _ in range(5)] == [10.0, 20.0, 30.0, 30.0, 30.0]
+
+
+def test_degraded_or_errored_drops_to_the_fast_interval():
+    schedule = AdaptiveSchedule(5.0, 30.0, 0.5, backoff=2.0, jitter=0)
+    schedule.next_delay()
+    assert schedule.next_delay(degraded=True) == 0.5
+    assert schedule.next_delay(errored=True) == 0.5
+    # The first stable check after that goes back to the base, then backs off again
+    assert schedule.next_delay() == 5.0
+    assert schedule.next_delay() == 10.0
+
+
+def test_reset_starts_from_the_base():
+    schedule = AdaptiveSchedule(5.0, 30.0, 0.5, backoff=2.0, jitter=0)
+    schedule.next_delay()
+    schedule.reset()
+    assert schedule.current == 5.0
+
+
+def test_limits_are_kept_around_the_base():
+    schedule = AdaptiveSchedule(5.0, 1.0, 10.0, jitter=0)
+    assert (schedule.maximum, schedule.fast) == (5.0, 5.0)
+    assert schedule.next_delay() == 5.0
+
+
+@pytest.mark.parametrize("rand, expected", [(0.0, 9.0), (0.5, 10.0), (0.999999, 11.0)])
+def test_jitter_stays_within_its_fraction(rand, expected):
+    schedule = AdaptiveSchedule(5.0, 30.0, 0.5, backoff=2.0, jitter=0.1, rand=lambda: rand)
+    assert schedule.next_delay() == pytest.approx(expected, abs=1e-4)
@@ -0,0 +1,61 @@
+"""Settings validation"""
+
+import pytest
+
+from delugenm.settings import DEFAULTS, FLOAT_KEYS, Settings, coerce_floats
+
+FLAGS = [key for key, value in DEFAULTS.items() if isinstance(value, bool)]
+
+
+@pytest.mark.parametrize("key", FLAGS)
+@pytest.mark.parametrize("value, expected", [
+    (True, True), (False, False), (1, True), (0, False),
+    ("true", True), ("false", False), ("1", True), ("0", False), (" Off ", False), ("yes", True),
+])
+def test_flags_parse_strings(key, value, expected):
+    assert getattr(Settings.build({key: value}), key) is expected
+
+
+@pytest.mark.parametrize("key", FLAGS)
+@pytest.mark.parametrize("value", ["nope", "", 2, None, []])
+def test_flags_reject_other_values(key, value):
+    with pytest.raises(ValueError, match=f"Invalid {key}"):
+        Settings.build({key: value})
+
+
+def test_invalid_value_falls_back_to_default_when_not_strict():
+    assert Settings.build({"stall_detection": "maybe"}, strict=False).stall_detection is DEFAULTS["stall_detection"]
+
+
+def test_numbers_from_strings():
+    settings = Settings.build({"check_interval": "0.5", "trip_samples": "2"})
+    assert settings.check_interval == 0.5
+    assert settings.trip_samples == 2
+
+
+@pytest.mark.parametrize("changes", [{"check_interval": 0}, {"trip_samples": 1.5}, {"action": "explode"}])
+def test_invalid_numbers_and_choices(changes):
+    with pytest.raises(ValueError):
+        Settings.build(changes)
+
+
+def test_updated_reuses_the_parsed_policy():
+    settings = Settings.build({"adapter_policy": "wg0 AND NOT eth0"})
+    updated = settings.updated({"check_interval": 1.0})
+    assert updated.policy_tree is settings.policy_tree
+    assert settings.changed(updated) == {"check_interval"}
+
+
+def test_coerce_floats_migrates_whole_numbers():
+    values = {"check_interval": 5, "fallback_interval": 60.0, "trip_samples": 3, "probe_isolation": True}
+    coerce_floats(values)
+    assert type(values["check_interval"]) is float
+    assert values["fallback_interval"] == 60.0
+    # Whole-number and boolean settings are left alone
+    assert type(values["trip_samples"]) is int
+    assert values["probe_isolation"] is True
+
+
+def test_float_keys_cover_the_intervals():
+    assert {"check_interval", "fallback_interval", "max_check_interval", "probe_timeout"} <= set(FLOAT_KEYS)
+    assert "trip_samples" not in FLOAT_KEYS
@@ -0,0 +1,52 @@
+"""Shared-memory status publication"""
+
+from delugenm import common
+from delugenm.status import ACTIVE_STATUSES, STATUS_MISSING, StatusReader, StatusWriter, adapter_up
+
+
+def _adapters(*statuses):
+    return [(f"eth{index}", f"{{ETH{index}}}", f"Ethernet {index}", index, status, index == 0)
+            for index, status in enumerate(statuses)]
+
+
+def test_round_trip(tmp_path):
+    path = str(tmp_path / "status")
+    writer = StatusWriter(path)
+    writer.publish(100.0, True, False, False, True, _adapters(common.STATUS_CONNECTED, STATUS_MISSING))
+    reader = StatusReader(path)
+    status = reader.read()
+    assert (status.last_check, status.armed, status.tripped, status.holding, status.healthy) == (
+        100.0, True, False, False, True
+    )
+    assert [(adapter.name, adapter.status, adapter.required) for adapter in status.adapters] == [
+        ("eth0", common.STATUS_CONNECTED, True), ("eth1", STATUS_MISSING, False),
+    ]
+
+    # Only a change of anything but the times moves the version on
+    version = status.version
+    writer.publish(101.0, True, False, False, True)
+    assert reader.read().version == version
+    writer.publish(102.0, True, True, False, False)
+    assert reader.read().version == version + 1
+    reader.close()
+    writer.close()
+
+
+def test_active_statuses_match_the_plugin():
+    assert ACTIVE_STATUSES == common.ACTIVE_STATUSES
+
+
+def test_adapter_up(tmp_path):
+    path = str(tmp_path / "status")
+    writer = StatusWriter(path)
+    writer.publish(100.0, True, False, False, True, _adapters(
+        common.STATUS_AUTHENTICATION_SUCCEEDED, common.STATUS_MEDIA_DISCONNECTED, common.STATUS_CONNECTED,
+    ))
+    status = StatusReader(path).read()
+    # 802.1X authenticated counts as up, by name, GUID or connection name
+    assert adapter_up(status, "eth0")
+    assert adapter_up(status, "{ETH0}")
+    assert not adapter_up(status, "Ethernet 1")
+    assert adapter_up(status, "Ethernet 2")
+    assert not adapter_up(status, "missing")
+    writer.close()
@@ -0,0 +1,133 @@
+"""Trace recording and replay"""
+
+import pytest
+
+from delugenm.backends import EVENT_ADDRESS, EVENT_LINK, AdapterEvent
+from delugenm.backends.fake import FakeBackend
+from delugenm.backends.replay import ReplayBackend
+from delugenm.common import STATUS_CONNECTED, STATUS_HARDWARE_NOT_PRESENT, STATUS_MEDIA_DISCONNECTED
+from delugenm.trace import (
+    MAGIC,
+    RECORD_EVENT,
+    RECORD_SNAPSHOT,
+    RECORD_START,
+    RECORD_TIMEOUT,
+    TraceError,
+    TraceWriter,
+    parse_trace,
+    read_trace,
+)
+from delugenm.worker import ProbeTimeout
+
+
+def _statuses(snapshot):
+    return [(adapter.name, adapter.guid, adapter.index, adapter.connection_id, adapter.status)
+            for adapter in snapshot.adapters]
+
+
+@pytest.fixture
+def recording(tmp_path):
+    """Record a fake backend flapping: (trace path, snapshots written)"""
+    path = str(tmp_path / "trace")
+    backend = FakeBackend()
+    writer = TraceWriter(path)
+    clock = [0.0]
+    backend.watch(lambda event: writer.write_event(event, timestamp=clock[0]))
+
+    snapshots = []
+    steps = [
+        lambda: backend.set_adapter("wg0", STATUS_CONNECTED, guid="{WG0}", index=3, connection_id="wg-b"),
+        lambda: backend.set_adapter("eth0", STATUS_CONNECTED, guid="{ETH0}", index=1, connection_id="Ethernet"),
+        lambda: backend.set_adapter("wg0", STATUS_MEDIA_DISCONNECTED, guid="{WG0}", index=3, connection_id="wg-b"),
+        lambda: backend.emit("{ETH0}", EVENT_ADDRESS),
+        lambda: backend.set_adapter("wg0", STATUS_CONNECTED, guid="{WG0}", index=3, connection_id="wg-b"),
+    ]
+    for second, step in enumerate(steps):
+        clock[0] = 100.0 + second
+        step()
+        snapshot = backend.snapshot().at(clock[0] + 0.5)
+        writer.write_snapshot(snapshot)
+        snapshots.append(snapshot)
+    writer.write_timeout(timestamp=105.0)
+    backend.unwatch()
+    writer.close()
+    return path, snapshots
+
+
+def test_round_trip(recording):
+    path, snapshots = recording
+    records = read_trace(path)
+    assert records[0].kind == RECORD_START
+
+    read = [record.value for record in records if record.kind == RECORD_SNAPSHOT]
+    assert [snapshot.timestamp for snapshot in read] == [snapshot.timestamp for snapshot in snapshots]
+    assert [_statuses(snapshot) for snapshot in read] == [_statuses(snapshot) for snapshot in snapshots]
+    assert read[2].find("wg-b").status == STATUS_MEDIA_DISCONNECTED
+
+    events = [(record.timestamp, record.value) for record in records if record.kind == RECORD_EVENT]
+    assert events == [
+        (100.0, AdapterEvent(EVENT_LINK, "{WG0}")),
+        (101.0, AdapterEvent(EVENT_LINK, "{ETH0}")),
+        (102.0, AdapterEvent(EVENT_LINK, "{WG0}")),
+        (103.0, AdapterEvent(EVENT_ADDRESS, "{ETH0}")),
+        (104.0, AdapterEvent(EVENT_LINK, "{WG0}")),
+    ]
+    assert records[-1].kind == RECORD_TIMEOUT
+    assert records[-1].timestamp == 105.0
+
+
+def test_appending_after_a_restart(recording):
+    path, snapshots = recording
+    writer = TraceWriter(path)
+    writer.write_snapshot(snapshots[-1].at(200.0))
+    writer.close()
+
+    records = read_trace(path)
+    assert [record.kind for record in records].count(RECORD_START) == 2
+    assert _statuses(records[-1].value) == _statuses(snapshots[-1])
+    assert records[-1].timestamp == 200.0
+
+
+def test_partial_record_at_the_end_is_dropped(recording):
+    path, _ = recording
+    with open(path, "rb") as trace_file:
+        data = trace_file.read()
+    assert len(list(parse_trace(data[:-3]))) == len(list(parse_trace(data))) - 1
+
+
+@pytest.mark.parametrize("data, message", [
+    (b"", "Not a Network Monitor trace"),
+    (b"something else", "Not a Network Monitor trace"),
+    (MAGIC + bytes((99,)), "Unsupported trace version 99"),
+    (MAGIC + bytes((1, 42)), "Unknown record type 42"),
+])
+def test_not_a_trace(data, message):
+    with pytest.raises(TraceError, match=message):
+        list(parse_trace(data))
+
+
+def test_replay_plays_the_snapshots_back(recording, monkeypatch):
+    path, snapshots = recording
+    clock = [1000.0]
+    monkeypatch.setattr("delugenm.backends.replay.time.monotonic", lambda: clock[0])
+    backend = ReplayBackend(f"{path}@2")
+    assert backend.speed == 2.0
+
+    # Trace time starts at the first snapshot and runs twice as fast
+    assert _statuses(backend.snapshot()) == _statuses(snapshots[0])
+    clock[0] += 1.0
+    assert _statuses(backend.snapshot()) == _statuses(snapshots[2])
+    assert backend.snapshot().find("wg0").status == STATUS_MEDIA_DISCONNECTED
+    clock[0] += 2.0
+    with pytest.raises(ProbeTimeout):
+        backend.snapshot()
+
+
+def test_replay_of_a_trace_with_one_snapshot(tmp_path):
+    backend = FakeBackend()
+    backend.set_adapter("wg0", STATUS_HARDWARE_NOT_PRESENT, notify=False)
+    path = str(tmp_path / "trace")
+    writer = TraceWriter(path)
+    writer.write_snapshot(backend.snapshot())
+    writer.close()
+    assert _statuses(ReplayBackend(path).snapshot()) == _statuses(backend.snapshot())
@@ -0,0 +1,58 @@
+"""Traffic stall detection"""
+
+from delugenm.backends import AdapterCounters
+from delugenm.traffic import TrafficMonitor
+
+
+def _feed(monitor, step, per_second):
+    """Feed 40s of samples, every counter growing at its per_second rate"""
+    for second in range(0, 41, step):
+        monitor.update(float(second), {"a": AdapterCounters(*(rate * second for rate in per_second))})
+
+
+def test_unknown_until_the_window_is_covered():
+    monitor = TrafficMonitor(window=30.0, min_rate=16.0)
+    monitor.update(0.0, {"a": AdapterCounters(0, 0, 0, 0, 0, 0)})
+    assert monitor.stalled("a") is None
+    assert monitor.stalled("missing") is None
+
+
+def test_moving_traffic_is_not_stalled():
+    monitor = TrafficMonitor(window=30.0, min_rate=16.0)
+    _feed(monitor, 5, (5000, 2000, 10, 5, 0, 0))
+    assert monitor.stalled("a") is False
+    assert monitor.rates("a").rx_bytes == 5000
+
+
+def test_flat_bytes_are_a_stall():
+    monitor = TrafficMonitor(window=30.0, min_rate=16.0)
+    _feed(monitor, 5, (1, 1, 0, 0, 0, 0))
+    assert monitor.stalled("a") is True
+
+
+def test_mostly_errors_is_a_stall():
+    monitor = TrafficMonitor(window=30.0, min_rate=16.0)
+    _feed(monitor, 5, (500, 500, 2, 2, 4, 1))
+    assert monitor.stalled("a") is True
+
+
+def test_a_few_errors_are_not_a_stall():
+    monitor = TrafficMonitor(window=30.0, min_rate=16.0)
+    _feed(monitor, 5, (5000, 5000, 40, 40, 1, 0))
+    assert monitor.stalled("a") is False
+
+
+def test_counter_reset_has_no_rate():
+    monitor = TrafficMonitor(window=10.0, min_rate=16.0)
+    monitor.update(0.0, {"a": AdapterCounters(1000, 1000, 10, 10, 50, 0)})
+    monitor.update(20.0, {"a": AdapterCounters(90000, 90000, 900, 900, 0, 0)})
+    rates = monitor.rates("a")
+    assert rates.rx_errors is None
+    assert monitor.stalled("a") is False
+
+
+def test_adapters_that_went_away_are_forgotten():
+    monitor = TrafficMonitor(window=30.0, min_rate=16.0)
+    _feed(monitor, 5, (1, 1, 0, 0, 0, 0))
+    monitor.update(41.0, {})
+    assert monitor.rates("a") is None
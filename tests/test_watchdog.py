@@ -0,0 +1,174 @@
+"""The watchdog config examples shipped in the README and the module docstring"""
+
+import json
+import os
+import re
+
+import pytest
+
+from conftest import PASSWORD, USERNAME
+from delugenm import watchdog
+from delugenm.backends.fake import FakeBackend
+from delugenm.common import STATUS_CONNECTED, STATUS_MEDIA_DISCONNECTED
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _readme_examples():
+    with open(os.path.join(ROOT, "README.md")) as readme:
+        blocks = re.findall(r"```json\n(.*?)```", readme.read(), re.S)
+    return [block for block in blocks if '"daemons"' in block]
+
+
+def _docstring_example():
+    text = watchdog.__doc__.split("The config file is JSON:", 1)[1]
+    block = text.split("\n\n")[1]
+    return "\n".join(line[4:] for line in block.splitlines())
+
+
+@pytest.mark.parametrize("example", _readme_examples() + [_docstring_example()])
+def test_shipped_examples_load(example, tmp_path):
+    path = tmp_path / "watchdog.json"
+    path.write_text(example)
+    settings, rpc_timeout, daemons = watchdog.load_config(str(path))
+    assert rpc_timeout == 10.0
+    assert [daemon.name for daemon in daemons] == ["vpn-a", "vpn-b"]
+    assert daemons[1].settings.policy_tree is not None
+    assert daemons[1].settings.action == "shutdown"
+
+
+def test_readme_has_an_example():
+    assert _readme_examples()
+
+
+def _write(tmp_path, data):
+    path = tmp_path / "watchdog.json"
+    path.write_text(json.dumps(data))
+    return str(path)
+
+
+def test_daemon_overrides_shared_settings(tmp_path):
+    path = _write(tmp_path, {
+        "settings": {"action": "pause", "trip_samples": 3},
+        "daemons": [{"port": 58846}, {"name": "b", "port": 58847, "trip_samples": 1}],
+    })
+    settings, _, daemons = watchdog.load_config(path)
+    assert settings.trip_samples == 3
+    assert daemons[0].name == "127.0.0.1:58846"
+    assert daemons[0].settings.trip_samples == 3
+    assert daemons[1].settings.trip_samples == 1
+    assert daemons[1].settings.action == "pause"
+
+
+@pytest.mark.parametrize("data, message", [
+    ({"daemons": []}, "list of daemons"),
+    ({"daemons": [{"port": 0}]}, "Invalid port"),
+    ({"daemons": [{"colour": "red"}]}, "Unknown daemon keys"),
+    ({"daemons": [{"port": 1}, {"port": 1}]}, "listed twice"),
+    ({"daemons": [{"adapter_policy": "wg-b & !Ethernet"}]}, "Invalid adapter_policy"),
+    ({"rpc_timeout": 0, "daemons": [{}]}, "rpc_timeout"),
+    ({"extra": 1, "daemons": [{}]}, "Unknown watchdog config keys"),
+])
+def test_invalid_configs(tmp_path, data, message):
+    with pytest.raises(ValueError, match=message):
+        watchdog.load_config(_write(tmp_path, data))
+
+
+# Guarding stand-in daemons over DelugeRPC
+
+def _watchdog(tmp_path, backend, daemons, **settings):
+    """A started Watchdog on a fake backend, guarding the given {port: entry} daemons"""
+    shared = {"action": "pause", "trip_samples": 2, "trip_window": 2, "min_down_duration": 0,
+              "probe_isolation": False}
+    shared.update(settings)
+    path = _write(tmp_path, {
+        "settings": shared,
+        "rpc_timeout": 5,
+        "daemons": [dict(entry, port=port, username=USERNAME, password=PASSWORD) for port, entry in daemons],
+    })
+    settings, rpc_timeout, specs = watchdog.load_config(path)
+    guard = watchdog.Watchdog(settings, specs, rpc_timeout, backend=backend)
+    guard.start()
+    return guard
+
+
+def _tick_until(guard, condition, ticks=10):
+    for _ in range(ticks):
+        if condition():
+            return True
+        guard.tick()
+    return condition()
+
+
+@pytest.fixture
+def backend():
+    backend = FakeBackend(supports_events=False)
+    backend.set_adapter("wg-a", STATUS_CONNECTED, notify=False)
+    backend.set_adapter("wg-b", STATUS_CONNECTED, notify=False)
+    return backend
+
+
+def test_pause_repause_and_resume(tmp_path, backend, deluge_daemon):
+    daemon = deluge_daemon(interfaces={"listen_interface": ""})
+    guard = _watchdog(tmp_path, backend, [(daemon.port, {"name": "a", "required_adapters": ["wg-a"]})])
+    assert guard.guards[0].reachable
+    guard.tick()
+    assert not daemon.paused
+
+    backend.set_adapter("wg-a", STATUS_MEDIA_DISCONNECTED, notify=False)
+    assert _tick_until(guard, lambda: daemon.paused)
+    assert guard.guards[0].resume_on_recovery
+
+    # The daemon restarts unpaused while the adapter is still down
+    daemon.drop_connections()
+    daemon.paused = False
+    guard.tick()
+    assert daemon.paused
+
+    backend.set_adapter("wg-a", STATUS_CONNECTED, notify=False)
+    assert _tick_until(guard, lambda: not daemon.paused)
+    assert daemon.calls[-2:] == ["core.resume_session", "core.get_config_values"]
+    guard.close()
+
+
+def test_a_session_paused_by_the_user_stays_paused(tmp_path, backend, deluge_daemon):
+    daemon = deluge_daemon()
+    daemon.paused = True
+    guard = _watchdog(tmp_path, backend, [(daemon.port, {"name": "a", "required_adapters": ["wg-a"]})])
+    backend.set_adapter("wg-a", STATUS_MEDIA_DISCONNECTED, notify=False)
+    assert _tick_until(guard, lambda: guard.guards[0].tripped and guard.guards[0].pending is None)
+    assert not guard.guards[0].resume_on_recovery
+
+    backend.set_adapter("wg-a", STATUS_CONNECTED, notify=False)
+    assert _tick_until(guard, lambda: not guard.guards[0].tripped and guard.guards[0].pending is None)
+    assert daemon.paused
+    assert "core.resume_session" not in daemon.calls
+    guard.close()
+
+
+def test_shutdown_leaves_the_other_daemons_guarded(tmp_path, backend, deluge_daemon):
+    first, second = deluge_daemon(), deluge_daemon()
+    guard = _watchdog(tmp_path, backend, [
+        (first.port, {"name": "a", "required_adapters": ["wg-a"]}),
+        (second.port, {"name": "b", "required_adapters": ["wg-b"], "action": "shutdown"}),
+    ])
+    backend.set_adapter("wg-b", STATUS_MEDIA_DISCONNECTED, notify=False)
+    assert _tick_until(guard, lambda: guard.guards[1].stopped)
+    assert "daemon.shutdown" in second.calls
+    assert not first.paused
+
+    # The stopped daemon is unreachable now; the other is still served
+    guard.tick()
+    assert guard.guards[1].reachable is False
+    backend.set_adapter("wg-a", STATUS_MEDIA_DISCONNECTED, notify=False)
+    assert _tick_until(guard, lambda: first.paused)
+    guard.close()
+
+
+def test_close_resumes_paused_sessions(tmp_path, backend, deluge_daemon):
+    daemon = deluge_daemon()
+    guard = _watchdog(tmp_path, backend, [(daemon.port, {"name": "a", "required_adapters": ["wg-a"]})])
+    backend.set_adapter("wg-a", STATUS_MEDIA_DISCONNECTED, notify=False)
+    assert _tick_until(guard, lambda: daemon.paused)
+    guard.close()
+    assert not daemon.paused
@@ -0,0 +1,92 @@
+"""Supervised probe worker process"""
+
+import os
+import time
+
+import pytest
+
+from delugenm import worker
+from delugenm.backends import AdapterSnapshot
+from delugenm.worker import ProbeError, ProbeTimeout, ProbeWorker
+
+
+class _StubBackend(object):
+    """Answers addresses() with the worker's pid; snapshot() does what the backend's name says"""
+
+    name = "stub"
+
+    def __init__(self, behaviour):
+        self.behaviour = behaviour
+
+    def snapshot(self, counters=False):
+        if self.behaviour == "hang":
+            time.sleep(60)
+        elif self.behaviour == "exit":
+            os._exit(3)
+        elif self.behaviour == "raise":
+            raise RuntimeError("backend broke")
+        return AdapterSnapshot([], timestamp=1.0)
+
+    def addresses(self):
+        return {"pid": os.getpid()}
+
+
+def _stub_worker_main(conn, backend_name):
+    """Worker entry point that serves a _StubBackend, run in the spawned process"""
+    import delugenm.backends
+
+    delugenm.backends.get_backend = _StubBackend
+    worker._worker_main(conn, backend_name)
+
+
+@pytest.fixture
+def start_worker(monkeypatch):
+    monkeypatch.setattr(worker, "_worker_main", _stub_worker_main)
+    workers = []
+
+    def start(behaviour, timeout=5.0):
+        probe_worker = ProbeWorker(behaviour, timeout)
+        workers.append(probe_worker)
+        return probe_worker
+
+    yield start
+    for probe_worker in workers:
+        probe_worker.stop()
+
+
+def test_answers_calls(start_worker):
+    probe_worker = start_worker("ok")
+    assert probe_worker.snapshot().timestamp == 1.0
+    pid = probe_worker.addresses()["pid"]
+    assert pid != os.getpid()
+    # The same process serves every call
+    assert probe_worker.addresses()["pid"] == pid
+    assert probe_worker.restarts == 0
+
+
+def test_backend_errors_come_back(start_worker):
+    probe_worker = start_worker("raise")
+    with pytest.raises(ProbeError, match="RuntimeError: backend broke"):
+        probe_worker.snapshot()
+    # An exception doesn't cost the worker
+    assert probe_worker.restarts == 0
+
+
+def test_hung_call_hits_the_deadline_and_the_worker_is_replaced(start_worker):
+    probe_worker = start_worker("hang", timeout=0.5)
+    pid = probe_worker.addresses()["pid"]
+    started = time.monotonic()
+    with pytest.raises(ProbeTimeout):
+        probe_worker.snapshot()
+    assert time.monotonic() - started < 3.0
+    assert probe_worker.restarts == 1
+    assert probe_worker.addresses()["pid"] != pid
+
+
+def test_worker_that_exits_is_replaced(start_worker):
+    probe_worker = start_worker("exit")
+    pid = probe_worker.addresses()["pid"]
+    with pytest.raises(ProbeError, match="exit code 3"):
+        probe_worker.snapshot()
+    assert probe_worker.restarts == 1
+    assert probe_worker.addresses()["pid"] != pid